@@ -3,14 +3,24 @@ Minimal Flask API for NASA Exoplanet Detection
 Only essential endpoints - no complex routing
 """
 
-from flask import Flask, request, jsonify, send_file, Response
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
-import pandas as pd
+import numpy as np
 import os
+import json
 import logging
-from ml_models import predict_datapoint
-from database import db
-from lightcurve_generator import generate_lightcurve
+from ml_models import predict_datapoint, predict_datapoints
+from prediction_batcher import prediction_batcher
+from prediction_memo import prediction_memo
+from database import db, encode_cursor, decode_cursor, validate_prediction
+from kepler_catalog import kepler_catalog, KEPLER_FEATURES
+from prediction_table import prediction_table
+from autocomplete import kepler_autocomplete
+from lightcurve_cache import lightcurve_cache
+from lightcurve_jobs import lightcurve_jobs
+from lightcurve_arrays import lightcurve_arrays
+from lightcurve_fold import fold_lightcurve, render_folded_png
+from lightcurve_features import STELLAR_FEATURES, extract_features
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,32 +29,47 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
+# Cache lifetimes of served lightcurve images, in seconds
+DEFAULT_IMAGE_MAX_AGE = 24 * 3600
+IMMUTABLE_IMAGE_MAX_AGE = 365 * 24 * 3600
+
 @app.route('/api/autocomplete/kepler', methods=['GET'])
 def get_autocomplete_suggestions():
-    """Get autocomplete suggestions for Kepler dataset from text files"""
+    """Get ranked autocomplete suggestions for Kepler dataset from the in-memory index"""
     try:
-        options_file = '../Datasets/kepler_options.txt'
-        
-        if not os.path.exists(options_file):
+        try:
+            index = kepler_autocomplete.snapshot()
+        except OSError:
             return jsonify({'error': 'Kepler options file not found'}), 400
         
-        # Read all options from text file
-        with open(options_file, 'r') as f:
-            suggestions = [line.strip() for line in f.readlines() if line.strip()]
+        query = request.args.get('q', '')
+        limit = request.args.get('limit', type=int)
+        offset = max(request.args.get('offset', 0, type=int), 0)
         
-        query = request.args.get('q', '').lower()
+        # If no query, return all suggestions for dropdown. The body is built
+        # once per index and revalidated with its ETag, so clients get a 304
+        if not query and limit is None and not offset:
+            response = Response(index.full_list_json(), mimetype='application/json')
+            response.set_etag(index.etag)
+            response.headers['Cache-Control'] = 'public, max-age=3600'
+            return response.make_conditional(request)
         
-        # Filter suggestions based on query (if provided)
         if query:
-            suggestions = [s for s in suggestions if query in s.lower()]
-            # Limit to 20 suggestions for autocomplete
-            suggestions = suggestions[:20]
-        # If no query, return all suggestions for dropdown
+            # Limit to 20 suggestions for autocomplete unless asked otherwise
+            limit = min(max(limit if limit is not None else 20, 1), 1000)
+            suggestions, total_matches = kepler_autocomplete.search(query, limit, offset)
+        else:
+            limit = min(max(limit if limit is not None else len(index.suggestions), 1), len(index.suggestions))
+            suggestions = index.suggestions[offset:offset + limit]
+            total_matches = len(index.suggestions)
         
         return jsonify({
             'suggestions': suggestions,
             'dataset': 'kepler',
-            'total_count': len(suggestions)
+            'total_count': len(suggestions),
+            'total_matches': total_matches,
+            'offset': offset,
+            'limit': limit
         })
         
     except Exception as e:
@@ -61,30 +86,23 @@ def predict_kepler():
         if not koi_name:
             return jsonify({'error': 'KOI name is required'}), 400
         
-        # Load the data point from CSV
-        csv_path = '../Assets/clean_kepler_dataset.csv'
-        if not os.path.exists(csv_path):
+        # Look up the zero-copy (1, 15) feature view in the in-memory catalog
+        try:
+            data_point = kepler_catalog.get_features(koi_name)
+        except OSError:
             return jsonify({'error': 'Kepler dataset not found'}), 400
         
-        df = pd.read_csv(csv_path)
-        
-        # Find the specific row with the matching kepoi_name
-        matching_rows = df[df['kepoi_name'] == koi_name]
-        
-        if matching_rows.empty:
+        if data_point is None:
             return jsonify({'error': f'KOI name {koi_name} not found in dataset'}), 404
         
-        # Get the first matching row
-        matching_row = matching_rows.iloc[[0]]
-        
         # Extract NASA classification
-        nasa_classification = matching_row['koi_disposition'].iloc[0]
+        nasa_classification = kepler_catalog.get_disposition(koi_name)
         
-        # Skip first three columns (kepoi_name, koi_disposition, and kepid) and use the rest for prediction
-        data_point = matching_row.drop(['kepoi_name', 'koi_disposition', 'kepid'], axis=1)
-        
-        # Use ml_models module for prediction
-        result = predict_datapoint('kepler', data_point)
+        # Answer from the precomputed catalog table, falling back to the model
+        # while the table is (re)building; concurrent misses share a model call
+        result = prediction_table.lookup(koi_name)
+        if result is None:
+            result = prediction_batcher.predict('kepler', data_point)
         
         if result['status'] == 'success':
             response_data = {
@@ -117,11 +135,7 @@ def predict_manual():
             return jsonify({'error': 'Parameters are required'}), 400
         
         # Expected parameter order (matching the model training)
-        expected_params = [
-            'koi_period', 'koi_time0bk', 'koi_duration', 'koi_depth', 'koi_max_sngle_ev',
-            'koi_max_mult_ev', 'koi_num_transits', 'koi_steff', 'koi_slogg', 'koi_smet',
-            'koi_srad', 'koi_smass', 'ra', 'dec', 'koi_kepmag'
-        ]
+        expected_params = KEPLER_FEATURES
         
         # Validate that all required parameters are present and set defaults
         param_values = []
@@ -133,11 +147,12 @@ def predict_manual():
                 param_values.append(0.0)
                 logger.warning(f"Missing parameter {param}, using default value 0.0")
         
-        # Create DataFrame with parameters in the correct order
-        data_point = pd.DataFrame([param_values], columns=expected_params)
+        # (1, 15) row in the correct order; no DataFrame, so pandas stays unloaded
+        data_point = np.array([param_values], dtype=np.float32)
         
-        # Use ml_models module for prediction
-        result = predict_datapoint('kepler', data_point)
+        # Repeated parameter sets are answered from the memo; the rest are
+        # scored through the batcher so concurrent requests share a model call
+        result = prediction_memo.predict(data_point, lambda row: prediction_batcher.predict('kepler', row))
         
         if result['status'] == 'success':
             response_data = {
@@ -157,16 +172,222 @@ def predict_manual():
         logger.error(f"Manual prediction error: {str(e)}")
         return jsonify({'error': f'Manual prediction failed: {str(e)}'}), 500
 
-
-@app.route('/api/predictions', methods=['GET'])
-def get_predictions():
-    """Get all predictions from database"""
+@app.route('/api/predict/kepler/batch', methods=['POST'])
+def predict_kepler_batch():
+    """Make predictions for many KOI names or manual parameter rows in one model call"""
     try:
-        predictions = db.get_all_predictions()
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        koi_names = data.get('koi_names')
+        parameter_rows = data.get('parameters')
+        score_all = bool(data.get('all'))
+        
+        if not score_all and not koi_names and not parameter_rows:
+            return jsonify({'error': 'koi_names, parameters or all is required'}), 400
+        
+        if score_all or koi_names:
+            try:
+                catalog = kepler_catalog.snapshot()
+            except OSError:
+                return jsonify({'error': 'Kepler dataset not found'}), 400
+            
+            if score_all:
+                rows = np.arange(len(catalog))
+                found_names = catalog.kepoi_names
+                not_found = []
+            else:
+                if not isinstance(koi_names, list):
+                    return jsonify({'error': 'koi_names must be a list'}), 400
+                found_names, found_rows, not_found = [], [], []
+                for koi_name in koi_names:
+                    row = catalog.kepoi_index.get(koi_name)
+                    if row is None:
+                        not_found.append(koi_name)
+                    else:
+                        found_names.append(koi_name)
+                        found_rows.append(row)
+                rows = np.asarray(found_rows, dtype=np.intp)
+            
+            result = predict_datapoints('kepler', catalog.features[rows])
+            if result['status'] != 'success':
+                return jsonify({'error': result['message']}), 500
+            
+            rejected = {'not_found': not_found}
+            predictions = [
+                {
+                    'koi_name': koi_name,
+                    'is_exoplanet': is_exoplanet,
+                    'confidence': confidence,
+                    'nasa_classification': catalog.dispositions[row]
+                }
+                for koi_name, row, is_exoplanet, confidence in zip(
+                    found_names, rows.tolist(),
+                    result['is_exoplanet'].tolist(), result['confidence'].tolist()
+                )
+            ]
+        else:
+            if not isinstance(parameter_rows, list):
+                return jsonify({'error': 'parameters must be a list'}), 400
+            
+            # Missing parameters default to 0.0, as in /api/predict/manual
+            param_values, indices, invalid = [], [], []
+            for index, parameters in enumerate(parameter_rows):
+                try:
+                    param_values.append([float(parameters.get(param, 0.0)) for param in KEPLER_FEATURES])
+                    indices.append(index)
+                except (AttributeError, TypeError, ValueError):
+                    invalid.append(index)
+            
+            result = predict_datapoints('kepler', np.array(param_values, dtype=np.float32).reshape(-1, 15))
+            if result['status'] != 'success':
+                return jsonify({'error': result['message']}), 500
+            
+            rejected = {'invalid': invalid}
+            predictions = [
+                {
+                    'index': index,
+                    'is_exoplanet': is_exoplanet,
+                    'confidence': confidence
+                }
+                for index, is_exoplanet, confidence in zip(
+                    indices, result['is_exoplanet'].tolist(), result['confidence'].tolist()
+                )
+            ]
+        
         return jsonify({
+            'message': 'Kepler batch prediction completed',
             'predictions': predictions,
-            'count': len(predictions)
+            'count': len(predictions),
+            'model_version': result['model_version'],
+            **rejected
+        })
+        
+    except Exception as e:
+        logger.error(f"Kepler batch prediction error: {str(e)}")
+        return jsonify({'error': f'Kepler batch prediction failed: {str(e)}'}), 500
+
+@app.route('/api/predict/manual/cache/stats', methods=['GET'])
+def get_manual_prediction_cache_stats():
+    """Hit, miss and eviction counts of the manual prediction memo in this worker"""
+    try:
+        return jsonify(prediction_memo.stats())
+    except Exception as e:
+        logger.error(f"Error getting manual prediction cache stats: {str(e)}")
+        return jsonify({'error': 'Failed to get manual prediction cache stats'}), 500
+
+@app.route('/api/predict/batching/stats', methods=['GET'])
+def get_prediction_batching_stats():
+    """Queue depth and batch-size metrics of the prediction coalescer in this worker"""
+    try:
+        return jsonify(prediction_batcher.stats())
+    except Exception as e:
+        logger.error(f"Error getting batching stats: {str(e)}")
+        return jsonify({'error': 'Failed to get batching stats'}), 500
+
+@app.route('/api/predict/lightcurve', methods=['POST'])
+def predict_lightcurve():
+    """Derive the model inputs from a star's cleaned lightcurve and score them"""
+    try:
+        data = request.get_json() or {}
+        kepid = data.get('kepid')
+        stellar = data.get('stellar') or {}
+        
+        try:
+            kepid = int(kepid)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'kepid is required'}), 400
+        if not isinstance(stellar, dict):
+            return jsonify({'error': 'stellar must be an object of stellar parameters'}), 400
+        unknown = sorted(set(stellar) - set(STELLAR_FEATURES))
+        if unknown:
+            return jsonify({
+                'error': f"Unknown stellar parameters: {', '.join(unknown)}",
+                'allowed': STELLAR_FEATURES
+            }), 400
+        
+        series = lightcurve_arrays.load(kepid)
+        if series is None:
+            # Catalog stars can have their arrays built in the background;
+            # anything else has to be saved to the array store first
+            try:
+                row = kepler_catalog.get_row_by_kepid(kepid)
+            except OSError:
+                row = None
+            if row is None:
+                return jsonify({'error': f'No lightcurve arrays saved for kepid {kepid}'}), 404
+            return lightcurve_arrays_pending(kepid, kepler_catalog.snapshot().kepoi_names[row])
+        
+        try:
+            extracted = extract_features(series, stellar=stellar)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        result = predict_datapoint('kepler', extracted.features)
+        if result['status'] != 'success':
+            return jsonify({'error': result['message']}), 500
+        
+        return jsonify({
+            'message': 'Lightcurve prediction completed',
+            'prediction': {
+                'is_exoplanet': result['is_exoplanet'],
+                'confidence': result['confidence'],
+                'kepid': kepid,
+                'model_version': result['model_version']
+            },
+            **extracted.to_dict()
         })
+        
+    except Exception as e:
+        logger.error(f"Lightcurve prediction error: {str(e)}")
+        return jsonify({'error': f'Lightcurve prediction failed: {str(e)}'}), 500
+
+
+@app.route('/api/predictions', methods=['GET'])
+def get_predictions():
+    """Get one page of predictions from database, newest first, streamed as JSON"""
+    try:
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        
+        try:
+            cursor = request.args.get('cursor')
+            cursor = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        
+        is_exoplanet = request.args.get('is_exoplanet')
+        if is_exoplanet is not None:
+            if is_exoplanet.lower() not in ('true', 'false', '1', '0'):
+                return jsonify({'error': 'is_exoplanet must be true or false'}), 400
+            is_exoplanet = is_exoplanet.lower() in ('true', '1')
+        
+        # Fetch one extra row to know whether there is a next page; the page
+        # is read before streaming starts, so no statement outlives the request
+        rows = db.get_predictions_page(
+            limit + 1,
+            cursor=cursor,
+            dataset=request.args.get('dataset') or None,
+            candidate_id=request.args.get('candidate') or None,
+            is_exoplanet=is_exoplanet
+        )
+        
+        def generate():
+            yield '{"predictions": ['
+            count = 0
+            last_cursor = None
+            has_more = False
+            for prediction in rows:
+                if count == limit:
+                    has_more = True
+                    break
+                last_cursor = prediction.pop('cursor')
+                yield (', ' if count else '') + json.dumps(prediction)
+                count += 1
+            next_cursor = encode_cursor(last_cursor) if has_more else None
+            yield f'], "count": {count}, "next_cursor": {json.dumps(next_cursor)}}}'
+        
+        return Response(stream_with_context(generate()), mimetype='application/json')
     except Exception as e:
         logger.error(f"Error getting predictions: {str(e)}")
         return jsonify({'error': 'Failed to get predictions'}), 500
@@ -191,10 +412,9 @@ def save_prediction():
             return jsonify({'error': 'No data provided'}), 400
         
         # Validate required fields
-        required_fields = ['exoplanet_id', 'dataset', 'prediction', 'timestamp']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
+        error = validate_prediction(data)
+        if error:
+            return jsonify({'error': error}), 400
         
         # Save to database
         success = db.save_prediction(data)
@@ -208,9 +428,57 @@ def save_prediction():
         logger.error(f"Error saving prediction: {str(e)}")
         return jsonify({'error': 'Failed to save prediction'}), 500
 
+@app.route('/api/predictions/save_bulk', methods=['POST'])
+def save_predictions_bulk():
+    """Save many predictions at once, from a JSON array or an NDJSON stream"""
+    try:
+        saved = 0
+        errors = []
+        
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            # Read the body line by line and insert in fixed-size batches so
+            # uploads of any size use bounded memory
+            batch_size = 1000
+            batch, batch_indexes = [], []
+            for index, line in enumerate(request.stream):
+                if not line.strip():
+                    continue
+                try:
+                    batch.append(json.loads(line))
+                    batch_indexes.append(index)
+                except ValueError:
+                    errors.append({'index': index, 'error': 'Invalid JSON'})
+                if len(batch) >= batch_size:
+                    result = db.save_predictions_many(batch, batch_indexes)
+                    saved += result['saved']
+                    errors.extend(result['errors'])
+                    batch, batch_indexes = [], []
+            if batch:
+                result = db.save_predictions_many(batch, batch_indexes)
+                saved += result['saved']
+                errors.extend(result['errors'])
+        else:
+            data = request.get_json(silent=True)
+            records = data.get('predictions') if isinstance(data, dict) else data
+            if not isinstance(records, list):
+                return jsonify({'error': 'Expected a JSON array of predictions or an NDJSON body'}), 400
+            result = db.save_predictions_many(records)
+            saved += result['saved']
+            errors.extend(result['errors'])
+        
+        return jsonify({
+            'message': f'Saved {saved} predictions',
+            'saved': saved,
+            'errors': errors
+        }), 200 if saved or not errors else 400
+            
+    except Exception as e:
+        logger.error(f"Error saving predictions in bulk: {str(e)}")
+        return jsonify({'error': 'Failed to save predictions'}), 500
+
 @app.route('/api/lightcurve/generate', methods=['POST'])
 def generate_lightcurve_endpoint():
-    """Generate lightcurve for a specific KOI name - OPTIMIZED FOR PRODUCTION"""
+    """Return a cached lightcurve for a KOI name, or queue a job to generate it"""
     try:
         data = request.get_json()
         koi_name = data.get('koi_name')
@@ -218,124 +486,239 @@ def generate_lightcurve_endpoint():
         if not koi_name:
             return jsonify({'error': 'KOI name is required'}), 400
 
-        # Create lightcurves directory if it doesn't exist
-        lightcurves_dir = 'lightcurves'
-        os.makedirs(lightcurves_dir, exist_ok=True)
+        kepid = kepler_catalog.get_kepid(koi_name)
+        if kepid is None:
+            return jsonify({'error': f'KOI name {koi_name} not found in dataset'}), 404
 
-        # Check if lightcurve already exists in files
-        filename = f"{koi_name.replace('.', '_')}.png"
-        file_path = os.path.join(lightcurves_dir, filename)
-        
-        if os.path.exists(file_path):
-            # Get kepid for URL construction
-            try:
-                csv_path = '../Assets/clean_kepler_dataset.csv'
-                if os.path.exists(csv_path):
-                    df = pd.read_csv(csv_path)
-                    matching_rows = df[df['kepoi_name'] == koi_name]
-                    if not matching_rows.empty:
-                        kepid = int(matching_rows['kepid'].iloc[0])
-                    else:
-                        kepid = 123456  # Default fallback
-                else:
-                    kepid = 123456  # Default fallback
-            except Exception as e:
-                logger.warning(f"Could not get kepid for {koi_name}: {str(e)}")
-                kepid = 123456  # Default fallback
-            
+        # Check the cache (files and database) by kepid, the same key the URL uses
+        cached = lightcurve_cache.lookup(kepid)
+        if cached is not None:
             return jsonify({
                 'success': True,
                 'message': 'Lightcurve already exists',
-                'filename': filename,
+                'filename': f"{cached.key}.png",
                 'title': f"Lightcurve for {koi_name}",
-                'url': f"/api/lightcurve/{kepid}.png"
+                'url': f"/api/lightcurve/{cached.key}.png"
             })
 
-        # OPTIMIZATION: Add timeout protection
-        import signal
-        import time
-        
-        def timeout_handler(signum, frame):
-            raise TimeoutError("Lightcurve generation timed out")
-        
-        # Set 30 second timeout
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(30)
-        
-        try:
-            # Generate lightcurve with timeout protection
-            logger.info(f"Starting lightcurve generation for {koi_name}")
-            start_time = time.time()
-            
-            success, image_data, filename, kepid = generate_lightcurve(koi_name)
-            
-            generation_time = time.time() - start_time
-            logger.info(f"Lightcurve generation took {generation_time:.2f} seconds")
-            
-            signal.alarm(0)  # Cancel timeout
-            
-            if success and image_data:
-                # Save to file (for immediate compatibility)
-                with open(file_path, 'wb') as f:
-                    f.write(image_data)
-                
-                # Also try to save to database if available
-                try:
-                    db.save_lightcurve(koi_name, kepid, image_data, filename)
-                except Exception as db_error:
-                    logger.warning(f"Could not save to database: {db_error}")
-                
-                return jsonify({
-                    'success': True,
-                    'filename': filename,
-                    'title': f"Lightcurve for {koi_name}",
-                    'url': f"/api/lightcurve/{kepid}.png",
-                    'generation_time': round(generation_time, 2)
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': 'Failed to generate lightcurve - no data returned'
-                }), 500
-                
-        except TimeoutError:
-            signal.alarm(0)  # Cancel timeout
-            logger.error(f"Lightcurve generation timed out for {koi_name}")
-            return jsonify({
-                'success': False,
-                'error': 'Lightcurve generation timed out - try again later'
-            }), 408  # Request Timeout
+        # Render in the background; the client polls the status URL
+        job = lightcurve_jobs.submit(kepid, koi_name)
+        return jsonify({
+            'success': True,
+            'message': 'Lightcurve generation queued',
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'title': f"Lightcurve for {koi_name}",
+            'status_url': f"/api/lightcurve/jobs/{job['job_id']}"
+        }), 202
             
     except Exception as e:
         logger.error(f"Error generating lightcurve: {str(e)}")
         return jsonify({'error': f'Lightcurve generation failed: {str(e)}'}), 500
 
-@app.route('/api/lightcurve/<filename>', methods=['GET'])
-def get_lightcurve(filename):
-    """Serve lightcurve images - HYBRID APPROACH (file + database)"""
+@app.route('/api/lightcurve/jobs/<job_id>', methods=['GET'])
+def get_lightcurve_job(job_id):
+    """Report the progress of a lightcurve generation job"""
     try:
-        # First try to serve from file system
-        lightcurve_path = os.path.join('lightcurves', filename)
-        if os.path.exists(lightcurve_path):
-            return send_file(lightcurve_path, mimetype='image/png')
+        job = lightcurve_jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({
+            'job_id': job['job_id'],
+            'koi_name': job['koi_name'],
+            'kepid': job['kepid'],
+            'status': job['status'],
+            'stage': job['stage'],
+            'progress': job['progress'],
+            'url': job['url'],
+            'error': job['error']
+        })
+    except Exception as e:
+        logger.error(f"Error getting lightcurve job {job_id}: {str(e)}")
+        return jsonify({'error': 'Failed to get lightcurve job'}), 500
+
+def lightcurve_arrays_pending(kepid, koi_name):
+    """Response for a request that needs cleaned arrays which are not built yet"""
+    if lightcurve_arrays.is_unavailable(kepid):
+        return jsonify({'error': f'No lightcurve data available for kepid {kepid}'}), 404
+    
+    # Cleaning the raw data is a background job; the client polls and retries
+    job = lightcurve_jobs.submit(kepid, koi_name)
+    return jsonify({
+        'success': True,
+        'message': 'Lightcurve data is being prepared',
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'status_url': f"/api/lightcurve/jobs/{job['job_id']}"
+    }), 202
+
+@app.route('/api/lightcurve/<int:kepid>/data', methods=['GET'])
+def get_lightcurve_data(kepid):
+    """Serve cleaned lightcurve arrays, LTTB-downsampled, as JSON or little-endian float32"""
+    try:
+        points = request.args.get('points', 2000, type=int)
+        t0 = request.args.get('t0', type=float)
+        t1 = request.args.get('t1', type=float)
+        output_format = request.args.get('format', 'json')
+        
+        if not 3 <= points <= 20000:
+            return jsonify({'error': 'points must be between 3 and 20000'}), 400
+        if t0 is not None and t1 is not None and t0 > t1:
+            return jsonify({'error': 't0 must not be after t1'}), 400
+        if output_format not in ('json', 'f32'):
+            return jsonify({'error': "format must be 'json' or 'f32'"}), 400
         
-        # If not found in files, try database (for backward compatibility)
         try:
-            # Extract kepid from filename (e.g., "10419211.png" -> 10419211)
-            kepid = int(filename.replace('.png', ''))
-            lightcurve_data = db.get_lightcurve_by_kepid(kepid)
-            if lightcurve_data:
-                return Response(
-                    lightcurve_data['image_data'],
-                    mimetype='image/png',
-                    headers={
-                        'Content-Disposition': f'inline; filename="{lightcurve_data["filename"]}"'
-                    }
-                )
-        except (ValueError, Exception) as db_error:
-            logger.warning(f"Database lookup failed: {db_error}")
+            catalog = kepler_catalog.snapshot()
+        except OSError:
+            return jsonify({'error': 'Kepler dataset not found'}), 400
+        row = catalog.kepid_index.get(kepid)
+        if row is None:
+            return jsonify({'error': f'kepid {kepid} not found in dataset'}), 404
+        
+        series = lightcurve_arrays.load(kepid)
+        if series is None:
+            return lightcurve_arrays_pending(kepid, catalog.kepoi_names[row])
+        
+        window = series.between(t0, t1)
+        sampled = window.downsample(points)
+        
+        if output_format == 'f32':
+            # Times go out relative to the first point so float32 keeps
+            # sub-minute precision; the offset is sent as a header
+            time_offset = float(sampled.time[0]) if len(sampled) else 0.0
+            body = np.empty((2, len(sampled)), dtype='<f4')
+            body[0] = sampled.time - time_offset
+            body[1] = sampled.flux
+            return Response(
+                body.tobytes(),
+                mimetype='application/octet-stream',
+                headers={
+                    'X-Points': str(len(sampled)),
+                    'X-Total-Points': str(len(window)),
+                    'X-Time-Offset': repr(time_offset),
+                    'X-Layout': 'time[points],flux[points]',
+                    'Access-Control-Expose-Headers': 'X-Points, X-Total-Points, X-Time-Offset, X-Layout'
+                }
+            )
+        
+        return jsonify({
+            'kepid': kepid,
+            'points': len(sampled),
+            'total_points': len(window),
+            'time': sampled.time.tolist(),
+            'flux': sampled.flux.tolist()
+        })
+    except Exception as e:
+        logger.error(f"Error serving lightcurve data for kepid {kepid}: {str(e)}")
+        return jsonify({'error': 'Failed to serve lightcurve data'}), 500
+
+@app.route('/api/lightcurve/folded/<koi_name>', methods=['GET'])
+def get_folded_lightcurve(koi_name):
+    """Serve a KOI's lightcurve folded on its catalog period and binned around mid-transit"""
+    try:
+        bins = request.args.get('bins', 100, type=int)
+        output_format = request.args.get('format', 'json')
+        
+        if not 10 <= bins <= 1000:
+            return jsonify({'error': 'bins must be between 10 and 1000'}), 400
+        if output_format not in ('json', 'png'):
+            return jsonify({'error': "format must be 'json' or 'png'"}), 400
+        
+        try:
+            kepid = kepler_catalog.get_kepid(koi_name)
+            ephemeris = kepler_catalog.get_ephemeris(koi_name)
+        except OSError:
+            return jsonify({'error': 'Kepler dataset not found'}), 400
+        if kepid is None:
+            return jsonify({'error': f'KOI name {koi_name} not found in dataset'}), 404
+        period, time0bk, duration = ephemeris
+        
+        if output_format == 'png':
+            cached = lightcurve_cache.lookup(kepid, 'folded', koi=koi_name, bins=bins)
+            if cached is not None:
+                # The key covers the fold parameters, so the render never changes
+                response = send_file(cached.path, mimetype='image/png', conditional=True,
+                                     etag=lightcurve_cache.content_hash(cached), max_age=IMMUTABLE_IMAGE_MAX_AGE)
+                response.cache_control.public = True
+                response.cache_control.immutable = True
+                return response
+        
+        series = lightcurve_arrays.load(kepid)
+        if series is None:
+            return lightcurve_arrays_pending(kepid, koi_name)
         
-        return jsonify({'error': 'Lightcurve not found'}), 404
+        try:
+            profile = fold_lightcurve(series, koi_name, period, time0bk, duration, bins)
+            image_data = render_folded_png(profile) if output_format == 'png' else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if image_data is not None:
+            entry = lightcurve_cache.put(kepid, image_data, candidate_id=koi_name, view='folded', koi=koi_name, bins=bins)
+            response = Response(image_data, mimetype='image/png')
+            response.set_etag(entry.sha256)
+            response.cache_control.max_age = IMMUTABLE_IMAGE_MAX_AGE
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+            return response.make_conditional(request)
+        
+        return jsonify(profile.to_dict())
+    except Exception as e:
+        logger.error(f"Error folding lightcurve for {koi_name}: {str(e)}")
+        return jsonify({'error': 'Failed to fold lightcurve'}), 500
+
+@app.route('/api/lightcurve/<filename>', methods=['GET'])
+def get_lightcurve(filename):
+    """Serve lightcurve images - HYBRID APPROACH (file + database), with ETag revalidation"""
+    try:
+        # Both the file and database copies are found through the cache index
+        key, ext = os.path.splitext(filename)
+        entry = lightcurve_cache.lookup_key(key) if ext == '.png' else None
+        if entry is None:
+            return jsonify({'error': 'Lightcurve not found'}), 404
+        
+        # Renders keyed by their parameters never change; the default render
+        # of a kepid can be regenerated, so clients revalidate it daily
+        max_age = DEFAULT_IMAGE_MAX_AGE if entry.is_default_view else IMMUTABLE_IMAGE_MAX_AGE
+        
+        if entry.location == 'file':
+            # Content-hash ETag, the same one the database copy is served
+            # with; send_file answers If-None-Match and Range itself
+            response = send_file(entry.path, mimetype='image/png', conditional=True,
+                                 etag=lightcurve_cache.content_hash(entry), max_age=max_age)
+            response.cache_control.public = True
+            response.cache_control.immutable = not entry.is_default_view
+            return response
+        
+        # Revalidate against the stored hash; the BLOB (and its dedicated
+        # connection) is only opened when the response carries a body
+        info = db.get_lightcurve_info(entry.kepid)
+        if info is None:
+            return jsonify({'error': 'Lightcurve not found'}), 404
+        
+        if request.if_none_match.contains(info['sha256']):
+            response = Response(status=304)
+            etag = info['sha256']
+        else:
+            blob = db.open_lightcurve_blob(entry.kepid)
+            if blob is None:
+                return jsonify({'error': 'Lightcurve not found'}), 404
+            # Stream the BLOB in chunks instead of loading it into memory
+            response = Response(blob.chunks(), mimetype='image/png', direct_passthrough=True)
+            response.content_length = blob.size
+            response.headers['Content-Disposition'] = f'inline; filename="{blob.filename}"'
+            # Releases the connection if the client disconnects mid-stream
+            response.call_on_close(blob.close)
+            # The row may have been replaced since the hash was read
+            etag = blob.sha256
+        
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        response.cache_control.immutable = not entry.is_default_view
+        return response
     except Exception as e:
         logger.error(f"Error serving lightcurve {filename}: {str(e)}")
         return jsonify({'error': 'Failed to serve lightcurve'}), 500
@@ -347,4 +730,5 @@ if __name__ == '__main__':
     print("📊 Endpoints: /api/autocomplete/kepler, /api/predict/kepler")
     print("💾 Database endpoints: /api/predictions, /api/predictions/stats, /api/predictions/save")
     print("✨ Kepler-only mode with database persistence enabled!")
+    prediction_table.load_or_build()
     app.run(debug=True, host='0.0.0.0', port=5002)
@@ -0,0 +1,165 @@
+"""
+Autocomplete index for Kepler candidate names
+Built once from kepler_options.txt: a sorted array for prefix search plus a trigram index for substring matches
+"""
+
+import os
+import bisect
+import hashlib
+import json
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AutocompleteSnapshot:
+    """Immutable index over one version of the options file."""
+
+    def __init__(self, content: bytes, mtime: float):
+        self.mtime = mtime
+        self.etag = hashlib.sha1(content).hexdigest()
+        self.suggestions: List[str] = [
+            line.strip() for line in content.decode('utf-8').splitlines() if line.strip()
+        ]
+        self.lowered = [s.lower() for s in self.suggestions]
+
+        # Sorted array for prefix search: parallel lists of keys and entry ids
+        order = sorted(range(len(self.lowered)), key=lambda i: (self.lowered[i], i))
+        self.sorted_keys = [self.lowered[i] for i in order]
+        self.sorted_ids = order
+
+        # Trigram -> ascending entry ids
+        trigrams: Dict[str, List[int]] = {}
+        for entry_id, key in enumerate(self.lowered):
+            for gram in {key[i:i + 3] for i in range(len(key) - 2)}:
+                trigrams.setdefault(gram, []).append(entry_id)
+        self.trigrams = trigrams
+
+        self._full_list_json: Optional[bytes] = None
+
+    def full_list_json(self) -> bytes:
+        """Serialized response body for the unfiltered list, built once."""
+        if self._full_list_json is None:
+            self._full_list_json = json.dumps({
+                'suggestions': self.suggestions,
+                'dataset': 'kepler',
+                'total_count': len(self.suggestions)
+            }).encode('utf-8')
+        return self._full_list_json
+
+    def _prefix_ids(self, query: str) -> List[int]:
+        lo = bisect.bisect_left(self.sorted_keys, query)
+        hi = bisect.bisect_left(self.sorted_keys, query + '\uffff', lo)
+        return self.sorted_ids[lo:hi]
+
+    def _substring_candidates(self, query: str) -> Iterable[int]:
+        if len(query) < 3:
+            # Too short for trigrams; a scan over ~10k short strings is cheap
+            return range(len(self.lowered))
+
+        postings = []
+        for gram in {query[i:i + 3] for i in range(len(query) - 2)}:
+            posting = self.trigrams.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return sorted(candidates)
+
+    def search(self, query: str) -> List[str]:
+        """
+        Rank every entry matching a query.
+
+        Exact matches come first, then prefix matches in sorted order, then
+        other substring matches ordered by where the query occurs.
+
+        Args:
+            query: Case-insensitive search text
+
+        Returns:
+            All matching suggestions, best first
+        """
+        query = query.lower()
+        prefix_ids = self._prefix_ids(query)
+        prefix_set = set(prefix_ids)
+
+        substring_matches = []
+        for entry_id in self._substring_candidates(query):
+            if entry_id in prefix_set:
+                continue
+            position = self.lowered[entry_id].find(query)
+            if position > 0:
+                substring_matches.append((position, self.lowered[entry_id], entry_id))
+        substring_matches.sort()
+
+        # Prefix ids are already sorted, so an exact match is at the front
+        ranked = prefix_ids + [entry_id for _, _, entry_id in substring_matches]
+        return [self.suggestions[entry_id] for entry_id in ranked]
+
+
+class AutocompleteIndex:
+    """Loads the options file once and reloads it when it changes."""
+
+    def __init__(self, options_path: str = '../Datasets/kepler_options.txt'):
+        """
+        Args:
+            options_path: Path to the newline separated candidate names
+        """
+        self.options_path = options_path
+        self._snapshot: Optional[AutocompleteSnapshot] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> AutocompleteSnapshot:
+        """Read the options file and swap in a freshly built index."""
+        mtime = os.path.getmtime(self.options_path)
+        with open(self.options_path, 'rb') as f:
+            snapshot = AutocompleteSnapshot(f.read(), mtime)
+        self._snapshot = snapshot
+        logger.info(f"Built autocomplete index with {len(snapshot.suggestions)} entries")
+        return snapshot
+
+    def snapshot(self) -> AutocompleteSnapshot:
+        """Get the current index, building it on first use."""
+        snapshot = self._snapshot
+        try:
+            current_mtime = os.path.getmtime(self.options_path)
+        except OSError:
+            if snapshot is None:
+                raise
+            return snapshot
+
+        if snapshot is not None and snapshot.mtime == current_mtime:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.mtime != os.path.getmtime(self.options_path):
+                snapshot = self.load()
+        return snapshot
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Tuple[List[str], int]:
+        """
+        Get one page of ranked suggestions.
+
+        Args:
+            query: Case-insensitive search text
+            limit: Maximum number of suggestions to return
+            offset: Number of ranked suggestions to skip
+
+        Returns:
+            Tuple of (suggestions, total number of matches)
+        """
+        matches = self.snapshot().search(query)
+        return matches[offset:offset + limit], len(matches)
+
+
+# Global index instance
+kepler_autocomplete = AutocompleteIndex()
@@ -0,0 +1,455 @@
+"""
+Box Least Squares period search for NASA Exoplanet Detection
+Searches cleaned lightcurve arrays for periodic transits with cumulative-sum phase binning
+
+Compare against astropy's BoxLeastSquares with: python bls.py benchmark [--kepid KEPID --center PERIOD] [--periods N]
+"""
+
+import math
+import multiprocessing
+import numpy as np
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Trial durations in days (1 to 12 hours), the range koi_duration mostly covers
+DEFAULT_DURATIONS = np.array([1, 1.5, 2, 3, 4, 6, 8, 12], dtype=np.float64) / 24
+
+# Phase bins per shortest trial duration
+BINS_PER_DURATION = 4
+
+# Period grids larger than this are split across a process pool. Spawning
+# the pool and pickling the cadences to it costs ~0.35 s, about a
+# 2000-period serial search; from here on it is under a tenth of the search
+PARALLEL_MIN_PERIODS = 30000
+
+# Close periods share one phase histogram when at least this many of them
+# drift by at most BLOCK_MAX_DRIFT phase bins from the first over the baseline
+BLOCK_MIN_PERIODS = 4
+BLOCK_MAX_DRIFT = 8
+
+# Bound on periods x durations x phase bins scored at once
+BLOCK_MAX_CELLS = 2_000_000
+
+
+class BLSResult:
+    """Best box-shaped transit found by a period search, plus the full periodogram."""
+
+    def __init__(self, period: float, epoch: float, duration: float, depth: float,
+                 depth_err: float, power: float, periods: np.ndarray, powers: np.ndarray,
+                 transit_count: int):
+        self.period = period          # days
+        self.epoch = epoch            # mid-transit time, same time system as the input (BKJD)
+        self.duration = duration      # days
+        self.depth = depth            # fractional flux drop
+        self.depth_err = depth_err
+        self.power = power            # log-likelihood improvement, 0.5 * snr**2
+        self.periods = periods
+        self.powers = powers
+        self.transit_count = transit_count  # transits with at least one in-box cadence
+
+    @property
+    def snr(self) -> float:
+        return self.depth / self.depth_err if self.depth_err > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'period_days': self.period,
+            'epoch_bkjd': self.epoch,
+            'duration_hours': self.duration * 24,
+            'depth_ppm': self.depth * 1e6,
+            'depth_err_ppm': self.depth_err * 1e6,
+            'snr': self.snr,
+            'power': self.power,
+            'transit_count': self.transit_count,
+            'periods_searched': len(self.periods)
+        }
+
+
+def period_grid(time: np.ndarray, min_period: float, max_period: float,
+                min_duration: float = DEFAULT_DURATIONS[0], oversample: float = 2.0) -> np.ndarray:
+    """
+    Trial periods evenly spaced in frequency.
+
+    The frequency step keeps the accumulated phase drift over the whole
+    baseline below min_duration / oversample, the same rule astropy's
+    autoperiod uses.
+
+    Args:
+        time: Observation times in days
+        min_period: Shortest period in days
+        max_period: Longest period in days
+        min_duration: Shortest trial duration in days
+        oversample: Steps per min_duration of drift
+
+    Returns:
+        Ascending periods in days
+    """
+    baseline = float(np.max(time) - np.min(time))
+    step = min_duration / (oversample * baseline ** 2)
+    frequencies = np.arange(1.0 / max_period, 1.0 / min_period, step)
+    return np.sort(1.0 / frequencies)
+
+
+def _best_boxes(bin_weight: np.ndarray, bin_flux: np.ndarray, widths: np.ndarray,
+                total_weight: float) -> np.ndarray:
+    """
+    Score every box position and duration of folded profiles at once.
+
+    Args:
+        bin_weight: (periods, nbins) summed weights per phase bin
+        bin_flux: (periods, nbins) summed weighted flux per phase bin
+        widths: Box width in bins for each duration, ascending
+        total_weight: Sum of all weights
+
+    Returns:
+        (periods, 4) array of power, box centre phase, duration index and
+        in-box weight of the best box per period (all zero if none is a dip)
+    """
+    count, nbins = bin_weight.shape
+    max_width = int(widths[-1])
+
+    # Cumulative sums of weight and flux, continued past the last bin with
+    # the first max_width bins so boxes can straddle phase 0
+    cum = np.zeros((2, count, nbins + max_width + 1))
+    np.cumsum(bin_weight, axis=1, out=cum[0, :, 1:nbins + 1])
+    np.cumsum(bin_flux, axis=1, out=cum[1, :, 1:nbins + 1])
+    cum[:, :, nbins + 1:] = cum[:, :, nbins, None] + cum[:, :, 1:max_width + 1]
+
+    # Weight and flux in the box of each duration starting at each bin
+    boxes = np.empty((2, count, len(widths), nbins))
+    for d, width in enumerate(widths):
+        np.subtract(cum[:, :, width:width + nbins], cum[:, :, :nbins], out=boxes[:, :, d])
+    in_weight, in_flux = boxes
+    # Delta log-likelihood of a box with depth -in_flux * W / (W_in * W_out)
+    # against a flat line is 0.5 * W * in_flux^2 / (W_in * W_out). Only dips
+    # count, and an empty box (or one holding every cadence) has no flux
+    # offset, so a floor on the denominator scores it zero
+    np.minimum(in_flux, 0.0, out=in_flux)
+    np.square(in_flux, out=in_flux)
+    denominator = total_weight - in_weight
+    np.multiply(denominator, in_weight, out=denominator)
+    np.maximum(denominator, total_weight * total_weight * 1e-12, out=denominator)
+    power = np.divide(in_flux, denominator, out=in_flux)
+
+    rows = np.arange(count)
+    duration_index, start = np.divmod(power.reshape(count, -1).argmax(axis=1), nbins)
+    best = np.empty((count, 4))
+    best[:, 0] = 0.5 * total_weight * power[rows, duration_index, start]
+    best[:, 1] = (start + widths[duration_index] / 2) / nbins
+    best[:, 2] = duration_index
+    best[:, 3] = in_weight[rows, duration_index, start]
+    best[best[:, 0] <= 0] = 0.0
+    return best
+
+
+def _box_widths(period: float, nbins: int, durations: np.ndarray) -> np.ndarray:
+    return np.maximum(np.rint(durations / period * nbins).astype(np.int64), 1)
+
+
+def _search_periods(time: np.ndarray, dflux: np.ndarray, weights: np.ndarray,
+                    periods: np.ndarray, durations: np.ndarray) -> np.ndarray:
+    """
+    Score every period in a grid. Runs in the caller or in a pool process.
+
+    Runs of close periods share one phase histogram (see _search_block);
+    an isolated period is folded on its own in float32.
+
+    Args:
+        time: Times relative to the first cadence
+        dflux: Flux minus its weighted mean
+        weights: Inverse variances
+        periods: Trial periods, ascending
+        durations: Trial durations, ascending
+
+    Returns:
+        (len(periods), 4) array of power, box centre phase, duration index
+        and in-box weight for the best box at each period
+    """
+    total_weight = float(weights.sum())
+    weighted_flux = weights * dflux
+    time_span = float(time.max())
+    best = np.zeros((len(periods), 4))
+
+    # Buffers for folding single periods; float32 phases are accurate to
+    # ~10 s over a four-year baseline, far below a phase bin
+    time32 = time.astype(np.float32)
+    phase = np.empty(len(time), dtype=np.float32)
+    whole = np.empty(len(time), dtype=np.float32)
+    bins = np.empty(len(time), dtype=np.intp)
+
+    p = 0
+    while p < len(periods):
+        period = float(periods[p])
+        # Phase bins narrow enough to resolve the shortest duration
+        nbins = max(int(math.ceil(period / durations[0] * BINS_PER_DURATION)), 2)
+        widths = _box_widths(period, nbins, durations)
+        if widths[-1] >= nbins:
+            p += 1
+            continue
+
+        # Periods whose phase drifts less than BLOCK_MAX_DRIFT bins from this
+        # one over the baseline (and less than half a bin per cycle)
+        cycles = int(time_span / period) + 1
+        max_drift = min(BLOCK_MAX_DRIFT, cycles / 2)
+        end = int(np.searchsorted(periods, period / (1 - max_drift / (cycles * nbins)), side='right'))
+        end = min(end, p + max(1, BLOCK_MAX_CELLS // (len(durations) * nbins)))
+        if end - p >= BLOCK_MIN_PERIODS:
+            best[p:end] = _search_block(time, weights, weighted_flux, periods[p:end],
+                                        nbins, cycles, widths, total_weight)
+            p = end
+            continue
+
+        np.multiply(time32, np.float32(1.0 / period), out=phase)
+        np.floor(phase, out=whole)
+        np.subtract(phase, whole, out=phase)
+        np.multiply(phase, np.float32(nbins), out=phase)
+        bins[:] = phase
+        bin_weight = np.bincount(bins, weights=weights, minlength=nbins + 1)
+        bin_flux = np.bincount(bins, weights=weighted_flux, minlength=nbins + 1)
+        # float32 rounding can put a phase just below 1 into bin nbins
+        bin_weight[0] += bin_weight[nbins]
+        bin_flux[0] += bin_flux[nbins]
+        best[p] = _best_boxes(bin_weight[None, :nbins], bin_flux[None, :nbins], widths, total_weight)[0]
+        p += 1
+
+    return best
+
+
+def _search_block(time: np.ndarray, weights: np.ndarray, weighted_flux: np.ndarray,
+                  periods: np.ndarray, nbins: int, cycles: int, widths: np.ndarray,
+                  total_weight: float) -> np.ndarray:
+    """
+    Score a run of close periods from one phase histogram.
+
+    The cadences are binned once by cycle and phase at the block's first
+    period P0, and summed cumulatively over cycles. At a period P >= P0
+    the cycle c lands rint(c * nbins * (1 - P0 / P)) bins earlier, so the
+    cycles form at most BLOCK_MAX_DRIFT + 1 contiguous runs with a common
+    shift. Each period is folded from those run sums instead of from every
+    cadence, and all periods and durations are scored in one pass.
+
+    Returns:
+        (len(periods), 4) array as _search_periods
+    """
+    # Histogram by (cycle, phase bin) at P0, cumulative over cycles
+    index = (time * (nbins / periods[0])).astype(np.intp)
+    cum_weight = np.zeros((cycles + 1, nbins))
+    cum_flux = np.zeros((cycles + 1, nbins))
+    np.cumsum(np.bincount(index, weights=weights, minlength=cycles * nbins)[:cycles * nbins]
+              .reshape(cycles, nbins), axis=0, out=cum_weight[1:])
+    np.cumsum(np.bincount(index, weights=weighted_flux, minlength=cycles * nbins)[:cycles * nbins]
+              .reshape(cycles, nbins), axis=0, out=cum_flux[1:])
+
+    # Cycles [first, last) of each period move back by `shift` bins
+    drift = nbins * (1 - periods[0] / periods)
+    shifts = np.arange(BLOCK_MAX_DRIFT + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        first = np.ceil((shifts - 0.5) / drift[:, None])
+        last = np.ceil((shifts + 0.5) / drift[:, None])
+    # With no drift (P = P0) every cycle has shift 0
+    first = np.clip(first, 0, cycles).astype(np.intp)
+    last = np.clip(last, 0, cycles).astype(np.intp)
+
+    # Phase bin b of a run shifted by s comes from bin (b + s) % nbins at P0
+    source = (np.arange(nbins) + shifts[:, None]) % nbins
+    runs = shifts[:, None]
+    bin_weight = (cum_weight[last][:, runs, source] - cum_weight[first][:, runs, source]).sum(axis=1)
+    bin_flux = (cum_flux[last][:, runs, source] - cum_flux[first][:, runs, source]).sum(axis=1)
+    return _best_boxes(bin_weight, bin_flux, widths, total_weight)
+
+
+def bls_search(time, flux, flux_err=None, periods: Optional[np.ndarray] = None,
+               durations: Sequence[float] = DEFAULT_DURATIONS, min_period: float = 0.5,
+               max_period: Optional[float] = None, oversample: float = 2.0,
+               workers: Optional[int] = None) -> BLSResult:
+    """
+    Run a Box Least Squares period search.
+
+    Each trial period's cadences are binned in phase (runs of close periods
+    share one cycle-by-phase histogram), and every box position for every
+    duration is then scored at once from cumulative sums. Large grids are
+    split into chunks scored in a process pool.
+
+    Args:
+        time: Observation times in days (BKJD)
+        flux: Normalized flux
+        flux_err: Flux uncertainties (default: uniform weights)
+        periods: Trial periods in days (default: period_grid over
+            [min_period, max_period])
+        durations: Trial durations in days
+        min_period: Shortest period for the default grid
+        max_period: Longest period for the default grid (default: a third of
+            the baseline, so at least three transits)
+        oversample: Grid oversampling for the default grid
+        workers: Pool size for large grids (default: CPU count, 1 disables the pool)
+
+    Returns:
+        The best transit and the periodogram
+    """
+    time = np.asarray(time, dtype=np.float64)
+    flux = np.asarray(flux, dtype=np.float64)
+    if flux_err is None:
+        weights = np.ones_like(flux)
+    else:
+        flux_err = np.asarray(flux_err, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            weights = 1.0 / (flux_err * flux_err)
+
+    keep = np.isfinite(time) & np.isfinite(flux) & np.isfinite(weights) & (weights > 0)
+    time, flux, weights = time[keep], flux[keep], weights[keep]
+    if len(time) < 3:
+        raise ValueError("Not enough cadences for a period search")
+
+    durations = np.sort(np.asarray(durations, dtype=np.float64))
+    if periods is None:
+        baseline = float(time.max() - time.min())
+        max_period = max_period or baseline / 3
+        periods = period_grid(time, min_period, max_period, durations[0], oversample)
+    periods = np.asarray(periods, dtype=np.float64)
+    if len(periods) == 0:
+        raise ValueError("Empty period grid")
+
+    reference = float(time.min())
+    time_rel = time - reference
+    dflux = flux - np.average(flux, weights=weights)
+
+    workers = workers or multiprocessing.cpu_count()
+    if workers > 1 and len(periods) >= PARALLEL_MIN_PERIODS:
+        # One contiguous chunk per worker: each pickles every cadence, and
+        # a chunk boundary splits a run of periods sharing a histogram
+        chunks = np.array_split(periods, workers)
+        # Spawn rather than fork: callers may be multi-threaded API workers
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            parts = executor.map(_search_periods, *zip(*[
+                (time_rel, dflux, weights, chunk, durations) for chunk in chunks
+            ]))
+            best = np.concatenate(list(parts))
+    else:
+        best = _search_periods(time_rel, dflux, weights, periods, durations)
+
+    top = int(np.argmax(best[:, 0]))
+    power, phase, duration_index, in_weight = best[top]
+    period = float(periods[top])
+    duration = float(durations[int(duration_index)])
+    total_weight = float(weights.sum())
+    out_weight = total_weight - in_weight
+
+    if power <= 0:
+        return BLSResult(period, reference, duration, 0.0, 0.0, 0.0, periods, best[:, 0], 0)
+
+    # Depth and its uncertainty from the box's in/out weights
+    depth_err = math.sqrt(total_weight / (in_weight * out_weight))
+    depth = math.sqrt(2 * power) * depth_err
+    epoch = reference + phase * period
+
+    # Transit epochs that actually have an in-box cadence
+    offsets = np.mod(time - epoch + period / 2, period) - period / 2
+    in_box = np.abs(offsets) < duration / 2
+    transit_count = len(np.unique(np.rint((time[in_box] - epoch) / period)))
+
+    return BLSResult(period, epoch, duration, depth, depth_err, float(power),
+                     periods, best[:, 0], transit_count)
+
+
+# Transit injected into the benchmark's synthetic light curve
+SYNTHETIC_PERIOD = 3.52
+SYNTHETIC_DURATION = 3.0 / 24
+
+
+def _synthetic_lightcurve(seed: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Four years of long-cadence data with a 3.52 d, 800 ppm, 3 h transit."""
+    rng = np.random.default_rng(seed)
+    time = np.arange(131.5, 1591.0, 29.4 / 60 / 24)
+    flux = 1.0 + 3e-4 * rng.standard_normal(len(time))
+    offsets = np.mod(time - 134.2 + SYNTHETIC_PERIOD / 2, SYNTHETIC_PERIOD) - SYNTHETIC_PERIOD / 2
+    flux[np.abs(offsets) < SYNTHETIC_DURATION / 2] -= 8e-4
+    return time, flux, np.full(len(time), 3e-4)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time as timer
+
+    parser = argparse.ArgumentParser(description='Box Least Squares tools')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subcommands.add_parser('benchmark', help='Time bls_search against astropy BoxLeastSquares')
+    bench_parser.add_argument('--kepid', type=int, help='Use the saved cleaned arrays of this star')
+    bench_parser.add_argument('--center', type=float, default=SYNTHETIC_PERIOD,
+                              help='Period the grid is centred on (default: the synthetic transit, %(default)s d)')
+    bench_parser.add_argument('--periods', type=int, default=2000, help='Trial periods (default: %(default)s)')
+    bench_parser.add_argument('--oversample', type=float, default=2.0,
+                              help='Grid oversampling, as period_grid (default: %(default)s)')
+    bench_parser.add_argument('--workers', type=int, default=None, help='Pool size (default: CPU count)')
+    args = parser.parse_args()
+
+    if args.kepid is not None:
+        from lightcurve_arrays import lightcurve_arrays
+        series = lightcurve_arrays.load(args.kepid)
+        if series is None:
+            raise SystemExit(f"No saved arrays for kepid {args.kepid}")
+        time_values, flux_values, flux_errors = series.time, series.flux, series.flux_err
+    else:
+        time_values, flux_values, flux_errors = _synthetic_lightcurve()
+
+    # Frequencies at period_grid's spacing around the centre, fine enough to
+    # resolve a transit's duration
+    baseline = float(np.ptp(time_values))
+    step = DEFAULT_DURATIONS[0] / (args.oversample * baseline ** 2)
+    grid = np.sort(1.0 / (1.0 / args.center + step * (np.arange(args.periods) - args.periods // 2)))
+    print(f"{len(time_values)} cadences, {len(grid)} periods around {args.center} d, "
+          f"{len(DEFAULT_DURATIONS)} durations")
+
+    # bls_search only uses the pool from PARALLEL_MIN_PERIODS on; below that
+    # it is forced here so its cost is reported, but not held to the gate
+    pool_gated = len(grid) >= PARALLEL_MIN_PERIODS
+    parallel_min_periods = PARALLEL_MIN_PERIODS
+
+    timings = {}
+    results = {}
+    for label, workers in (('numpy (1 process)', 1), ('numpy (pool)', args.workers)):
+        PARALLEL_MIN_PERIODS = 0 if workers != 1 else parallel_min_periods
+        start = timer.perf_counter()
+        results[label] = result = bls_search(time_values, flux_values, flux_errors, periods=grid, workers=workers)
+        timings[label] = timer.perf_counter() - start
+        PARALLEL_MIN_PERIODS = parallel_min_periods
+        print(f"{label:>18}: {timings[label]:7.2f} s  period={result.period:.5f} d "
+              f"depth={result.depth * 1e6:.0f} ppm snr={result.snr:.1f} "
+              f"duration={result.duration * 24:.1f} h epoch={result.epoch:.4f}")
+
+    from astropy.timeseries import BoxLeastSquares
+    start = timer.perf_counter()
+    model = BoxLeastSquares(np.asarray(time_values, dtype=np.float64),
+                            np.asarray(flux_values, dtype=np.float64),
+                            np.asarray(flux_errors, dtype=np.float64))
+    astropy_result = model.power(grid, DEFAULT_DURATIONS, objective='likelihood')
+    timings['astropy'] = timer.perf_counter() - start
+    top = int(np.argmax(astropy_result.power))
+    print(f"{'astropy':>18}: {timings['astropy']:7.2f} s  period={astropy_result.period[top]:.5f} d "
+          f"depth={astropy_result.depth[top] * 1e6:.0f} ppm "
+          f"snr={astropy_result.depth_snr[top]:.1f} duration={astropy_result.duration[top] * 24:.1f} h "
+          f"epoch={astropy_result.transit_time[top]:.4f}")
+
+    # The injected transit for synthetic data, astropy's answer for a real star
+    if args.kepid is None:
+        expected_period, expected_duration = SYNTHETIC_PERIOD, SYNTHETIC_DURATION
+    else:
+        expected_period, expected_duration = float(astropy_result.period[top]), float(astropy_result.duration[top])
+
+    failures = []
+    for label in ('numpy (1 process)', 'numpy (pool)'):
+        result = results[label]
+        print(f"speedup vs astropy, {label}: {timings['astropy'] / timings[label]:.2f}x")
+        if label == 'numpy (pool)' and not pool_gated:
+            print(f"  (not gated on speed: bls_search only uses the pool from {PARALLEL_MIN_PERIODS} periods)")
+        elif timings[label] >= timings['astropy']:
+            failures.append(f"{label} is slower than astropy ({timings[label]:.2f} s vs {timings['astropy']:.2f} s)")
+        if not math.isclose(result.duration, expected_duration):
+            failures.append(f"{label} found a {result.duration * 24:.1f} h box, expected {expected_duration * 24:.1f} h")
+        if abs(result.period - expected_period) > 1e-3 * expected_period:
+            failures.append(f"{label} found P={result.period:.5f} d, expected {expected_period:.5f} d")
+    if failures:
+        raise SystemExit("BENCHMARK FAILED:\n  " + "\n  ".join(failures))
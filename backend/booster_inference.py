@@ -0,0 +1,144 @@
+"""
+Native XGBoost inference for NASA Exoplanet Detection
+Scores float32 rows with Booster.inplace_predict, skipping the sklearn wrapper's per-call checks and conversions
+
+Check parity and speed against predict_proba with: python booster_inference.py validate
+"""
+
+import os
+import numpy as np
+import logging
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Threads per prediction call. Requests are one or a few rows, and every
+# gunicorn thread already runs its own request, so extra OpenMP threads only
+# add contention; raise it for processes that score large batches
+DEFAULT_NTHREAD = int(os.environ.get('XGB_NTHREAD', '1'))
+
+
+class BoosterPredictor:
+    """
+    Class probabilities from a fitted XGBClassifier's Booster.
+    Mirrors XGBClassifier.predict_proba (same iteration range, missing
+    value and binary column stacking) so the results are bit-identical.
+    """
+
+    def __init__(self, model, nthread: int = DEFAULT_NTHREAD):
+        """
+        Args:
+            model: A fitted xgboost.XGBClassifier
+            nthread: Threads per prediction call
+        """
+        self.model = model
+        self.nthread = nthread
+        self.booster = model.get_booster()
+        self.booster.set_param({'nthread': nthread})
+        self.missing = model.missing
+        self.iteration_range = self._iteration_range(model)
+
+    @staticmethod
+    def _iteration_range(model) -> Tuple[int, int]:
+        """The trees predict_proba uses: up to best_iteration after early stopping, else all."""
+        try:
+            return 0, model.best_iteration + 1
+        except AttributeError:
+            return 0, 0
+
+    def predict_proba(self, data: np.ndarray) -> np.ndarray:
+        """
+        Score rows of model features.
+
+        Args:
+            data: N x 15 matrix; float32 C-contiguous input is used without a copy
+
+        Returns:
+            N x n_classes float32 probabilities, as XGBClassifier.predict_proba
+        """
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        scores = self.booster.inplace_predict(
+            data,
+            iteration_range=self.iteration_range,
+            predict_type='value',
+            missing=self.missing,
+            validate_features=False
+        )
+        if scores.ndim == 2:
+            return scores
+        # Binary objectives return P(class 1) only
+        return np.vstack((1.0 - scores, scores)).T
+
+
+def make_predictor(model, nthread: int = DEFAULT_NTHREAD) -> Optional[BoosterPredictor]:
+    """
+    Build a Booster predictor for a model, or None if it isn't an XGBClassifier.
+
+    Returns:
+        The predictor, or None to fall back to the model's own predict_proba
+    """
+    if not hasattr(model, 'get_booster') or not hasattr(model, 'predict_proba'):
+        return None
+    # predict_proba post-processes margins for these, not the 'value' output
+    if getattr(model, 'objective', None) in ('multi:softmax', 'binary:logitraw'):
+        return None
+    try:
+        return BoosterPredictor(model, nthread)
+    except Exception as e:
+        logger.warning(f"Falling back to predict_proba: {str(e)}")
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+    import pickle
+    import sys
+    import time as timer
+
+    parser = argparse.ArgumentParser(description='Native Booster inference tools')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    validate_parser = subcommands.add_parser(
+        'validate', help='Check bit-identical output against predict_proba and time both')
+    validate_parser.add_argument('--model', default='models/koi_xgb.pkl')
+    validate_parser.add_argument('--random-rows', type=int, default=10000,
+                                 help='Random rows scored in addition to the catalog')
+    validate_parser.add_argument('--runs', type=int, default=2000, help='Single-row calls timed per path')
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+    predictor = BoosterPredictor(model)
+
+    from kepler_catalog import kepler_catalog
+    catalog = kepler_catalog.snapshot().features
+    rng = np.random.default_rng(0)
+    # Random rows spread over the catalog's range, with some missing values
+    low, high = np.nanpercentile(catalog.astype(np.float64), [1, 99], axis=0)
+    random_rows = rng.uniform(low, high, (args.random_rows, catalog.shape[1])).astype(np.float32)
+    random_rows[rng.random(random_rows.shape) < 0.02] = np.nan
+
+    identical = True
+    for label, rows in (('catalog', catalog), ('random', random_rows)):
+        expected = model.predict_proba(rows)
+        # One row at a time as well as batched: the API scores single rows
+        actual = predictor.predict_proba(rows)
+        single = np.concatenate([predictor.predict_proba(rows[i:i + 1]) for i in range(min(len(rows), 2000))])
+        matches = (np.array_equal(expected, actual)
+                   and np.array_equal(expected[:len(single)], single)
+                   and expected.dtype == actual.dtype)
+        identical &= matches
+        print(f"{label:>8}: {len(rows)} rows, bit-identical={matches}, "
+              f"max abs diff={float(np.max(np.abs(expected - actual))):.3g}")
+
+    row = catalog[:1]
+    timings = {}
+    for label, predict in (('predict_proba', model.predict_proba), ('inplace_predict', predictor.predict_proba)):
+        predict(row)
+        start = timer.perf_counter()
+        for _ in range(args.runs):
+            predict(row)
+        timings[label] = (timer.perf_counter() - start) / args.runs
+        print(f"{label:>16}: {timings[label] * 1e6:8.1f} us per single-row call")
+    print(f"speedup: {timings['predict_proba'] / timings['inplace_predict']:.1f}x "
+          f"(nthread={predictor.nthread})")
+    sys.exit(0 if identical else 1)
@@ -3,23 +3,201 @@ Database models and connection for NASA Exoplanet Detector
 Uses SQLite for persistent storage of predictions
 """
 
+import os
+import math
+import base64
+import hashlib
 import sqlite3
+import threading
 import json
+from contextlib import closing, contextmanager
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Pragmas applied to every pooled connection
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',     # safe with WAL, fsync only at checkpoints
+    'PRAGMA cache_size = -16000',      # 16 MB page cache per connection
+    'PRAGMA mmap_size = 268435456',    # read pages through a 256 MB memory map
+    'PRAGMA temp_store = MEMORY',
+)
+
+# Bytes read per step when streaming a stored lightcurve image
+BLOB_CHUNK_SIZE = 64 * 1024
+
+def encode_cursor(cursor: Tuple[str, int]) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque URL-safe token"""
+    return base64.urlsafe_b64encode(json.dumps(list(cursor)).encode('utf-8')).decode('ascii')
+
+def decode_cursor(token: str) -> Tuple[str, int]:
+    """Decode a token from encode_cursor, raising ValueError if it is malformed"""
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+    if not isinstance(row_id, int):
+        raise ValueError(f"Invalid cursor: {token}")
+    return timestamp, row_id
+
+# Fields every saved prediction must carry
+REQUIRED_PREDICTION_FIELDS = ['exoplanet_id', 'dataset', 'prediction', 'timestamp']
+REQUIRED_RESULT_FIELDS = ['confidence', 'is_exoplanet', 'model_version']
+
+# Fields stored as TEXT NOT NULL
+STRING_PREDICTION_FIELDS = ['exoplanet_id', 'dataset', 'timestamp']
+STRING_RESULT_FIELDS = ['model_version']
+
+def validate_prediction(prediction_data: Any) -> Optional[str]:
+    """
+    Check that a prediction record has every field save_prediction needs,
+    with a type SQLite can store in its column
+    
+    Returns:
+        An error message, or None if the record is valid
+    """
+    if not isinstance(prediction_data, dict):
+        return 'Prediction must be an object'
+    for field in REQUIRED_PREDICTION_FIELDS:
+        if field not in prediction_data:
+            return f'Missing required field: {field}'
+    if not isinstance(prediction_data['prediction'], dict):
+        return 'Field prediction must be an object'
+    result = prediction_data['prediction']
+    for field in REQUIRED_RESULT_FIELDS:
+        if field not in result:
+            return f'Missing required field: prediction.{field}'
+    
+    for field in STRING_PREDICTION_FIELDS:
+        if not isinstance(prediction_data[field], str):
+            return f'Field {field} must be a string'
+    for field in STRING_RESULT_FIELDS:
+        if not isinstance(result[field], str):
+            return f'Field prediction.{field} must be a string'
+    confidence = result['confidence']
+    # bool is an int subclass, but true/false is not a confidence; NaN
+    # would be stored as NULL
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not math.isfinite(confidence):
+        return 'Field prediction.confidence must be a number'
+    is_exoplanet = result['is_exoplanet']
+    if not isinstance(is_exoplanet, int) or is_exoplanet not in (0, 1):
+        return 'Field prediction.is_exoplanet must be a boolean or 0/1'
+    return None
+
+class LightcurveBlob:
+    """
+    Open, read-only handle on one stored lightcurve image.
+    Holds a dedicated connection so the image can be streamed after the
+    request handler returns; close() (or exhausting chunks()) releases it.
+    """
+    
+    def __init__(self, conn: sqlite3.Connection, row_id: int, filename: str, sha256: str, size: int):
+        self.filename = filename
+        self.sha256 = sha256
+        self.size = size
+        self._conn = conn
+        self._blob = conn.blobopen('lightcurves', 'image_data', row_id, readonly=True)
+    
+    def chunks(self, chunk_size: int = BLOB_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the image in chunks with incremental BLOB I/O, never holding all of it"""
+        try:
+            while True:
+                data = self._blob.read(chunk_size)
+                if not data:
+                    break
+                yield data
+        finally:
+            self.close()
+    
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            self._blob.close()
+        finally:
+            conn.close()
+
 class Database:
-    def __init__(self, db_path: str = "predictions.db"):
+    def __init__(self, db_path: str = "predictions.db", busy_timeout: float = 10.0):
+        """
+        Args:
+            db_path: Path to the SQLite database file
+            busy_timeout: Seconds a writer waits for the write lock before failing
+        """
         self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self.init_database()
     
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Get this thread's pooled connection, opening it on first use.
+        Connections persist for the life of the thread so their prepared
+        statement caches are reused across requests.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        
+        # First use in this thread, or we are in a forked child whose
+        # inherited connection must not be touched
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            cached_statements=256,
+            check_same_thread=False
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def _write_transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run a block in a write transaction on this thread's connection.
+        BEGIN IMMEDIATE takes the write lock up front, so contention waits in
+        SQLite's busy handler instead of failing mid-transaction. In WAL mode
+        readers keep reading the last committed snapshot meanwhile.
+        """
+        conn = self._get_connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+    
+    def close(self):
+        """Close every pooled connection opened by this process"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+    
     def init_database(self):
         """Initialize the database with required tables"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            # Use a short-lived connection so nothing is inherited across fork
+            with closing(sqlite3.connect(self.db_path, timeout=self.busy_timeout)) as conn, conn:
+                # WAL is persistent in the database file: readers no longer
+                # block writers and vice versa
+                conn.execute('PRAGMA journal_mode = WAL')
                 cursor = conn.cursor()
                 
                 # Create predictions table
@@ -36,6 +214,25 @@ class Database:
                     )
                 ''')
                 
+                # Running aggregates per dataset and model version, kept in
+                # step with predictions so stats are a constant-time read
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'prediction_stats'")
+                stats_table_exists = cursor.fetchone() is not None
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS prediction_stats (
+                        dataset TEXT NOT NULL,
+                        model_version TEXT NOT NULL,
+                        prediction_count INTEGER NOT NULL DEFAULT 0,
+                        positive_count INTEGER NOT NULL DEFAULT 0,
+                        confidence_sum REAL NOT NULL DEFAULT 0,
+                        confidence_sq_sum REAL NOT NULL DEFAULT 0,
+                        PRIMARY KEY (dataset, model_version)
+                    )
+                ''')
+                if not stats_table_exists:
+                    # Existing database from before the aggregates existed
+                    self._rebuild_prediction_stats(cursor)
+                
                 # Create lightcurves table
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS lightcurves (
@@ -65,6 +262,23 @@ class Database:
                     ON predictions(timestamp)
                 ''')
                 
+                # idx_timestamp already orders by (timestamp, rowid); this one
+                # serves keyset pagination filtered by dataset
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_dataset_timestamp_id 
+                    ON predictions(dataset, timestamp, id)
+                ''')
+                
+                # Content hash of each image, served as its ETag; backfill
+                # rows stored before the column existed
+                columns = [row[1] for row in cursor.execute('PRAGMA table_info(lightcurves)')]
+                if 'sha256' not in columns:
+                    cursor.execute('ALTER TABLE lightcurves ADD COLUMN sha256 TEXT')
+                rows = cursor.execute('SELECT id, image_data FROM lightcurves WHERE sha256 IS NULL').fetchall()
+                for row_id, image_data in rows:
+                    cursor.execute('UPDATE lightcurves SET sha256 = ? WHERE id = ?',
+                                   (hashlib.sha256(image_data).hexdigest(), row_id))
+                
                 # Create indexes for lightcurves table
                 cursor.execute('''
                     CREATE INDEX IF NOT EXISTS idx_lightcurve_candidate_id 
@@ -76,7 +290,35 @@ class Database:
                     ON lightcurves(kepid)
                 ''')
                 
-                conn.commit()
+                # Lightcurve generation jobs, shared by every worker process
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS lightcurve_jobs (
+                        id TEXT PRIMARY KEY,
+                        cache_key TEXT NOT NULL,
+                        kepid INTEGER NOT NULL,
+                        candidate_id TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        stage TEXT,
+                        progress REAL NOT NULL DEFAULT 0,
+                        error TEXT,
+                        url TEXT,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_lightcurve_jobs_key_status 
+                    ON lightcurve_jobs(cache_key, status)
+                ''')
+                
+                # Older versions appended a new image on every render; keep
+                # only the latest one per kepid
+                cursor.execute('''
+                    DELETE FROM lightcurves 
+                    WHERE id NOT IN (SELECT MAX(id) FROM lightcurves GROUP BY kepid)
+                ''')
+                
                 logger.info("Database initialized successfully")
                 
         except Exception as e:
@@ -86,7 +328,7 @@ class Database:
     def save_prediction(self, prediction_data: Dict[str, Any]) -> bool:
         """Save a prediction to the database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._write_transaction() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -102,7 +344,13 @@ class Database:
                     prediction_data['timestamp']
                 ))
                 
-                conn.commit()
+                self._update_prediction_stats(cursor, [(
+                    prediction_data['dataset'],
+                    prediction_data['prediction']['model_version'],
+                    prediction_data['prediction']['confidence'],
+                    prediction_data['prediction']['is_exoplanet']
+                )])
+                
                 logger.info(f"Prediction saved for {prediction_data['exoplanet_id']}")
                 return True
                 
@@ -110,10 +358,169 @@ class Database:
             logger.error(f"Error saving prediction: {str(e)}")
             return False
     
+    def save_predictions_many(self, records: List[Any], indexes: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        Validate and save many predictions in a single transaction
+        
+        Args:
+            records: Prediction dicts in the same format as save_prediction
+            indexes: Position of each record in the caller's input, used in
+                error reports (defaults to 0..n-1)
+            
+        Returns:
+            Dict with the number saved and a list of {'index', 'error'} for
+            records that were rejected
+        """
+        rows = []
+        row_indexes = []
+        errors = []
+        if indexes is None:
+            indexes = range(len(records))
+        for index, prediction_data in zip(indexes, records):
+            error = validate_prediction(prediction_data)
+            if error:
+                errors.append({'index': index, 'error': error})
+                continue
+            result = prediction_data['prediction']
+            row_indexes.append(index)
+            rows.append((
+                prediction_data['exoplanet_id'],
+                prediction_data['dataset'],
+                result['confidence'],
+                result['is_exoplanet'],
+                result['model_version'],
+                prediction_data['timestamp']
+            ))
+        
+        if not rows:
+            return {'saved': 0, 'errors': errors}
+        
+        try:
+            self._insert_predictions(rows)
+            logger.info(f"Saved {len(rows)} predictions in bulk")
+            return {'saved': len(rows), 'errors': errors}
+                
+        except Exception as e:
+            logger.error(f"Error saving predictions in bulk, retrying one by one: {str(e)}")
+        
+        # The transaction was rolled back; insert each row on its own so a
+        # failure is reported against its record and the others are kept
+        saved = 0
+        for index, row in zip(row_indexes, rows):
+            try:
+                self._insert_predictions([row])
+                saved += 1
+            except Exception as e:
+                errors.append({'index': index, 'error': f'Insert failed: {str(e)}'})
+        errors.sort(key=lambda error: error['index'])
+        return {'saved': saved, 'errors': errors}
+    
+    def _insert_predictions(self, rows: List[Tuple[str, str, float, Any, str, str]]):
+        """
+        Insert prediction rows and their aggregates in one write transaction
+        
+        Args:
+            rows: (candidate_id, dataset, confidence, is_exoplanet, model_version, timestamp) per prediction
+        """
+        with self._write_transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO predictions 
+                (candidate_id, dataset, confidence, is_exoplanet, model_version, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            self._update_prediction_stats(cursor, [(row[1], row[4], row[2], row[3]) for row in rows])
+    
+    @staticmethod
+    def _update_prediction_stats(cursor: sqlite3.Cursor, rows: List[Tuple[str, str, float, Any]]):
+        """
+        Add newly inserted predictions to the running aggregates.
+        Must run in the same transaction as the INSERT.
+        
+        Args:
+            cursor: Cursor inside the write transaction
+            rows: (dataset, model_version, confidence, is_exoplanet) per prediction
+        """
+        deltas: Dict[Tuple[str, str], List[float]] = {}
+        for dataset, model_version, confidence, is_exoplanet in rows:
+            delta = deltas.setdefault((dataset, model_version), [0, 0, 0.0, 0.0])
+            confidence = float(confidence)
+            delta[0] += 1
+            # Same predicate as "is_exoplanet = 1" in SQL
+            delta[1] += 1 if is_exoplanet == 1 else 0
+            delta[2] += confidence
+            delta[3] += confidence * confidence
+        
+        cursor.executemany('''
+            INSERT INTO prediction_stats 
+            (dataset, model_version, prediction_count, positive_count, confidence_sum, confidence_sq_sum)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (dataset, model_version) DO UPDATE SET
+                prediction_count = prediction_count + excluded.prediction_count,
+                positive_count = positive_count + excluded.positive_count,
+                confidence_sum = confidence_sum + excluded.confidence_sum,
+                confidence_sq_sum = confidence_sq_sum + excluded.confidence_sq_sum
+        ''', [key + tuple(delta) for key, delta in deltas.items()])
+    
+    @staticmethod
+    def _rebuild_prediction_stats(cursor: sqlite3.Cursor):
+        """Recompute the running aggregates from the predictions table"""
+        cursor.execute('DELETE FROM prediction_stats')
+        cursor.execute('''
+            INSERT INTO prediction_stats 
+            (dataset, model_version, prediction_count, positive_count, confidence_sum, confidence_sq_sum)
+            SELECT dataset, model_version, COUNT(*),
+                   SUM(CASE WHEN is_exoplanet = 1 THEN 1 ELSE 0 END),
+                   TOTAL(confidence), TOTAL(confidence * confidence)
+            FROM predictions 
+            GROUP BY dataset, model_version
+        ''')
+    
+    def rebuild_prediction_stats(self) -> Dict[str, Any]:
+        """
+        Recompute the running aggregates from scratch and report any drift
+        between the stored and recomputed values.
+        
+        Returns:
+            Dict with the number of groups rebuilt and the groups that differed
+        """
+        with self._write_transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT dataset, model_version, prediction_count, positive_count,
+                       confidence_sum, confidence_sq_sum
+                FROM prediction_stats
+            ''')
+            before = {row[:2]: row[2:] for row in cursor.fetchall()}
+            
+            self._rebuild_prediction_stats(cursor)
+            
+            cursor.execute('''
+                SELECT dataset, model_version, prediction_count, positive_count,
+                       confidence_sum, confidence_sq_sum
+                FROM prediction_stats
+            ''')
+            after = {row[:2]: row[2:] for row in cursor.fetchall()}
+        
+        def differs(old, new):
+            if old is None or new is None:
+                return True
+            return (old[0] != new[0] or old[1] != new[1]
+                    or abs(old[2] - new[2]) > 1e-6 * max(1.0, abs(new[2]))
+                    or abs(old[3] - new[3]) > 1e-6 * max(1.0, abs(new[3])))
+        
+        drift = [
+            {'dataset': key[0], 'model_version': key[1], 'stored': before.get(key), 'actual': after.get(key)}
+            for key in sorted(set(before) | set(after))
+            if differs(before.get(key), after.get(key))
+        ]
+        logger.info(f"Rebuilt prediction stats for {len(after)} groups, {len(drift)} had drifted")
+        return {'groups': len(after), 'drift': drift}
+    
     def get_all_predictions(self) -> List[Dict[str, Any]]:
         """Get all predictions from the database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -145,10 +552,77 @@ class Database:
             logger.error(f"Error retrieving predictions: {str(e)}")
             return []
     
+    def get_predictions_page(self, limit: int = 100, cursor: Optional[Tuple[str, int]] = None,
+                             dataset: Optional[str] = None, candidate_id: Optional[str] = None,
+                             is_exoplanet: Optional[bool] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Get one page of predictions, newest first, using keyset pagination.
+        The page (at most limit rows) is fetched and its cursor closed before
+        returning, so a client that disconnects mid-stream cannot leave a
+        statement open on the pooled connection, holding a WAL read snapshot.
+        
+        Args:
+            limit: Maximum number of predictions to return
+            cursor: (timestamp, id) of the last row of the previous page
+            dataset: Only return predictions for this dataset
+            candidate_id: Only return predictions for this candidate
+            is_exoplanet: Only return positive (True) or negative (False) predictions
+            
+        Returns:
+            Iterator of prediction dicts, each with a 'cursor' key that can
+            be passed back to get the rows after it
+        """
+        conditions = []
+        params: List[Any] = []
+        if cursor is not None:
+            conditions.append('(timestamp, id) < (?, ?)')
+            params.extend(cursor)
+        if dataset is not None:
+            conditions.append('dataset = ?')
+            params.append(dataset)
+        if candidate_id is not None:
+            conditions.append('candidate_id = ?')
+            params.append(candidate_id)
+        if is_exoplanet is not None:
+            conditions.append('is_exoplanet = ?')
+            params.append(int(is_exoplanet))
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        params.append(limit)
+        
+        db_cursor = self._get_connection().cursor()
+        try:
+            rows = db_cursor.execute(f'''
+                SELECT candidate_id, dataset, confidence, is_exoplanet, 
+                       model_version, timestamp, id
+                FROM predictions 
+                {where}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', params).fetchall()
+        finally:
+            db_cursor.close()
+        
+        def generate():
+            for row in rows:
+                yield {
+                    'exoplanet_id': row[0],
+                    'dataset': row[1],
+                    'timestamp': row[5],
+                    'prediction': {
+                        'confidence': row[2],
+                        'is_exoplanet': bool(row[3]),
+                        'model_version': row[4]
+                    },
+                    'cursor': (row[5], row[6])
+                }
+        
+        return generate()
+    
     def get_predictions_by_dataset(self, dataset: str) -> List[Dict[str, Any]]:
         """Get predictions filtered by dataset"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -183,33 +657,35 @@ class Database:
     def get_prediction_stats(self) -> Dict[str, Any]:
         """Get statistics about predictions"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Total predictions
-                cursor.execute('SELECT COUNT(*) FROM predictions')
-                total_predictions = cursor.fetchone()[0]
+                # Read the running aggregates instead of scanning predictions
+                cursor.execute('''
+                    SELECT dataset, SUM(prediction_count), SUM(positive_count),
+                           TOTAL(confidence_sum), TOTAL(confidence_sq_sum)
+                    FROM prediction_stats 
+                    GROUP BY dataset
+                ''')
+                rows = cursor.fetchall()
                 
-                # Exoplanets found
-                cursor.execute('SELECT COUNT(*) FROM predictions WHERE is_exoplanet = 1')
-                exoplanets_found = cursor.fetchone()[0]
+                total_predictions = sum(row[1] for row in rows)
+                exoplanets_found = sum(row[2] for row in rows)
+                confidence_sum = sum(row[3] for row in rows)
+                confidence_sq_sum = sum(row[4] for row in rows)
                 
                 # Average confidence
-                cursor.execute('SELECT AVG(confidence) FROM predictions')
-                avg_confidence = cursor.fetchone()[0] or 0
+                avg_confidence = confidence_sum / total_predictions if total_predictions > 0 else 0
+                variance = confidence_sq_sum / total_predictions - avg_confidence ** 2 if total_predictions > 0 else 0
                 
                 # Dataset breakdown
-                cursor.execute('''
-                    SELECT dataset, COUNT(*) 
-                    FROM predictions 
-                    GROUP BY dataset
-                ''')
-                dataset_breakdown = dict(cursor.fetchall())
+                dataset_breakdown = {row[0]: row[1] for row in rows if row[1]}
                 
                 return {
                     'total_predictions': total_predictions,
                     'exoplanets_found': exoplanets_found,
                     'average_confidence': round(avg_confidence, 2),
+                    'confidence_std': round(max(variance, 0) ** 0.5, 2),
                     'dataset_breakdown': dataset_breakdown,
                     'success_rate': round((exoplanets_found / total_predictions * 100), 2) if total_predictions > 0 else 0
                 }
@@ -227,10 +703,10 @@ class Database:
     def clear_all_predictions(self) -> bool:
         """Clear all predictions from the database"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._write_transaction() as conn:
                 cursor = conn.cursor()
                 cursor.execute('DELETE FROM predictions')
-                conn.commit()
+                cursor.execute('DELETE FROM prediction_stats')
                 logger.info("All predictions cleared from database")
                 return True
                 
@@ -239,17 +715,17 @@ class Database:
             return False
     
     def save_lightcurve(self, candidate_id: str, kepid: int, image_data: bytes, filename: str) -> bool:
-        """Save lightcurve image data to the database"""
+        """Save lightcurve image data to the database, replacing any older image for the kepid"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._write_transaction() as conn:
                 cursor = conn.cursor()
                 
+                cursor.execute('DELETE FROM lightcurves WHERE kepid = ?', (kepid,))
                 cursor.execute('''
-                    INSERT INTO lightcurves (candidate_id, kepid, image_data, filename)
-                    VALUES (?, ?, ?, ?)
-                ''', (candidate_id, kepid, image_data, filename))
+                    INSERT INTO lightcurves (candidate_id, kepid, image_data, filename, sha256)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (candidate_id, kepid, image_data, filename, hashlib.sha256(image_data).hexdigest()))
                 
-                conn.commit()
                 logger.info(f"Lightcurve saved for candidate {candidate_id}")
                 return True
                 
@@ -260,7 +736,7 @@ class Database:
     def get_lightcurve_by_candidate(self, candidate_id: str) -> Dict[str, Any]:
         """Get lightcurve image data by candidate ID"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -287,7 +763,7 @@ class Database:
     def get_lightcurve_by_kepid(self, kepid: int) -> Dict[str, Any]:
         """Get lightcurve image data by kepid"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -312,10 +788,190 @@ class Database:
             logger.error(f"Error retrieving lightcurve for kepid {kepid}: {str(e)}")
             return None
     
+    def get_lightcurve_info(self, kepid: int) -> Optional[Dict[str, Any]]:
+        """
+        Get the sha256, size and filename of the stored lightcurve image of a
+        kepid, without reading or opening the image itself
+        
+        Returns:
+            Dict with sha256, size and filename, or None if nothing is stored
+        """
+        try:
+            with self._get_connection() as conn:
+                row = conn.execute('''
+                    SELECT sha256, length(image_data), filename
+                    FROM lightcurves 
+                    WHERE kepid = ?
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                ''', (kepid,)).fetchone()
+                if row is None:
+                    return None
+                return {'sha256': row[0], 'size': row[1], 'filename': row[2]}
+                
+        except Exception as e:
+            logger.error(f"Error retrieving lightcurve info for kepid {kepid}: {str(e)}")
+            return None
+    
+    def open_lightcurve_blob(self, kepid: int) -> Optional[LightcurveBlob]:
+        """
+        Open the stored lightcurve image of a kepid for streaming, without loading it
+        
+        Returns:
+            A LightcurveBlob the caller must exhaust or close, or None if nothing is stored
+        """
+        # A separate read-only connection: the stream outlives the request
+        # handler, and the pooled connection must stay free for other queries
+        conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True,
+                               timeout=self.busy_timeout, check_same_thread=False)
+        try:
+            row = conn.execute('''
+                SELECT id, filename, sha256, length(image_data)
+                FROM lightcurves 
+                WHERE kepid = ?
+                ORDER BY created_at DESC
+                LIMIT 1
+            ''', (kepid,)).fetchone()
+            if row is None:
+                conn.close()
+                return None
+            return LightcurveBlob(conn, *row)
+        except Exception as e:
+            conn.close()
+            logger.error(f"Error opening lightcurve blob for kepid {kepid}: {str(e)}")
+            return None
+    
+    def delete_lightcurve(self, kepid: int) -> bool:
+        """Delete the stored lightcurve image for a kepid"""
+        try:
+            with self._write_transaction() as conn:
+                conn.execute('DELETE FROM lightcurves WHERE kepid = ?', (kepid,))
+                return True
+                
+        except Exception as e:
+            logger.error(f"Error deleting lightcurve for kepid {kepid}: {str(e)}")
+            return False
+    
+    def lightcurve_exists_for_kepid(self, kepid: int) -> bool:
+        """Check if a lightcurve image is stored for a kepid, without loading it"""
+        try:
+            with self._get_connection() as conn:
+                row = conn.execute(
+                    'SELECT 1 FROM lightcurves WHERE kepid = ? LIMIT 1', (kepid,)
+                ).fetchone()
+                return row is not None
+                
+        except Exception as e:
+            logger.error(f"Error checking lightcurve existence for kepid {kepid}: {str(e)}")
+            return False
+    
+    def claim_lightcurve_job(self, job_id: str, cache_key: str, kepid: int, candidate_id: str,
+                             stale_after: float) -> Optional[Dict[str, Any]]:
+        """
+        Create a queued lightcurve job unless one for the same cache key is
+        already in flight. Runs in one write transaction so concurrent
+        workers agree on a single job.
+        
+        Args:
+            job_id: Id for the new job
+            cache_key: Lightcurve cache key the job will produce
+            kepid: The Kepler ID
+            candidate_id: KOI name the job was requested for
+            stale_after: Seconds without progress after which an in-flight
+                job is treated as abandoned
+            
+        Returns:
+            The job dict, with 'created' True if this call created it
+        """
+        try:
+            with self._write_transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id FROM lightcurve_jobs 
+                    WHERE cache_key = ? AND status IN ('queued', 'running')
+                      AND updated_at > datetime('now', ?)
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                ''', (cache_key, f'-{int(stale_after)} seconds'))
+                row = cursor.fetchone()
+                created = row is None
+                
+                if created:
+                    # Keep the table small: finished jobs are only polled briefly
+                    cursor.execute('''
+                        DELETE FROM lightcurve_jobs 
+                        WHERE updated_at < datetime('now', '-1 day')
+                    ''')
+                    cursor.execute('''
+                        INSERT INTO lightcurve_jobs (id, cache_key, kepid, candidate_id, status, stage)
+                        VALUES (?, ?, ?, ?, 'queued', 'queued')
+                    ''', (job_id, cache_key, kepid, candidate_id))
+                else:
+                    job_id = row[0]
+            
+            job = self.get_lightcurve_job(job_id)
+            if job is not None:
+                job['created'] = created
+            return job
+                
+        except Exception as e:
+            logger.error(f"Error claiming lightcurve job for {cache_key}: {str(e)}")
+            return None
+    
+    def update_lightcurve_job(self, job_id: str, **fields: Any) -> bool:
+        """Update status, stage, progress, error or url of a lightcurve job"""
+        allowed = {'status', 'stage', 'progress', 'error', 'url'}
+        unknown = set(fields) - allowed
+        if unknown:
+            raise ValueError(f"Unknown lightcurve job fields: {sorted(unknown)}")
+        try:
+            assignments = ', '.join(f'{name} = ?' for name in fields)
+            with self._write_transaction() as conn:
+                conn.execute(f'''
+                    UPDATE lightcurve_jobs 
+                    SET {assignments}, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (*fields.values(), job_id))
+                return True
+                
+        except Exception as e:
+            logger.error(f"Error updating lightcurve job {job_id}: {str(e)}")
+            return False
+    
+    def get_lightcurve_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a lightcurve job by id"""
+        try:
+            with self._get_connection() as conn:
+                row = conn.execute('''
+                    SELECT id, cache_key, kepid, candidate_id, status, stage, progress,
+                           error, url, created_at, updated_at
+                    FROM lightcurve_jobs 
+                    WHERE id = ?
+                ''', (job_id,)).fetchone()
+                if row:
+                    return {
+                        'job_id': row[0],
+                        'cache_key': row[1],
+                        'kepid': row[2],
+                        'koi_name': row[3],
+                        'status': row[4],
+                        'stage': row[5],
+                        'progress': row[6],
+                        'error': row[7],
+                        'url': row[8],
+                        'created_at': row[9],
+                        'updated_at': row[10]
+                    }
+                return None
+                
+        except Exception as e:
+            logger.error(f"Error retrieving lightcurve job {job_id}: {str(e)}")
+            return None
+    
     def lightcurve_exists(self, candidate_id: str) -> bool:
         """Check if lightcurve exists for a candidate"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute('''
@@ -331,3 +987,20 @@ class Database:
 
 # Global database instance
 db = Database()
+
+
+if __name__ == '__main__':
+    import sys
+    
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ['rebuild-stats']:
+        print("Usage: python database.py rebuild-stats")
+        sys.exit(2)
+    
+    report = db.rebuild_prediction_stats()
+    print(f"Rebuilt {report['groups']} prediction stats groups")
+    for group in report['drift']:
+        print(f"  drift in {group['dataset']}/{group['model_version']}: "
+              f"stored={group['stored']} actual={group['actual']}")
+    sys.exit(1 if report['drift'] else 0)
+
@@ -0,0 +1,31 @@
+"""
+Gunicorn configuration for the NASA Exoplanet Detection API
+Run with: gunicorn -c gunicorn.conf.py app_minimal:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5002')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+timeout = 120
+
+# Import the app in the master so the models are loaded once before fork
+# and the booster memory pages are shared copy-on-write by every worker
+preload_app = True
+
+
+def on_starting(server):
+    """Load ML models and the catalog prediction table before workers are forked"""
+    from ml_models import preload_models
+    from prediction_table import prediction_table
+    preload_models()
+    # Synchronous: the master must not run threads (or hold their locks)
+    # when it forks, so it never starts a background build
+    prediction_table.load_or_build(background=False)
+
+
+def post_fork(server, worker):
+    """Keep retrying in each worker if the master could not build the prediction table"""
+    from prediction_table import prediction_table
+    prediction_table.load_or_build()
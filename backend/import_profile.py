@@ -0,0 +1,83 @@
+"""
+Import-time profile for NASA Exoplanet Detection
+Measures what a cold worker pays to import a module, grouped by top-level package, and flags heavy subsystems loaded eagerly
+
+Run with: python import_profile.py [module ...] [--top N] [--budget-ms MS]
+"""
+
+import re
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+# Subsystems that should only load on first use of the endpoints needing them
+HEAVY_PACKAGES = ('pandas', 'xgboost', 'sklearn', 'matplotlib', 'lightkurve', 'astropy', 'scipy')
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def profile_import(module: str) -> Dict[str, Any]:
+    """
+    Import a module in a fresh interpreter under -X importtime.
+
+    Args:
+        module: Module name, importable from the current directory
+
+    Returns:
+        Dict with wall time, self time per top-level package (microseconds),
+        and the heavy packages that were loaded
+    """
+    code = ('import time; start = time.perf_counter(); '
+            f'import {module}; print(time.perf_counter() - start)')
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                               capture_output=True, text=True, check=True)
+
+    packages: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        package = match.group(4).split('.')[0]
+        packages[package] = packages.get(package, 0) + int(match.group(1))
+
+    return {
+        'module': module,
+        'wall_ms': float(completed.stdout.strip().splitlines()[-1]) * 1000,
+        'packages': packages,
+        'heavy': [name for name in HEAVY_PACKAGES if name in packages]
+    }
+
+
+def format_report(profile: Dict[str, Any], top: int = 15) -> List[str]:
+    """Render a profile as report lines, slowest packages first."""
+    lines = [f"import {profile['module']}: {profile['wall_ms']:.0f} ms wall"]
+    ranked = sorted(profile['packages'].items(), key=lambda item: -item[1])
+    for package, micros in ranked[:top]:
+        marker = '  <- heavy' if package in HEAVY_PACKAGES else ''
+        lines.append(f"  {micros / 1000:8.1f} ms  {package}{marker}")
+    if profile['heavy']:
+        lines.append(f"  heavy packages loaded eagerly: {', '.join(profile['heavy'])}")
+    else:
+        lines.append("  no heavy packages loaded")
+    return lines
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Profile the import time of backend modules')
+    parser.add_argument('modules', nargs='*', default=['app_minimal'],
+                        help='Modules to import (default: %(default)s)')
+    parser.add_argument('--top', type=int, default=15, help='Packages to list per module')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help='Exit with status 1 if any import takes longer')
+    args = parser.parse_args()
+
+    over_budget = False
+    for module in args.modules:
+        profile = profile_import(module)
+        print('\n'.join(format_report(profile, args.top)))
+        if args.budget_ms is not None and profile['wall_ms'] > args.budget_ms:
+            print(f"  over budget: {profile['wall_ms']:.0f} ms > {args.budget_ms:.0f} ms")
+            over_budget = True
+    sys.exit(1 if over_budget else 0)
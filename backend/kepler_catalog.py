@@ -0,0 +1,188 @@
+"""
+Kepler catalog service for NASA Exoplanet Detection
+Loads clean_kepler_dataset.csv once and serves O(1) lookups by kepoi_name and kepid
+"""
+
+import os
+import threading
+import numpy as np
+import logging
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+# pandas is imported when the CSV is first read, not when a worker starts
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Model input columns, in the order the XGBoost model was trained on
+KEPLER_FEATURES = [
+    'koi_period', 'koi_time0bk', 'koi_duration', 'koi_depth', 'koi_max_sngle_ev',
+    'koi_max_mult_ev', 'koi_num_transits', 'koi_steff', 'koi_slogg', 'koi_smet',
+    'koi_srad', 'koi_smass', 'ra', 'dec', 'koi_kepmag'
+]
+
+# Feature matrix columns holding koi_period, koi_time0bk and koi_duration
+EPHEMERIS_COLUMNS = [KEPLER_FEATURES.index(name) for name in ('koi_period', 'koi_time0bk', 'koi_duration')]
+
+
+class CatalogSnapshot:
+    """
+    Immutable, fully built copy of the catalog.
+    A reload builds a new snapshot and swaps it in with one assignment, so a
+    reader holding a snapshot always sees features and indexes that agree.
+    """
+
+    def __init__(self, df: 'pd.DataFrame', mtime: float):
+        self.mtime = mtime
+        self.features = np.ascontiguousarray(df[KEPLER_FEATURES].to_numpy(dtype=np.float32))
+        self.kepoi_names: List[str] = df['kepoi_name'].astype(str).tolist()
+        self.dispositions: List[str] = df['koi_disposition'].astype(str).tolist()
+        self.kepids = df['kepid'].to_numpy(dtype=np.int64)
+
+        # Keep the first occurrence, matching the old iloc[0] behaviour
+        self.kepoi_index: Dict[str, int] = {}
+        for row, name in enumerate(self.kepoi_names):
+            self.kepoi_index.setdefault(name, row)
+
+        self.kepid_index: Dict[int, int] = {}
+        for row, kepid in enumerate(self.kepids.tolist()):
+            self.kepid_index.setdefault(kepid, row)
+
+    def __len__(self) -> int:
+        return len(self.kepoi_names)
+
+
+class KeplerCatalog:
+    """
+    In-memory columnar view of the clean Kepler dataset.
+    Features are held in one contiguous float32 matrix and rows are found
+    through hash indexes, so a lookup never scans the table.
+    """
+
+    def __init__(self, dataset_path: str = '../Assets/clean_kepler_dataset.csv'):
+        """
+        Args:
+            dataset_path: Path to the clean Kepler dataset CSV file
+        """
+        self.dataset_path = dataset_path
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        self._reload_listeners: List[Callable[[CatalogSnapshot], None]] = []
+
+    def add_reload_listener(self, listener: Callable[[CatalogSnapshot], None]) -> None:
+        """
+        Register a callback run with each snapshot that replaces a loaded one
+        (not on the first load, as with model reload listeners).
+        Callbacks run on the loading thread and must not block.
+        """
+        self._reload_listeners.append(listener)
+
+    def load(self) -> CatalogSnapshot:
+        """Read the CSV and swap in a freshly built snapshot."""
+        import pandas as pd
+
+        mtime = os.path.getmtime(self.dataset_path)
+        snapshot = CatalogSnapshot(pd.read_csv(self.dataset_path), mtime)
+        previous, self._snapshot = self._snapshot, snapshot
+        logger.info(f"Loaded Kepler catalog with {len(snapshot)} rows")
+        if previous is None:
+            return snapshot
+        for listener in self._reload_listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"Catalog reload listener failed: {str(e)}")
+        return snapshot
+
+    def snapshot(self) -> CatalogSnapshot:
+        """
+        Get the current catalog, loading it on first use and reloading it
+        when the CSV's mtime changes.
+        """
+        snapshot = self._snapshot
+        try:
+            current_mtime = os.path.getmtime(self.dataset_path)
+        except OSError:
+            if snapshot is None:
+                raise
+            # File went away - keep serving what we have
+            return snapshot
+
+        if snapshot is not None and snapshot.mtime == current_mtime:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.mtime != os.path.getmtime(self.dataset_path):
+                snapshot = self.load()
+        return snapshot
+
+    def __len__(self) -> int:
+        return len(self.snapshot())
+
+    def get_row(self, kepoi_name: str) -> Optional[int]:
+        """
+        Get the row offset of a KOI.
+
+        Args:
+            kepoi_name: The Kepler Object of Interest name (e.g., 'K00752.01')
+
+        Returns:
+            Row offset if found, None otherwise
+        """
+        return self.snapshot().kepoi_index.get(kepoi_name)
+
+    def get_features(self, kepoi_name: str) -> Optional[np.ndarray]:
+        """
+        Get the model input row for a KOI.
+
+        Args:
+            kepoi_name: The Kepler Object of Interest name
+
+        Returns:
+            A (1, 15) float32 view into the feature matrix (no copy), or None
+        """
+        snapshot = self.snapshot()
+        row = snapshot.kepoi_index.get(kepoi_name)
+        if row is None:
+            return None
+        return snapshot.features[row:row + 1]
+
+    def get_disposition(self, kepoi_name: str) -> Optional[str]:
+        """Get the NASA disposition (CONFIRMED, CANDIDATE, FALSE POSITIVE) of a KOI."""
+        snapshot = self.snapshot()
+        row = snapshot.kepoi_index.get(kepoi_name)
+        if row is None:
+            return None
+        return snapshot.dispositions[row]
+
+    def get_kepid(self, kepoi_name: str) -> Optional[int]:
+        """Get the kepid of the star hosting a KOI."""
+        snapshot = self.snapshot()
+        row = snapshot.kepoi_index.get(kepoi_name)
+        if row is None:
+            return None
+        return int(snapshot.kepids[row])
+
+    def get_ephemeris(self, kepoi_name: str) -> Optional[Tuple[float, float, float]]:
+        """
+        Get the transit ephemeris of a KOI.
+
+        Returns:
+            Tuple of (koi_period in days, koi_time0bk in BKJD, koi_duration in hours), or None
+        """
+        snapshot = self.snapshot()
+        row = snapshot.kepoi_index.get(kepoi_name)
+        if row is None:
+            return None
+        period, time0bk, duration = snapshot.features[row, EPHEMERIS_COLUMNS].tolist()
+        return period, time0bk, duration
+
+    def get_row_by_kepid(self, kepid: int) -> Optional[int]:
+        """Get the row offset of the first KOI for a kepid."""
+        return self.snapshot().kepid_index.get(int(kepid))
+
+
+# Global catalog instance
+kepler_catalog = KeplerCatalog()
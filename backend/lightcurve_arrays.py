@@ -0,0 +1,234 @@
+"""
+Cleaned lightcurve arrays for NASA Exoplanet Detection
+Stitched, outlier-clipped time/flux/flux_err saved per kepid as .npy files and memory-mapped on read
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# File name -> dtype. Time needs float64: BKJD days around 1500 lose
+# minute-level precision in float32
+COLUMNS = {
+    'time': np.float64,
+    'flux': np.float32,
+    'flux_err': np.float32
+}
+
+# Empty file left in a kepid directory when MAST has no data for the star;
+# a later save replaces the whole directory and clears it
+UNAVAILABLE_MARKER = 'unavailable'
+
+
+def _plain(values, dtype) -> np.ndarray:
+    """Strip astropy masks/units and return a contiguous array of dtype."""
+    values = getattr(values, 'unmasked', values)
+    values = getattr(values, 'value', values)
+    return np.ascontiguousarray(values, dtype=dtype)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Pick points with Largest-Triangle-Three-Buckets downsampling.
+
+    Unlike taking every k-th cadence this keeps the extreme point of each
+    bucket, so short transit dips survive. Bucket edges and the bucket
+    averages are computed in one pass; the remaining loop is one NumPy
+    argmax per output point, because each choice depends on the last.
+
+    Args:
+        x: Sorted x values (time)
+        y: y values (flux)
+        n_out: Number of points wanted
+
+    Returns:
+        Ascending indices of the selected points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    xf = np.asarray(x, dtype=np.float64)
+    yf = np.asarray(y, dtype=np.float64)
+
+    # First and last points are always kept; points 1..n-2 are split into
+    # n_out - 2 buckets of at least one point each
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(xf[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(yf[:n - 1], edges[:-1]) / counts
+    next_x = np.append(avg_x[1:], xf[-1])
+    next_y = np.append(avg_y[1:], yf[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    anchor = 0
+    for bucket in range(n_out - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        ax, ay = xf[anchor], yf[anchor]
+        # Twice the triangle area; the factor doesn't change the argmax
+        area = np.abs((ax - next_x[bucket]) * (yf[lo:hi] - ay)
+                      - (ax - xf[lo:hi]) * (next_y[bucket] - ay))
+        anchor = lo + int(np.argmax(area))
+        selected[bucket + 1] = anchor
+    return selected
+
+
+class LightcurveSeries:
+    """
+    One star's cleaned lightcurve, sorted by time.
+    Arrays are read-only memory maps when loaded from disk, and slicing
+    returns views, so zoomed or windowed reads never copy.
+    """
+
+    def __init__(self, kepid: int, time: np.ndarray, flux: np.ndarray, flux_err: np.ndarray):
+        self.kepid = kepid
+        self.time = time
+        self.flux = flux
+        self.flux_err = flux_err
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def between(self, t0: Optional[float] = None, t1: Optional[float] = None) -> 'LightcurveSeries':
+        """
+        Get the part of the lightcurve with t0 <= time <= t1.
+
+        Args:
+            t0: Start time in BKJD days (None for the beginning)
+            t1: End time in BKJD days (None for the end)
+
+        Returns:
+            A series of views into this one
+        """
+        lo = 0 if t0 is None else int(np.searchsorted(self.time, t0, side='left'))
+        hi = len(self.time) if t1 is None else int(np.searchsorted(self.time, t1, side='right'))
+        return LightcurveSeries(self.kepid, self.time[lo:hi], self.flux[lo:hi], self.flux_err[lo:hi])
+
+    def downsample(self, points: int) -> 'LightcurveSeries':
+        """
+        Reduce the series to at most `points` cadences with LTTB.
+
+        Returns:
+            This series if it is already small enough, otherwise a copy of
+            the selected cadences
+        """
+        if len(self) <= points:
+            return self
+        selected = lttb_indices(self.time, self.flux, points)
+        return LightcurveSeries(self.kepid, self.time[selected], self.flux[selected], self.flux_err[selected])
+
+
+class LightcurveArrayStore:
+    """
+    Directory of cleaned lightcurves, one sub-directory of .npy files per
+    kepid. A save builds the directory under a temp name and renames it
+    into place, so readers see either the old arrays or the new ones.
+    """
+
+    def __init__(self, arrays_dir: str = 'lightcurve_arrays'):
+        """
+        Args:
+            arrays_dir: Root directory of the array files
+        """
+        self.arrays_dir = arrays_dir
+
+    def kepid_dir(self, kepid: int) -> str:
+        return os.path.join(self.arrays_dir, f"{int(kepid):09d}")
+
+    def mark_unavailable(self, kepid: int) -> None:
+        """Record that no lightcurve data exists for a star, so callers stop retrying."""
+        directory = self.kepid_dir(kepid)
+        os.makedirs(directory, exist_ok=True)
+        open(os.path.join(directory, UNAVAILABLE_MARKER), 'w').close()
+
+    def is_unavailable(self, kepid: int) -> bool:
+        return os.path.exists(os.path.join(self.kepid_dir(kepid), UNAVAILABLE_MARKER))
+
+    def has(self, kepid: int) -> bool:
+        directory = self.kepid_dir(kepid)
+        return all(os.path.exists(os.path.join(directory, f"{name}.npy")) for name in COLUMNS)
+
+    def load(self, kepid: int) -> Optional[LightcurveSeries]:
+        """
+        Memory-map the cleaned arrays of a star.
+
+        Args:
+            kepid: The Kepler ID
+
+        Returns:
+            The series, or None if it has not been saved
+        """
+        directory = self.kepid_dir(kepid)
+        try:
+            arrays = {
+                name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+                for name in COLUMNS
+            }
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not load lightcurve arrays for kepid {kepid}: {str(e)}")
+            return None
+        return LightcurveSeries(int(kepid), **arrays)
+
+    def save(self, kepid: int, time, flux, flux_err) -> LightcurveSeries:
+        """
+        Save a cleaned lightcurve.
+
+        Args:
+            kepid: The Kepler ID
+            time: Time values (days); astropy Time/Quantity columns are accepted
+            flux: Normalized flux values
+            flux_err: Flux uncertainties
+
+        Returns:
+            The saved series, memory-mapped from disk
+        """
+        time = _plain(time, COLUMNS['time'])
+        flux = _plain(flux, COLUMNS['flux'])
+        flux_err = _plain(flux_err, COLUMNS['flux_err'])
+
+        # Cadences without a time or flux are useless to every consumer
+        keep = np.isfinite(time) & np.isfinite(flux)
+        order = np.argsort(time[keep], kind='stable')
+        arrays = {
+            'time': time[keep][order],
+            'flux': flux[keep][order],
+            'flux_err': flux_err[keep][order]
+        }
+
+        os.makedirs(self.arrays_dir, exist_ok=True)
+        directory = self.kepid_dir(kepid)
+        tmp_dir = tempfile.mkdtemp(dir=self.arrays_dir, prefix=f".{int(kepid)}-")
+        try:
+            for name, values in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+
+            # A directory can't be renamed over a non-empty one, so move
+            # the old arrays aside first; open memory maps stay valid
+            old_dir = None
+            if os.path.exists(directory):
+                old_dir = tempfile.mkdtemp(dir=self.arrays_dir, prefix=f".{int(kepid)}-old-")
+                os.replace(directory, os.path.join(old_dir, 'arrays'))
+            os.replace(tmp_dir, directory)
+            if old_dir is not None:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        logger.info(f"Saved {len(arrays['time'])} cleaned cadences for kepid {kepid}")
+        return self.load(kepid)
+
+    def delete(self, kepid: int) -> None:
+        shutil.rmtree(self.kepid_dir(kepid), ignore_errors=True)
+
+
+# Global array store instance
+lightcurve_arrays = LightcurveArrayStore()
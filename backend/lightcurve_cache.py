@@ -0,0 +1,340 @@
+"""
+Lightcurve image cache for NASA Exoplanet Detection
+One index over the on-disk PNGs and the lightcurves table, keyed by kepid and render parameters
+"""
+
+import os
+import re
+import fcntl
+import hashlib
+import json
+import tempfile
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from database import Database, db
+
+logger = logging.getLogger(__name__)
+
+# Plain time-series plot, the image served as /api/lightcurve/<kepid>.png
+DEFAULT_VIEW = 'raw'
+
+KEY_PATTERN = re.compile(r'^(\d+)(?:-[0-9a-f]{12})?$')
+
+# Large enough for the default render of every catalog star (~8,200 kepids
+# at ~50 KB), so a prewarmed cache does not evict itself
+DEFAULT_MAX_BYTES = int(os.environ.get('LIGHTCURVE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Files in the cache directory shared by every worker process: an flock
+# target, and the running total of cached files and bytes
+LOCK_FILE = '.lock'
+USAGE_FILE = '.usage'
+
+
+def cache_key(kepid: int, view: str = DEFAULT_VIEW, **params: Any) -> str:
+    """
+    Build the cache key for a rendered lightcurve.
+
+    The default render is keyed by the bare kepid so its file name matches
+    the public URL; any other view or parameters get a short digest suffix.
+
+    Args:
+        kepid: The Kepler ID
+        view: Which rendering of the lightcurve
+        **params: Any other render parameters that change the image
+
+    Returns:
+        Key such as '10797460' or '10797460-3f0a9c1b2d4e'
+    """
+    if view == DEFAULT_VIEW and not params:
+        return str(int(kepid))
+    spec = json.dumps({'view': view, **params}, sort_keys=True, default=str)
+    return f"{int(kepid)}-{hashlib.sha1(spec.encode('utf-8')).hexdigest()[:12]}"
+
+
+class CacheEntry:
+    """One cached image, either a file on disk or a row in the lightcurves table."""
+
+    def __init__(self, key: str, location: str, path: Optional[str] = None,
+                 size: int = 0, sha256: Optional[str] = None):
+        self.key = key
+        self.kepid = int(KEY_PATTERN.match(key).group(1))
+        self.location = location  # 'file' or 'db'
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.inode: Optional[int] = None  # file the sha256 was computed from
+
+    @property
+    def is_default_view(self) -> bool:
+        return self.key == str(self.kepid)
+
+
+class LightcurveCache:
+    """
+    Size-bounded LRU cache of lightcurve PNGs.
+    Files are written atomically, recency is kept in file mtimes, and the
+    default render of each kepid is mirrored to the lightcurves table so it
+    outlives an ephemeral disk.
+
+    Every worker process writes to the same directory, so the size bound is
+    enforced on the directory, not on a per-process index: writes update a
+    shared running total under an exclusive flock, and once it passes
+    max_bytes the directory is scanned and the files with the oldest mtimes
+    are removed.
+    """
+
+    def __init__(self, cache_dir: str = 'lightcurves', max_bytes: int = DEFAULT_MAX_BYTES,
+                 database: Optional[Database] = None):
+        """
+        Args:
+            cache_dir: Directory holding the PNG files
+            max_bytes: Total size of cached files before LRU eviction kicks in
+            database: Database mirroring default renders (defaults to the shared instance)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.db = database or db
+        # Files this process has seen; the directory is the source of truth
+        self._entries: Dict[str, CacheEntry] = {}
+        self._scanned = False
+        self._lock = threading.RLock()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    @contextmanager
+    def _shared_lock(self) -> Iterator[None]:
+        """Hold the cache directory's lock against other threads and worker processes."""
+        with self._lock:
+            # Opened per use: a descriptor inherited across fork would share
+            # its flock with the parent
+            fd = os.open(os.path.join(self.cache_dir, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _list_files(self) -> List[Tuple[float, str, int]]:
+        """(mtime, key, size) of every cached PNG on disk, least recently used first."""
+        found = []
+        with os.scandir(self.cache_dir) as it:
+            for dir_entry in it:
+                name, ext = os.path.splitext(dir_entry.name)
+                if ext != '.png' or not KEY_PATTERN.match(name):
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+        return sorted(found)
+
+    def _read_usage(self) -> Tuple[int, int]:
+        """Shared (files, bytes) totals, recounted from disk if missing. Call with the shared lock held."""
+        try:
+            with open(os.path.join(self.cache_dir, USAGE_FILE)) as f:
+                usage = json.load(f)
+            return int(usage['files']), int(usage['bytes'])
+        except (OSError, ValueError, KeyError, TypeError):
+            found = self._list_files()
+            return self._write_usage(len(found), sum(size for _, _, size in found))
+
+    def _write_usage(self, files: int, total_bytes: int) -> Tuple[int, int]:
+        """Store the shared totals. Call with the shared lock held."""
+        with open(os.path.join(self.cache_dir, USAGE_FILE), 'w') as f:
+            json.dump({'files': files, 'bytes': total_bytes}, f)
+        return files, total_bytes
+
+    def _scan(self) -> None:
+        """Index the files already on disk and recount the shared totals."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._shared_lock():
+            found = self._list_files()
+            total_bytes = sum(size for _, _, size in found)
+            self._write_usage(len(found), total_bytes)
+        for _, key, size in found:
+            self._entries[key] = CacheEntry(key, 'file', self.path_for(key), size)
+        self._scanned = True
+        logger.info(f"Indexed {len(found)} cached lightcurves ({total_bytes} bytes)")
+
+    def _ensure_scanned(self) -> None:
+        if not self._scanned:
+            with self._lock:
+                if not self._scanned:
+                    self._scan()
+
+    def lookup_key(self, key: str) -> Optional[CacheEntry]:
+        """
+        Find a cached image by key, marking it as recently used.
+
+        Args:
+            key: A key from cache_key()
+
+        Returns:
+            The entry, or None on a miss
+        """
+        if not KEY_PATTERN.match(key):
+            return None
+        self._ensure_scanned()
+        path = self.path_for(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if os.path.exists(path):
+                    try:
+                        # Recency for eviction, in any worker process
+                        os.utime(path)
+                    except OSError:
+                        pass
+                    return entry
+                # Removed behind our back (another worker evicted it)
+                del self._entries[key]
+
+            if os.path.exists(path):
+                # Written by another worker process
+                entry = CacheEntry(key, 'file', path, os.path.getsize(path))
+                self._entries[key] = entry
+                return entry
+
+        # Default renders may still be stored in the database
+        candidate = CacheEntry(key, 'db')
+        if candidate.is_default_view and self.db.lightcurve_exists_for_kepid(candidate.kepid):
+            return candidate
+        return None
+
+    def content_hash(self, entry: CacheEntry) -> str:
+        """
+        Get the SHA-256 of a cached file, hashing it at most once per file.
+
+        File mtimes are bumped on every hit to track recency, so they can't
+        identify the content. A re-render replaces the file, and the inode
+        changes with it, which invalidates the stored hash.
+        """
+        inode = os.stat(entry.path).st_ino
+        if entry.sha256 is None or entry.inode != inode:
+            digest = hashlib.sha256()
+            with open(entry.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            entry.sha256, entry.inode = digest.hexdigest(), inode
+        return entry.sha256
+
+    def lookup(self, kepid: int, view: str = DEFAULT_VIEW, **params: Any) -> Optional[CacheEntry]:
+        """Find a cached image by kepid and render parameters."""
+        return self.lookup_key(cache_key(kepid, view, **params))
+
+    def put(self, kepid: int, image_data: bytes, candidate_id: Optional[str] = None,
+            view: str = DEFAULT_VIEW, **params: Any) -> CacheEntry:
+        """
+        Store a rendered image, evicting least recently used images if the
+        cache directory grows past max_bytes.
+
+        Args:
+            kepid: The Kepler ID
+            image_data: PNG bytes
+            candidate_id: KOI name the image was requested for
+            view: Which rendering of the lightcurve
+            **params: Any other render parameters
+
+        Returns:
+            The new cache entry
+        """
+        self._ensure_scanned()
+        key = cache_key(kepid, view, **params)
+        path = self.path_for(key)
+
+        # Write to a temp file in the same directory and rename over the
+        # target so readers never see a partial PNG
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image_data)
+            with self._shared_lock():
+                files, total_bytes = self._read_usage()
+                try:
+                    # Replacing an older render of the same key
+                    total_bytes -= os.path.getsize(path)
+                except OSError:
+                    files += 1
+                os.replace(tmp_path, path)
+                total_bytes += len(image_data)
+                evicted = []
+                if total_bytes > self.max_bytes:
+                    evicted, files, total_bytes = self._evict(keep=key)
+                self._write_usage(files, total_bytes)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        entry = CacheEntry(key, 'file', path, len(image_data), hashlib.sha256(image_data).hexdigest())
+        entry.inode = os.stat(path).st_ino
+        with self._lock:
+            for evicted_key in evicted:
+                self._entries.pop(evicted_key, None)
+            self._entries[key] = entry
+
+        if entry.is_default_view:
+            self.db.save_lightcurve(candidate_id or str(kepid), int(kepid), image_data, f"{key}.png")
+
+        for evicted_key in evicted:
+            evicted_entry = CacheEntry(evicted_key, 'file', self.path_for(evicted_key))
+            if evicted_entry.is_default_view:
+                self.db.delete_lightcurve(evicted_entry.kepid)
+            logger.info(f"Evicted cached lightcurve {evicted_key}")
+        return entry
+
+    def _evict(self, keep: str) -> Tuple[List[str], int, int]:
+        """
+        Remove least recently used files until the directory fits in max_bytes.
+        Call with the shared lock held.
+
+        The shared total only triggers the check: the directory is rescanned
+        so the decision uses the real on-disk size, whichever worker wrote
+        the files.
+
+        Args:
+            keep: Key that is never evicted (the file just written)
+
+        Returns:
+            Evicted keys, and the files and bytes left
+        """
+        found = self._list_files()
+        files = len(found)
+        total_bytes = sum(size for _, _, size in found)
+        evicted = []
+        for _, key, size in found:
+            if total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+            files -= 1
+            total_bytes -= size
+            evicted.append(key)
+        return evicted, files, total_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        """Current size of the on-disk cache, across all worker processes."""
+        self._ensure_scanned()
+        with self._shared_lock():
+            files, total_bytes = self._read_usage()
+        return {
+            'entries': files,
+            'bytes': total_bytes,
+            'max_bytes': self.max_bytes
+        }
+
+
+# Global cache instance
+lightcurve_cache = LightcurveCache()
@@ -1,35 +1,37 @@
-import lightkurve as lk
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-from matplotlib import pyplot as plt
-import pandas as pd
 import os
 import logging
-import io
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
+from kepler_catalog import KeplerCatalog, kepler_catalog
+from lightcurve_store import LightcurveStore, lightcurve_store
+from lightcurve_arrays import LightcurveArrayStore, LightcurveSeries, lightcurve_arrays
+from lightcurve_render import render_lightcurve_png
+
+# Points drawn in a lightcurve PNG; LTTB keeps transit dips at this density
+RENDER_POINTS = 2000
 
 logger = logging.getLogger(__name__)
 
+# Receives (stage, fraction complete) while a lightcurve is being generated
+ProgressCallback = Callable[[str, float], None]
+
+def _no_progress(stage: str, fraction: float) -> None:
+    pass
+
 class LightcurveGenerator:
-    def __init__(self, dataset_path: str = '../Assets/clean_kepler_dataset.csv'):
+    def __init__(self, catalog: Optional[KeplerCatalog] = None,
+                 store: Optional[LightcurveStore] = None,
+                 arrays: Optional[LightcurveArrayStore] = None):
         """
-        Initialize the lightcurve generator with the Kepler dataset.
+        Initialize the lightcurve generator with the Kepler catalog.
         
         Args:
-            dataset_path: Path to the clean Kepler dataset CSV file
+            catalog: Catalog used for kepid mapping (defaults to the shared instance)
+            store: Local FITS store read before searching MAST (defaults to the shared instance)
+            arrays: Store of cleaned arrays reused across renders (defaults to the shared instance)
         """
-        self.dataset_path = dataset_path
-        self.df = None
-        self.load_dataset()
-    
-    def load_dataset(self):
-        """Load the Kepler dataset for kepid mapping."""
-        try:
-            self.df = pd.read_csv(self.dataset_path)
-            logger.info(f"Loaded Kepler dataset with {len(self.df)} rows")
-        except Exception as e:
-            logger.error(f"Error loading dataset: {str(e)}")
-            raise
+        self.catalog = catalog or kepler_catalog
+        self.store = store or lightcurve_store
+        self.arrays = arrays or lightcurve_arrays
     
     def get_kepid_from_kepoi_name(self, kepoi_name: str) -> Optional[int]:
         """
@@ -42,85 +44,96 @@ class LightcurveGenerator:
             kepid if found, None otherwise
         """
         try:
-            matching_rows = self.df[self.df['kepoi_name'] == kepoi_name]
-            if matching_rows.empty:
+            kepid = self.catalog.get_kepid(kepoi_name)
+            if kepid is None:
                 logger.warning(f"No matching row found for kepoi_name: {kepoi_name}")
                 return None
             
-            kepid = matching_rows['kepid'].iloc[0]
             logger.info(f"Found kepid {kepid} for kepoi_name {kepoi_name}")
-            return int(kepid)
+            return kepid
         except Exception as e:
             logger.error(f"Error getting kepid for {kepoi_name}: {str(e)}")
             return None
     
-    def retrieve_lc(self, kepid: int) -> Tuple[bool, bytes, str]:
+    def get_cleaned_lightcurve(self, kepid: int,
+                               progress: Optional[ProgressCallback] = None) -> Optional[LightcurveSeries]:
         """
-        Retrieve and generate lightcurve for a given kepid.
-        OPTIMIZED for production deployment with memory constraints.
+        Get the stitched, outlier-clipped lightcurve of a star.
+        Saved arrays are memory-mapped when present; otherwise the raw data is
+        read (local store, then MAST), cleaned once and saved.
         
         Args:
             kepid: The Kepler ID
+            progress: Optional callback receiving (stage, fraction complete)
             
         Returns:
-            Tuple of (success, image_data, filename)
+            The cleaned series, or None if no data was found
         """
-        try:
-            kepler_id = 'KIC ' + str(kepid)
-            file_name = f'{kepid}.png'
+        progress = progress or _no_progress
+        series = self.arrays.load(kepid)
+        if series is not None:
+            return series
+        
+        kepler_id = 'KIC ' + str(kepid)
+        
+        # Local store first; only search MAST for stars we don't have
+        lcs = self.store.read(kepid)
+        if lcs is None:
+            progress('downloading', 0.1)
             
-            logger.info(f"Generating lightcurve for kepid: {kepid}")
+            # lightkurve pulls in astropy; only import it when MAST is needed
+            import lightkurve as lk
             
             # OPTIMIZATION: Limit data download and processing
             lcs = lk.search_lightcurve(kepler_id, exptime='long', author='Kepler', limit=1).download_all()
             
             if not lcs:
                 logger.warning(f"No lightcurve data found for {kepler_id}")
-                return False, None, None
-            
-            # OPTIMIZATION: Simplified processing
-            lcRaw = lcs.stitch()
-            
-            # OPTIMIZATION: Skip heavy processing steps that cause timeouts
-            # Just use basic cleaning
-            lcClean = lcRaw.remove_outliers()
-            
-            # OPTIMIZATION: Skip gap filling and flattening to reduce processing time
-            # lcClean = lcClean.fill_gaps()
-            # lcClean = lcClean.flatten()
-            # lcClean = lcClean.bin()
-            
-            # OPTIMIZATION: Smaller figure size and lower DPI
-            plt.figure(figsize=(4, 3), dpi=100)  # Reduced size and DPI
-            plt.title(f"Light Curve for KIC {kepid}", fontsize=10, fontweight='bold')
-            plt.xlabel("Time (days)", fontsize=8)
-            plt.ylabel("Normalized Flux", fontsize=8)
-            
-            # OPTIMIZATION: Plot fewer points to reduce memory usage
-            time_values = lcClean.time.value
-            flux_values = lcClean.flux
-            
-            # Downsample if too many points
-            if len(time_values) > 1000:
-                step = len(time_values) // 1000
-                time_values = time_values[::step]
-                flux_values = flux_values[::step]
-            
-            plt.plot(time_values, flux_values, lw=0.5, color='#4a9eff', alpha=0.8)
-            plt.grid(True, alpha=0.3)
-            plt.tight_layout()
+                self.arrays.mark_unavailable(kepid)
+                return None
+            self._store_downloads(kepid, lcs)
+        else:
+            logger.info(f"Read {len(lcs)} stored lightcurve files for kepid: {kepid}")
+        
+        # OPTIMIZATION: Simplified processing
+        progress('processing', 0.5)
+        lcRaw = lcs.stitch()
+        
+        # OPTIMIZATION: Skip heavy processing steps that cause timeouts
+        # Just use basic cleaning
+        lcClean = lcRaw.remove_outliers()
+        
+        # OPTIMIZATION: Skip gap filling and flattening to reduce processing time
+        # lcClean = lcClean.fill_gaps()
+        # lcClean = lcClean.flatten()
+        # lcClean = lcClean.bin()
+        
+        return self.arrays.save(kepid, lcClean.time.value, lcClean.flux, lcClean.flux_err)
+    
+    def retrieve_lc(self, kepid: int, progress: Optional[ProgressCallback] = None) -> Tuple[bool, bytes, str]:
+        """
+        Retrieve and generate lightcurve for a given kepid.
+        OPTIMIZED for production deployment with memory constraints.
+        
+        Args:
+            kepid: The Kepler ID
+            progress: Optional callback receiving (stage, fraction complete)
             
-            # OPTIMIZATION: Lower DPI and smaller buffer
-            buffer = io.BytesIO()
-            plt.savefig(buffer, dpi=150, bbox_inches='tight', facecolor='white', format='png')
-            plt.close()  # Close the figure to free memory
+        Returns:
+            Tuple of (success, image_data, filename)
+        """
+        progress = progress or _no_progress
+        try:
+            file_name = f'{kepid}.png'
             
-            # Get the image data
-            image_data = buffer.getvalue()
-            buffer.close()
+            logger.info(f"Generating lightcurve for kepid: {kepid}")
+            series = self.get_cleaned_lightcurve(kepid, progress)
+            if series is None:
+                return False, None, None
             
-            # OPTIMIZATION: Clear variables to free memory
-            del lcs, lcRaw, lcClean, time_values, flux_values
+            progress('rendering', 0.8)
+            sampled = series.downsample(RENDER_POINTS)
+            image_data = render_lightcurve_png(sampled.time, sampled.flux, f"Light Curve for KIC {kepid}")
             
             logger.info(f"Lightcurve generated for kepid: {kepid}")
             return True, image_data, file_name
@@ -129,6 +142,44 @@ class LightcurveGenerator:
             logger.error(f"Error generating lightcurve for kepid {kepid}: {str(e)}")
             return False, None, None
     
+    def _store_downloads(self, kepid: int, lcs) -> None:
+        """Copy freshly downloaded FITS files into the local store."""
+        for lc in lcs:
+            path = lc.meta.get('FILENAME')
+            if not path:
+                continue
+            try:
+                self.store.add_file(path, kepid)
+            except Exception as e:
+                logger.warning(f"Could not store downloaded lightcurve {path}: {str(e)}")
+    
+    def generate_lightcurve_for_kepid(self, kepid: int,
+                                      progress: Optional[ProgressCallback] = None) -> Tuple[bool, bytes, str]:
+        """
+        Generate lightcurve for a given kepid.
+        Uses fallback simple generator if full generation fails.
+        
+        Args:
+            kepid: The Kepler ID
+            progress: Optional callback receiving (stage, fraction complete)
+            
+        Returns:
+            Tuple of (success, image_data, filename)
+        """
+        # Try full lightcurve generation first
+        try:
+            success, image_data, filename = self.retrieve_lc(kepid, progress)
+            if success and image_data:
+                return success, image_data, filename
+        except Exception as e:
+            logger.warning(f"Full lightcurve generation failed for kepid {kepid}: {str(e)}")
+        
+        # Fallback to simple lightcurve generation
+        logger.info(f"Using fallback simple lightcurve for kepid {kepid}")
+        (progress or _no_progress)('rendering', 0.8)
+        from simple_lightcurve import generate_simple_lightcurve
+        return generate_simple_lightcurve(kepid)
+    
     def generate_lightcurve_for_kepoi(self, kepoi_name: str) -> Tuple[bool, bytes, str, int]:
         """
         Generate lightcurve for a given kepoi_name.
@@ -146,18 +197,7 @@ class LightcurveGenerator:
             if kepid is None:
                 return False, None, None, None
             
-            # Try full lightcurve generation first
-            try:
-                success, image_data, filename = self.retrieve_lc(kepid)
-                if success and image_data:
-                    return success, image_data, filename, kepid
-            except Exception as e:
-                logger.warning(f"Full lightcurve generation failed for {kepoi_name}: {str(e)}")
-            
-            # Fallback to simple lightcurve generation
-            logger.info(f"Using fallback simple lightcurve for {kepoi_name}")
-            from simple_lightcurve import generate_simple_lightcurve
-            success, image_data, filename = generate_simple_lightcurve(kepid)
+            success, image_data, filename = self.generate_lightcurve_for_kepid(kepid)
             return success, image_data, filename, kepid
             
         except Exception as e:
@@ -0,0 +1,187 @@
+"""
+Asynchronous lightcurve generation jobs
+Renders run in a local process pool; job state lives in the database so every API worker can report it
+"""
+
+import time
+import uuid
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Dict, Optional, Tuple
+
+# Heavy modules (lightkurve, matplotlib, pandas) are only imported inside the
+# pool processes and lazily in the API process, because spawned pool
+# processes import this module just to find _run_job
+
+logger = logging.getLogger(__name__)
+
+
+def _run_job(job_id: str, kepid: int) -> Tuple[bool, Optional[bytes], float]:
+    """
+    Generate one lightcurve. Runs in a pool process.
+
+    Returns:
+        Tuple of (success, image_data, generation time in seconds)
+    """
+    from database import db
+    from lightcurve_generator import lightcurve_generator
+
+    def report(stage: str, fraction: float) -> None:
+        db.update_lightcurve_job(job_id, status='running', stage=stage, progress=fraction)
+
+    report('starting', 0.05)
+    start_time = time.time()
+    success, image_data, _ = lightcurve_generator.generate_lightcurve_for_kepid(kepid, report)
+    return bool(success and image_data), image_data, time.time() - start_time
+
+
+class LightcurveJobQueue:
+    """
+    Queue of lightcurve renders backed by a process pool.
+    Requests for a kepid that already has a job in flight share that job,
+    and finished PNGs are stored in the lightcurve cache.
+    """
+
+    def __init__(self, max_workers: int = 2, job_timeout: float = 300.0,
+                 database=None, cache=None):
+        """
+        Args:
+            max_workers: Number of render processes
+            job_timeout: Seconds without progress before a job is reported as failed
+            database: Database holding job state (defaults to the shared instance)
+            cache: Lightcurve cache receiving finished images (defaults to the shared instance)
+        """
+        self.max_workers = max_workers
+        self.job_timeout = job_timeout
+        self._db = database
+        self._cache = cache
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def db(self):
+        if self._db is None:
+            from database import db
+            self._db = db
+        return self._db
+
+    @property
+    def cache(self):
+        if self._cache is None:
+            from lightcurve_cache import lightcurve_cache
+            self._cache = lightcurve_cache
+        return self._cache
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # Spawn rather than fork: the API process is multi-threaded
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    max_tasks_per_child=50
+                )
+            return self._executor
+
+    def _reset_executor(self, broken: ProcessPoolExecutor) -> None:
+        with self._executor_lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, kepid: int, koi_name: str) -> Dict[str, Any]:
+        """
+        Queue a render of the default lightcurve for a kepid, or join the
+        job already in flight for it.
+
+        Args:
+            kepid: The Kepler ID
+            koi_name: KOI name the lightcurve was requested for
+
+        Returns:
+            The job dict
+        """
+        from lightcurve_cache import cache_key
+
+        job = self.db.claim_lightcurve_job(
+            uuid.uuid4().hex, cache_key(kepid), kepid, koi_name, self.job_timeout
+        )
+        if job is None:
+            raise RuntimeError(f"Could not create lightcurve job for {koi_name}")
+
+        if job.pop('created'):
+            executor = self._get_executor()
+            try:
+                future = executor.submit(_run_job, job['job_id'], kepid)
+            except Exception as e:
+                self.db.update_lightcurve_job(job['job_id'], status='failed', stage='failed', error=str(e))
+                if isinstance(e, BrokenProcessPool):
+                    self._reset_executor(executor)
+                raise
+            future.add_done_callback(partial(self._finish, job['job_id'], kepid, koi_name, executor))
+            logger.info(f"Queued lightcurve job {job['job_id']} for {koi_name} (kepid {kepid})")
+        else:
+            logger.info(f"Joined lightcurve job {job['job_id']} for {koi_name} (kepid {kepid})")
+
+        return job
+
+    def _finish(self, job_id: str, kepid: int, koi_name: str,
+                executor: ProcessPoolExecutor, future: Future) -> None:
+        """Store the finished image and record the outcome."""
+        try:
+            success, image_data, generation_time = future.result()
+            if not success:
+                self.db.update_lightcurve_job(
+                    job_id, status='failed', stage='failed',
+                    error='Failed to generate lightcurve - no data returned'
+                )
+                return
+
+            entry = self.cache.put(kepid, image_data, candidate_id=koi_name)
+            self.db.update_lightcurve_job(
+                job_id, status='done', stage='done', progress=1.0,
+                url=f"/api/lightcurve/{entry.key}.png"
+            )
+            logger.info(f"Lightcurve job {job_id} finished in {generation_time:.2f} seconds")
+
+        except BrokenProcessPool as e:
+            logger.error(f"Lightcurve worker died during job {job_id}: {str(e)}")
+            self.db.update_lightcurve_job(job_id, status='failed', stage='failed', error='Worker process crashed')
+            self._reset_executor(executor)
+        except Exception as e:
+            logger.error(f"Lightcurve job {job_id} failed: {str(e)}")
+            self.db.update_lightcurve_job(job_id, status='failed', stage='failed', error=str(e))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the current state of a job.
+
+        Returns:
+            The job dict, or None if the id is unknown
+        """
+        job = self.db.get_lightcurve_job(job_id)
+        if job is None or job['status'] not in ('queued', 'running'):
+            return job
+
+        # A job whose worker died never reports again
+        updated_at = datetime.strptime(job['updated_at'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        if (datetime.now(timezone.utc) - updated_at).total_seconds() > self.job_timeout:
+            job['status'] = 'failed'
+            job['error'] = 'Lightcurve generation timed out - try again later'
+        return job
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global job queue
+lightcurve_jobs = LightcurveJobQueue()
@@ -0,0 +1,271 @@
+"""
+Lightcurve cache prewarming for NASA Exoplanet Detection
+Renders the default lightcurve of every catalog star in a process pool, so user requests hit a warm cache
+
+Run with: python lightcurve_prewarm.py [--workers N] [--limit N] [--retry-failed] [--restart]
+"""
+
+import os
+import json
+import time
+import tempfile
+import logging
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from lightcurve_arrays import lightcurve_arrays
+
+logger = logging.getLogger(__name__)
+
+# Outcome of each star, kept so an interrupted run picks up where it stopped
+CHECKPOINT_PATH = 'lightcurve_prewarm.json'
+
+# Results between checkpoint writes and progress reports
+CHECKPOINT_EVERY = 25
+
+# Outcomes a resumed run never retries. 'failed' is retried with
+# --retry-failed, and 'rendered' or 'cached' stars are rendered again if the
+# cache has evicted them since
+FINAL_STATUSES = ('unavailable',)
+
+
+def _render(kepid: int) -> Tuple[int, str, Optional[bytes], float]:
+    """
+    Render the default lightcurve of one star. Runs in a pool process.
+
+    No synthetic fallback here: a placeholder in the cache would hide the
+    star from later runs.
+
+    Returns:
+        Tuple of (kepid, status, image_data, seconds) with status 'rendered',
+        'unavailable' (no data at MAST) or 'failed'
+    """
+    from lightcurve_generator import lightcurve_generator
+
+    start_time = time.time()
+    success, image_data, _ = lightcurve_generator.retrieve_lc(kepid)
+    if success and image_data:
+        return kepid, 'rendered', image_data, time.time() - start_time
+    status = 'unavailable' if lightcurve_arrays.is_unavailable(kepid) else 'failed'
+    return kepid, status, None, time.time() - start_time
+
+
+class PrewarmCheckpoint:
+    """Per-kepid outcomes of a prewarm run, saved as JSON with an atomic rename."""
+
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = path
+        self.statuses: Dict[int, str] = {}
+
+    def load(self) -> 'PrewarmCheckpoint':
+        try:
+            with open(self.path, 'r') as f:
+                self.statuses = {int(kepid): status for kepid, status in json.load(f)['statuses'].items()}
+        except FileNotFoundError:
+            self.statuses = {}
+        return self
+
+    def save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'updated_at': time.time(),
+                           'statuses': {str(kepid): status for kepid, status in self.statuses.items()}}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for status in self.statuses.values():
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+
+class LightcurvePrewarmer:
+    """
+    Walks the catalog's distinct kepids and renders every default
+    lightcurve that is not cached yet. Pool processes only render; the
+    parent stores each PNG, so cache and database writes stay in one
+    process.
+    """
+
+    def __init__(self, workers: Optional[int] = None, checkpoint: Optional[PrewarmCheckpoint] = None,
+                 catalog=None, cache=None):
+        """
+        Args:
+            workers: Render processes (default: CPU count)
+            checkpoint: Progress record (defaults to CHECKPOINT_PATH)
+            catalog: Kepler catalog to walk (defaults to the shared instance)
+            cache: Lightcurve cache to fill (defaults to the shared instance)
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.checkpoint = checkpoint or PrewarmCheckpoint()
+        if catalog is None:
+            from kepler_catalog import kepler_catalog as catalog
+        if cache is None:
+            from lightcurve_cache import lightcurve_cache as cache
+        self.catalog = catalog
+        self.cache = cache
+
+    def pending(self, retry_failed: bool = False) -> List[Tuple[int, str]]:
+        """
+        Get the stars still to render, one per kepid.
+
+        Multi-planet systems share a star and so a lightcurve; the first
+        KOI of each kepid names it in the cache. Stars rendered or found
+        cached by an earlier run are checked against the cache again, so
+        ones evicted since are requeued.
+
+        Returns:
+            (kepid, koi_name) pairs in catalog order
+        """
+        snapshot = self.catalog.snapshot()
+        done = FINAL_STATUSES if retry_failed else FINAL_STATUSES + ('failed',)
+        stars = []
+        for kepid, row in snapshot.kepid_index.items():
+            status = self.checkpoint.statuses.get(kepid)
+            if status in done:
+                continue
+            if self.cache.lookup(kepid) is not None:
+                if status != 'rendered':
+                    self.checkpoint.statuses[kepid] = 'cached'
+                continue
+            if lightcurve_arrays.is_unavailable(kepid):
+                self.checkpoint.statuses[kepid] = 'unavailable'
+                continue
+            stars.append((kepid, snapshot.kepoi_names[row]))
+        return stars
+
+    def run(self, limit: Optional[int] = None, retry_failed: bool = False) -> Dict[str, Any]:
+        """
+        Render every pending star, checkpointing as results come in.
+
+        At most two renders per worker are queued at a time, so an
+        interrupted run loses little work and memory stays bounded.
+
+        Args:
+            limit: Stop after this many stars
+            retry_failed: Render stars that failed in an earlier run again
+
+        Returns:
+            Outcome counts for this run plus elapsed time and throughput
+        """
+        stars = self.pending(retry_failed)
+        if limit is not None:
+            stars = stars[:limit]
+        total = len(stars)
+        self.checkpoint.save()
+        logger.info(f"Prewarming {total} lightcurves with {self.workers} workers "
+                    f"({len(self.catalog.snapshot().kepid_index)} distinct kepids in the catalog)")
+
+        names = dict(stars)
+        queue = iter(stars)
+        report: Dict[str, Any] = {'rendered': 0, 'unavailable': 0, 'failed': 0, 'bytes': 0}
+        start_time = time.time()
+        completed = 0
+
+        # Spawn rather than fork: lightkurve and astropy are not fork-safe
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 max_tasks_per_child=50) as executor:
+            in_flight: Dict[Any, int] = {}
+            try:
+                while True:
+                    while len(in_flight) < self.workers * 2:
+                        star = next(queue, None)
+                        if star is None:
+                            break
+                        in_flight[executor.submit(_render, star[0])] = star[0]
+                    if not in_flight:
+                        break
+
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        kepid = in_flight.pop(future)
+                        status, image_data = self._collect(future, kepid, names[kepid])
+                        if status == 'rendered':
+                            self.cache.put(kepid, image_data, candidate_id=names[kepid])
+                            report['bytes'] += len(image_data)
+                        self.checkpoint.statuses[kepid] = status
+                        report[status] += 1
+                        completed += 1
+                        if completed % CHECKPOINT_EVERY == 0:
+                            self.checkpoint.save()
+                            self._log_progress(completed, total, start_time)
+                            if completed == CHECKPOINT_EVERY:
+                                self._check_capacity(report, total)
+            except KeyboardInterrupt:
+                logger.warning("Interrupted - saving checkpoint; run again to resume")
+                for future in in_flight:
+                    future.cancel()
+                raise
+            finally:
+                self.checkpoint.save()
+
+        elapsed = time.time() - start_time
+        report.update({
+            'stars': completed,
+            'elapsed_seconds': elapsed,
+            'stars_per_hour': completed / elapsed * 3600 if elapsed > 0 else 0.0
+        })
+        return report
+
+    def _collect(self, future, kepid: int, koi_name: str) -> Tuple[str, Optional[bytes]]:
+        """Unpack a render result, turning a crashed render into a failure."""
+        try:
+            _, status, image_data, seconds = future.result()
+            logger.info(f"kepid {kepid} ({koi_name}): {status} in {seconds:.1f} s")
+            return status, image_data
+        except Exception as e:
+            logger.error(f"Prewarm render of kepid {kepid} failed: {str(e)}")
+            return 'failed', None
+
+    def _check_capacity(self, report: Dict[str, Any], total: int) -> None:
+        """Warn when the projected size of the run would make the cache evict its own renders."""
+        if not report['rendered']:
+            return
+        projected = self.cache.stats()['bytes'] + report['bytes'] / report['rendered'] * total
+        if projected > self.cache.max_bytes:
+            logger.warning(f"Prewarming is projected to need {projected / 2**20:.0f} MiB but the cache "
+                           f"holds {self.cache.max_bytes / 2**20:.0f} MiB; raise LIGHTCURVE_CACHE_MAX_BYTES "
+                           f"or the oldest renders will be evicted")
+
+    def _log_progress(self, completed: int, total: int, start_time: float) -> None:
+        elapsed = time.time() - start_time
+        rate = completed / elapsed if elapsed > 0 else 0.0
+        eta = (total - completed) / rate if rate > 0 else float('inf')
+        logger.info(f"Prewarmed {completed}/{total} stars, {rate * 3600:.0f} stars/hour, "
+                    f"ETA {eta / 60:.1f} min")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Render the default lightcurve of every catalog star')
+    parser.add_argument('--workers', type=int, default=None, help='Render processes (default: CPU count)')
+    parser.add_argument('--limit', type=int, default=None, help='Stop after this many stars')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH, help='Checkpoint file (default: %(default)s)')
+    parser.add_argument('--retry-failed', action='store_true', help='Retry stars that failed in an earlier run')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start over')
+    args = parser.parse_args()
+
+    checkpoint = PrewarmCheckpoint(args.checkpoint)
+    if not args.restart:
+        checkpoint.load()
+    prewarmer = LightcurvePrewarmer(args.workers, checkpoint)
+    try:
+        report = prewarmer.run(limit=args.limit, retry_failed=args.retry_failed)
+    except KeyboardInterrupt:
+        raise SystemExit(130)
+
+    print(f"Rendered {report['rendered']}, unavailable {report['unavailable']}, failed {report['failed']} "
+          f"in {report['elapsed_seconds']:.1f} s ({report['stars_per_hour']:.0f} stars/hour)")
+    print(f"Checkpoint totals: {checkpoint.counts()} -> {args.checkpoint}")
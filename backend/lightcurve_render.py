@@ -0,0 +1,444 @@
+"""
+Fast PNG renderer for lightcurve plots
+Rasterizes the plot straight into a NumPy buffer; only text goes through matplotlib's FreeType wrapper, and rendered labels are cached
+
+Compare against the old pyplot path with: python lightcurve_render.py benchmark
+"""
+
+import io
+import math
+import struct
+import zlib
+import threading
+import numpy as np
+import logging
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 4 x 3 in at 150 dpi, the size the pyplot version produced
+WIDTH, HEIGHT, DPI = 600, 450, 150
+
+BACKGROUND = np.array([1.0, 1.0, 1.0], dtype=np.float32)
+LINE_COLOR = np.array([0x4a, 0x9e, 0xff], dtype=np.float32) / 255
+GRID_COLOR = np.array([0xb0, 0xb0, 0xb0], dtype=np.float32) / 255
+AXES_COLOR = np.array([0.0, 0.0, 0.0], dtype=np.float32)
+POINT_COLOR = np.array([0x60, 0x60, 0x60], dtype=np.float32) / 255
+LINE_ALPHA = 0.8
+GRID_ALPHA = 0.3
+POINT_ALPHA = 0.35
+
+# Font sizes in points
+TITLE_SIZE, LABEL_SIZE, TICK_SIZE = 10, 8, 7
+
+PAD = 8            # Outer padding and gaps between text blocks, in pixels
+TICK_LENGTH = 5
+FRAME_WIDTH = 1
+MAX_TICKS = 7
+
+# zlib level for the PNG; the images are mostly flat colour, so level 1
+# is about twice as fast as the default 6 for a ~20% bigger file
+PNG_COMPRESS_LEVEL = 1
+
+
+class _TextCache:
+    """
+    Rendered text bitmaps keyed by (text, size, bold).
+    FT2Font objects are not thread-safe, so each thread gets its own; the
+    cache itself is shared and guarded by a lock.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._bitmaps: 'OrderedDict[Tuple[str, int, bool], np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._fonts = threading.local()
+
+    def _font(self, bold: bool):
+        fonts = self._fonts.__dict__
+        if bold not in fonts:
+            from matplotlib import font_manager, ft2font
+            path = font_manager.findfont(font_manager.FontProperties(
+                family='DejaVu Sans', weight='bold' if bold else 'normal'
+            ))
+            fonts[bold] = ft2font.FT2Font(path)
+        return fonts[bold]
+
+    def get(self, text: str, size: int, bold: bool = False) -> np.ndarray:
+        """
+        Get the coverage bitmap of a string.
+
+        Returns:
+            float32 array of ink coverage in [0, 1], tight around the glyphs
+        """
+        key = (text, size, bold)
+        with self._lock:
+            bitmap = self._bitmaps.get(key)
+            if bitmap is not None:
+                self._bitmaps.move_to_end(key)
+                return bitmap
+
+        font = self._font(bold)
+        font.clear()
+        font.set_size(size, DPI)
+        font.set_text(text, 0.0)
+        font.draw_glyphs_to_bitmap(antialiased=True)
+        bitmap = np.asarray(font.get_image(), dtype=np.float32) / 255
+        bitmap.setflags(write=False)
+
+        with self._lock:
+            self._bitmaps[key] = bitmap
+            while len(self._bitmaps) > self.max_entries:
+                self._bitmaps.popitem(last=False)
+        return bitmap
+
+
+def nice_ticks(vmin: float, vmax: float, max_ticks: int = MAX_TICKS) -> Tuple[np.ndarray, List[str]]:
+    """
+    Choose round tick values inside [vmin, vmax].
+
+    Returns:
+        Tuple of (tick values, formatted labels)
+    """
+    span = vmax - vmin
+    if not span > 0:
+        span = abs(vmax) or 1.0
+    magnitude = 10 ** math.floor(math.log10(span / max_ticks))
+    for multiple in (1, 2, 2.5, 5, 10):
+        step = multiple * magnitude
+        if span / step <= max_ticks:
+            break
+
+    first = math.ceil(vmin / step) * step
+    count = int(math.floor((vmax - first) / step + 1e-9)) + 1
+    ticks = first + step * np.arange(max(count, 0))
+
+    decimals = max(0, -int(math.floor(math.log10(step))))
+    # 2.5 x 10^k needs one digit more than its magnitude, except for whole
+    # steps (25, 250, ...)
+    if multiple == 2.5 and step < 10:
+        decimals += 1
+    # + 0.0 turns -0.0 into 0.0
+    labels = [f"{value + 0.0:.{decimals}f}" for value in ticks]
+    return ticks, labels
+
+
+def _finite_pairs(x, y) -> Tuple[np.ndarray, np.ndarray]:
+    """x and y as float64 arrays, dropping pairs where either is NaN or inf."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(x) & np.isfinite(y)
+    return x[finite], y[finite]
+
+
+def _limits(values: np.ndarray, margin: float = 0.05) -> Tuple[float, float]:
+    """Data range padded by a margin on each side, like matplotlib's autoscale."""
+    lo, hi = float(np.min(values)), float(np.max(values))
+    if hi == lo:
+        delta = abs(lo) * 0.01 or 1.0
+        return lo - delta, hi + delta
+    pad = (hi - lo) * margin
+    return lo - pad, hi + pad
+
+
+def _blend(canvas: np.ndarray, coverage: np.ndarray, color: np.ndarray, top: int, left: int,
+           alpha: float = 1.0) -> None:
+    """Composite a coverage bitmap onto the canvas at (top, left), clipped to the canvas."""
+    height, width = coverage.shape
+    y0, x0 = max(top, 0), max(left, 0)
+    y1, x1 = min(top + height, canvas.shape[0]), min(left + width, canvas.shape[1])
+    if y0 >= y1 or x0 >= x1:
+        return
+    cov = coverage[y0 - top:y1 - top, x0 - left:x1 - left]
+    region = canvas[y0:y1, x0:x1]
+    region += (color - region) * (cov * alpha)[..., None]
+
+
+def _fill(canvas: np.ndarray, top: int, left: int, bottom: int, right: int,
+          color: np.ndarray, alpha: float = 1.0) -> None:
+    """Composite a solid rectangle [top, bottom) x [left, right)."""
+    region = canvas[max(top, 0):bottom, max(left, 0):right]
+    region += (color - region) * alpha
+
+
+def _polyline_coverage(px: np.ndarray, py: np.ndarray, height: int, width: int) -> np.ndarray:
+    """
+    Anti-aliased coverage of a ~1 px polyline.
+
+    Every segment is sampled once per pixel along its major axis and the
+    samples are splatted bilinearly with a single np.bincount, so the cost
+    is linear in the drawn length with no per-segment Python loop.
+
+    Args:
+        px, py: Vertex positions in pixels, relative to the plot area
+        height, width: Size of the plot area
+
+    Returns:
+        (height, width) float32 coverage, clipped to [0, 1]
+    """
+    if len(px) < 2:
+        return np.zeros((height, width), dtype=np.float32)
+
+    dx, dy = np.diff(px), np.diff(py)
+    samples = np.maximum(np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64), 1)
+    segment = np.repeat(np.arange(len(dx)), samples)
+    starts = np.cumsum(samples) - samples
+    fraction = (np.arange(int(samples.sum())) - starts[segment] + 0.5) / samples[segment]
+
+    x = px[segment] + dx[segment] * fraction
+    y = py[segment] + dy[segment] * fraction
+    weight = (np.hypot(dx, dy) / samples)[segment]
+    return _splat(x, y, weight, height, width)
+
+
+def _splat(x: np.ndarray, y: np.ndarray, weight: np.ndarray, height: int, width: int) -> np.ndarray:
+    """
+    Accumulate weighted samples into a coverage image with bilinear taps.
+
+    Args:
+        x, y: Sample positions in pixels
+        weight: Ink per sample
+        height, width: Size of the image
+
+    Returns:
+        (height, width) float32 coverage, clipped to [0, 1]
+    """
+    # Pixel centres sit at integer + 0.5; the buffer has a one pixel border
+    # so the four bilinear taps never need their own bounds checks
+    x = x + 0.5
+    y = y + 0.5
+    inside = (x >= 0) & (x < width + 1) & (y >= 0) & (y < height + 1)
+    x, y, weight = x[inside], y[inside], weight[inside]
+
+    x0, y0 = np.floor(x), np.floor(y)
+    fx, fy = x - x0, y - y0
+    stride = width + 2
+    index = y0.astype(np.int64) * stride + x0.astype(np.int64)
+
+    taps = np.concatenate((index, index + 1, index + stride, index + stride + 1))
+    weights = np.concatenate((
+        weight * (1 - fx) * (1 - fy), weight * fx * (1 - fy),
+        weight * (1 - fx) * fy, weight * fx * fy
+    ))
+    coverage = np.bincount(taps, weights=weights, minlength=(height + 2) * stride)
+    coverage = coverage.reshape(height + 2, stride)[1:-1, 1:-1]
+    return np.minimum(coverage, 1.0).astype(np.float32)
+
+
+def encode_png(pixels: np.ndarray, compress_level: int = PNG_COMPRESS_LEVEL) -> bytes:
+    """
+    Encode an (height, width, 3) uint8 array as an RGB PNG.
+
+    Rows are stored unfiltered: on flat-colour plots that compresses about
+    as well as adaptive filtering and skips its cost entirely.
+    """
+    height, width, _ = pixels.shape
+    raw = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 0] = 0  # filter type None
+    raw[:, 1:] = pixels.reshape(height, width * 3)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (struct.pack('>I', len(data)) + tag + data
+                + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), compress_level))
+            + chunk(b'IEND', b''))
+
+
+class LightcurveRenderer:
+    """
+    Draws a titled line plot with ticks, grid and axis labels into a NumPy
+    RGB buffer and encodes it as PNG. Nothing is shared between calls
+    except the text cache, so renders are thread-safe.
+    """
+
+    def __init__(self, width: int = WIDTH, height: int = HEIGHT,
+                 compress_level: int = PNG_COMPRESS_LEVEL):
+        """
+        Args:
+            width: Image width in pixels
+            height: Image height in pixels
+            compress_level: zlib level used for the PNG
+        """
+        self.width = width
+        self.height = height
+        self.compress_level = compress_level
+        self._text = _TextCache()
+
+    def render(self, x, y, title: str, xlabel: str = "Time (days)",
+               ylabel: str = "Normalized Flux",
+               xlim: Optional[Tuple[float, float]] = None,
+               ylim: Optional[Tuple[float, float]] = None,
+               scatter: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> bytes:
+        """
+        Render a line plot to PNG.
+
+        Args:
+            x: x values (time), any array-like
+            y: y values (flux)
+            title: Bold title above the plot
+            xlabel: x axis label
+            ylabel: y axis label
+            xlim: Fixed x range (default: data range plus a 5% margin)
+            ylim: Fixed y range (default: data range plus a 5% margin)
+            scatter: Optional (x, y) points drawn as faint dots under the line
+
+        Returns:
+            PNG bytes
+        """
+        x, y = _finite_pairs(x, y)
+        if len(x) == 0:
+            raise ValueError("Nothing to plot")
+
+        xmin, xmax = xlim if xlim is not None else _limits(x)
+        ymin, ymax = ylim if ylim is not None else _limits(y)
+        xticks, xtick_labels = nice_ticks(xmin, xmax)
+        yticks, ytick_labels = nice_ticks(ymin, ymax)
+
+        title_bitmap = self._text.get(title, TITLE_SIZE, bold=True)
+        xlabel_bitmap = self._text.get(xlabel, LABEL_SIZE)
+        ylabel_bitmap = np.rot90(self._text.get(ylabel, LABEL_SIZE))
+        xtick_bitmaps = [self._text.get(label, TICK_SIZE) for label in xtick_labels]
+        ytick_bitmaps = [self._text.get(label, TICK_SIZE) for label in ytick_labels]
+        tick_text_height = max((b.shape[0] for b in xtick_bitmaps), default=0)
+        tick_text_width = max((b.shape[1] for b in ytick_bitmaps), default=0)
+
+        # Fixed margins derived from the text actually drawn; no layout solver
+        top = PAD + title_bitmap.shape[0] + PAD
+        bottom = self.height - (PAD + xlabel_bitmap.shape[0] + PAD + tick_text_height + TICK_LENGTH + 2)
+        left = PAD + ylabel_bitmap.shape[1] + PAD + tick_text_width + TICK_LENGTH + 2
+        right = self.width - 2 * PAD
+        plot_w, plot_h = right - left, bottom - top
+
+        def to_px(values, lo, hi, size):
+            return (values - lo) / (hi - lo) * size
+
+        xtick_px = np.round(to_px(xticks, xmin, xmax, plot_w)).astype(int) + left
+        ytick_px = bottom - np.round(to_px(yticks, ymin, ymax, plot_h)).astype(int)
+
+        canvas = np.empty((self.height, self.width, 3), dtype=np.float32)
+        canvas[:] = BACKGROUND
+
+        # Grid, data, then the frame on top
+        for px in xtick_px:
+            _fill(canvas, top, px, bottom, px + 1, GRID_COLOR, GRID_ALPHA)
+        for py in ytick_px:
+            _fill(canvas, py, left, py + 1, right, GRID_COLOR, GRID_ALPHA)
+
+        if scatter is not None:
+            sx, sy = _finite_pairs(*scatter)
+            dots = _splat(to_px(sx, xmin, xmax, plot_w), plot_h - to_px(sy, ymin, ymax, plot_h),
+                          np.ones(len(sx)), plot_h, plot_w)
+            _blend(canvas, dots, POINT_COLOR, top, left, POINT_ALPHA)
+
+        coverage = _polyline_coverage(
+            to_px(x, xmin, xmax, plot_w),
+            plot_h - to_px(y, ymin, ymax, plot_h),
+            plot_h, plot_w
+        )
+        _blend(canvas, coverage, LINE_COLOR, top, left, LINE_ALPHA)
+
+        _fill(canvas, top - FRAME_WIDTH, left - FRAME_WIDTH, top, right + FRAME_WIDTH, AXES_COLOR)
+        _fill(canvas, bottom, left - FRAME_WIDTH, bottom + FRAME_WIDTH, right + FRAME_WIDTH, AXES_COLOR)
+        _fill(canvas, top, left - FRAME_WIDTH, bottom, left, AXES_COLOR)
+        _fill(canvas, top, right, bottom, right + FRAME_WIDTH, AXES_COLOR)
+
+        # Ticks and their labels
+        for px, bitmap in zip(xtick_px, xtick_bitmaps):
+            _fill(canvas, bottom + FRAME_WIDTH, px, bottom + FRAME_WIDTH + TICK_LENGTH, px + 1, AXES_COLOR)
+            _blend(canvas, bitmap, AXES_COLOR, bottom + FRAME_WIDTH + TICK_LENGTH + 2,
+                   px - bitmap.shape[1] // 2)
+        for py, bitmap in zip(ytick_px, ytick_bitmaps):
+            _fill(canvas, py, left - FRAME_WIDTH - TICK_LENGTH, py + 1, left - FRAME_WIDTH, AXES_COLOR)
+            _blend(canvas, bitmap, AXES_COLOR, py - bitmap.shape[0] // 2,
+                   left - FRAME_WIDTH - TICK_LENGTH - 2 - bitmap.shape[1])
+
+        # Title and axis labels, centred on the plot area
+        _blend(canvas, title_bitmap, AXES_COLOR, PAD, left + (plot_w - title_bitmap.shape[1]) // 2)
+        _blend(canvas, xlabel_bitmap, AXES_COLOR, self.height - PAD - xlabel_bitmap.shape[0],
+               left + (plot_w - xlabel_bitmap.shape[1]) // 2)
+        _blend(canvas, ylabel_bitmap, AXES_COLOR, top + (plot_h - ylabel_bitmap.shape[0]) // 2, PAD)
+
+        return self._encode(canvas)
+
+    def _encode(self, canvas: np.ndarray) -> bytes:
+        pixels = (np.clip(canvas, 0.0, 1.0) * 255 + 0.5).astype(np.uint8)
+        return encode_png(pixels, self.compress_level)
+
+
+# Global renderer instance
+lightcurve_renderer = LightcurveRenderer()
+
+
+def render_lightcurve_png(x, y, title: str, **kwargs) -> bytes:
+    """
+    Convenience function to render a lightcurve plot to PNG.
+
+    Args:
+        x: Time values
+        y: Flux values
+        title: Plot title
+        **kwargs: xlabel, ylabel, xlim, ylim or scatter, see LightcurveRenderer.render
+
+    Returns:
+        PNG bytes
+    """
+    return lightcurve_renderer.render(x, y, title, **kwargs)
+
+
+def _render_pyplot(x, y, title: str) -> bytes:
+    """The pyplot rendering retrieve_lc used before this module, for benchmarks."""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+
+    plt.figure(figsize=(4, 3), dpi=100)
+    plt.title(title, fontsize=10, fontweight='bold')
+    plt.xlabel("Time (days)", fontsize=8)
+    plt.ylabel("Normalized Flux", fontsize=8)
+    plt.plot(x, y, lw=0.5, color='#4a9eff', alpha=0.8)
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    buffer = io.BytesIO()
+    plt.savefig(buffer, dpi=150, bbox_inches='tight', facecolor='white', format='png')
+    plt.close()
+    return buffer.getvalue()
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description='Lightcurve renderer tools')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subcommands.add_parser('benchmark', help='Time this renderer against pyplot')
+    bench_parser.add_argument('--points', type=int, default=1000, help='Points per plot (default: %(default)s)')
+    bench_parser.add_argument('--runs', type=int, default=30, help='Timed renders per renderer (default: %(default)s)')
+    bench_parser.add_argument('--output-dir', help='Also write one PNG from each renderer here')
+    args = parser.parse_args()
+
+    # Synthetic multi-quarter lightcurve with transits
+    rng = np.random.default_rng(0)
+    time_values = np.linspace(131.5, 1591.0, args.points)
+    flux_values = 1.0 + 2e-4 * rng.standard_normal(args.points)
+    flux_values[np.abs((time_values - 140.0) % 37.3 - 18.65) > 18.4] -= 0.004
+    title = "Light Curve for KIC 10666592"
+
+    results = {}
+    for name, render in (('pyplot', _render_pyplot), ('numpy', render_lightcurve_png)):
+        png = render(time_values, flux_values, title)  # warm fonts and caches
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            png = render(time_values, flux_values, title)
+        results[name] = (time.perf_counter() - start) / args.runs * 1000
+        print(f"{name:>7}: {results[name]:7.1f} ms per PNG ({len(png)} bytes)")
+        if args.output_dir:
+            os.makedirs(args.output_dir, exist_ok=True)
+            with open(os.path.join(args.output_dir, f"benchmark_{name}.png"), 'wb') as f:
+                f.write(png)
+
+    print(f"speedup: {results['pyplot'] / results['numpy']:.1f}x")
@@ -0,0 +1,220 @@
+"""
+Local Kepler lightcurve store
+Long-cadence FITS files kept on disk by kepid, so retrieve_lc only searches MAST for stars we have never seen
+
+Populate from a folder of downloaded files with: python lightcurve_store.py ingest <folder> [--move]
+"""
+
+import os
+import re
+import gzip
+import shutil
+import tempfile
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# MAST naming for Kepler long-cadence lightcurves, e.g. kplr010666592-2011271113734_llc.fits
+FILENAME_PATTERN = re.compile(r'^kplr(\d{9})-(\d{13})_llc\.fits(?:\.gz)?$')
+
+
+class LightcurveStore:
+    """
+    Directory of Kepler long-cadence FITS files, one sub-directory per kepid.
+    The directory layout is the index, so every worker process sees files
+    ingested by any other without a reload. Files are stored uncompressed
+    so astropy can memory-map them instead of reading them into memory.
+    """
+
+    def __init__(self, store_dir: str = 'lightcurve_data'):
+        """
+        Args:
+            store_dir: Root directory of the store
+        """
+        self.store_dir = store_dir
+
+    def kepid_dir(self, kepid: int) -> str:
+        return os.path.join(self.store_dir, f"{int(kepid):09d}")
+
+    def files_for(self, kepid: int) -> List[str]:
+        """
+        Get the stored FITS files of a star, oldest quarter first.
+
+        Args:
+            kepid: The Kepler ID
+
+        Returns:
+            File paths, empty if the star is not in the store
+        """
+        directory = self.kepid_dir(kepid)
+        try:
+            names = sorted(name for name in os.listdir(directory) if name.endswith('.fits'))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(directory, name) for name in names]
+
+    def has(self, kepid: int) -> bool:
+        return bool(self.files_for(kepid))
+
+    def read(self, kepid: int):
+        """
+        Read every stored quarter of a star.
+
+        Args:
+            kepid: The Kepler ID
+
+        Returns:
+            A lightkurve LightCurveCollection, or None if nothing is stored
+        """
+        paths = self.files_for(kepid)
+        if not paths:
+            return None
+
+        import lightkurve as lk
+
+        lightcurves = []
+        for path in paths:
+            try:
+                # astropy opens uncompressed FITS with memmap=True, so only
+                # the columns lightkurve touches are paged in
+                lightcurves.append(lk.read(path))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable lightcurve file {path}: {str(e)}")
+
+        if not lightcurves:
+            return None
+        return lk.LightCurveCollection(lightcurves)
+
+    def identify(self, path: str) -> Optional[int]:
+        """
+        Get the kepid of a Kepler long-cadence lightcurve file.
+
+        Args:
+            path: Path to a FITS file
+
+        Returns:
+            The kepid, or None if the file is not a Kepler long-cadence lightcurve
+        """
+        match = FILENAME_PATTERN.match(os.path.basename(path))
+        if match:
+            return int(match.group(1))
+
+        # Renamed files: fall back to the primary header
+        try:
+            from astropy.io import fits
+            header = fits.getheader(path, 0)
+        except Exception:
+            return None
+        if str(header.get('TELESCOP', '')).lower() != 'kepler':
+            return None
+        if str(header.get('OBSMODE', 'long cadence')).lower() != 'long cadence':
+            return None
+        kepid = header.get('KEPLERID')
+        return int(kepid) if kepid else None
+
+    def add_file(self, path: str, kepid: Optional[int] = None, move: bool = False) -> Optional[str]:
+        """
+        Copy one lightcurve file into the store.
+
+        Args:
+            path: Path to a Kepler long-cadence FITS file (optionally gzipped)
+            kepid: The Kepler ID, read from the file if not given
+            move: Remove the source file once it is stored
+
+        Returns:
+            The stored path, or None if the file was rejected
+        """
+        if kepid is None:
+            kepid = self.identify(path)
+            if kepid is None:
+                return None
+
+        name = os.path.basename(path)
+        if name.endswith('.gz'):
+            name = name[:-3]
+        if not name.endswith('.fits'):
+            name += '.fits'
+
+        directory = self.kepid_dir(kepid)
+        target = os.path.join(directory, name)
+        if os.path.exists(target):
+            if move:
+                os.remove(path)
+            return target
+
+        os.makedirs(directory, exist_ok=True)
+        # Write a temp file next to the target and rename it in, so a reader
+        # never memory-maps a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(tmp_path, target)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        if move:
+            os.remove(path)
+        return target
+
+    def ingest(self, folder: str, move: bool = False) -> Dict[str, int]:
+        """
+        Add every Kepler long-cadence lightcurve found under a folder.
+
+        Args:
+            folder: Directory searched recursively for .fits and .fits.gz files
+            move: Remove source files once they are stored
+
+        Returns:
+            Counts of stored and rejected files and of distinct kepids
+        """
+        report = {'stored': 0, 'rejected': 0, 'kepids': 0}
+        kepids = set()
+        for root, _, names in os.walk(folder):
+            for name in sorted(names):
+                if not name.endswith(('.fits', '.fits.gz')):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    kepid = self.identify(path)
+                    stored = self.add_file(path, kepid, move) if kepid is not None else None
+                except Exception as e:
+                    logger.warning(f"Could not ingest {path}: {str(e)}")
+                    stored = None
+
+                if stored is None:
+                    report['rejected'] += 1
+                    continue
+                report['stored'] += 1
+                kepids.add(kepid)
+
+        report['kepids'] = len(kepids)
+        return report
+
+
+# Global store instance
+lightcurve_store = LightcurveStore()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Manage the local Kepler lightcurve store')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = subcommands.add_parser('ingest', help='Add FITS files from a folder')
+    ingest_parser.add_argument('folder', help='Folder searched recursively for lightcurve files')
+    ingest_parser.add_argument('--move', action='store_true', help='Remove source files once stored')
+    ingest_parser.add_argument('--store-dir', default=lightcurve_store.store_dir,
+                               help='Store directory (default: %(default)s)')
+    args = parser.parse_args()
+
+    report = LightcurveStore(args.store_dir).ingest(args.folder, move=args.move)
+    print(f"Stored {report['stored']} files for {report['kepids']} kepids "
+          f"({report['rejected']} rejected) -> {args.store_dir}")
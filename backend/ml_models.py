@@ -1,37 +1,445 @@
 """
 ML Models Module for NASA Exoplanet Detection
 Handles training and prediction for Kepler and TESS datasets
+
+Export the Kepler trees for the NumPy backend with: python ml_models.py export-trees
+Check and time it against xgboost with: python ml_models.py parity / python ml_models.py benchmark
 """
 
+import io
+import os
+import json
+import hashlib
 import pickle
-import pandas as pd
+import tempfile
+import threading
+import time
 import numpy as np
 import logging
-from typing import Tuple, Dict, Any
+from typing import TYPE_CHECKING, Callable, List, Tuple, Dict, Any, Optional, Union
+
+# pandas is only needed for type hints; importing it costs ~200 ms of worker start-up
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 'xgboost' unpickles the XGBClassifier; 'numpy' scores the exported tree
+# arrays and never imports xgboost
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'xgboost')
+
+# Largest probability difference the NumPy evaluator may show against
+# predict_proba. Margins match bit for bit; the sigmoid differs by a few
+# float32 ulps because xgboost's compiled expf is not NumPy's
+PARITY_TOLERANCE = 1e-6
+
+
+class TreeEnsemble:
+    """
+    Gradient-boosted trees flattened into NumPy arrays, one entry per node
+    across all trees. Leaves point to themselves, so a fixed number of
+    vectorized steps (the deepest tree's depth) walks every row down every
+    tree at once.
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray,
+                 right: np.ndarray, default_left: np.ndarray, value: np.ndarray, roots: np.ndarray,
+                 base_margin: float, max_depth: int, num_feature: int, source_sha256: str = ''):
+        self.feature = feature            # int32 split feature, 0 at leaves
+        self.threshold = threshold        # float32, go left when x < threshold
+        self.left = left                  # int32 node index, self at leaves
+        self.right = right
+        self.default_left = default_left  # bool, direction for missing values
+        self.value = value                # float32 leaf value, 0 at split nodes
+        self.roots = roots                # int32 root node of each tree
+        self.base_margin = np.float32(base_margin)
+        self.max_depth = int(max_depth)
+        self.num_feature = int(num_feature)
+        self.source_sha256 = source_sha256  # model file the trees were exported from
+
+    def __len__(self) -> int:
+        return len(self.roots)
+
+    def predict_margin(self, data: np.ndarray) -> np.ndarray:
+        """
+        Raw scores before the sigmoid.
+
+        Leaf values are added tree by tree in float32, the order xgboost
+        uses, so the margins are bit-identical to Booster.predict's.
+
+        Args:
+            data: N x num_feature matrix, NaN for missing values
+
+        Returns:
+            Length-N float32 margins
+        """
+        data = np.ascontiguousarray(data, dtype=np.float32).reshape(-1, self.num_feature)
+        rows = np.arange(len(data))[:, None]
+        nodes = np.repeat(self.roots[None, :], len(data), axis=0)
+        for _ in range(self.max_depth):
+            values = data[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(values), self.default_left[nodes], values < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        leaves = self.value[nodes]
+        margin = np.full(len(data), self.base_margin, dtype=np.float32)
+        for tree in range(leaves.shape[1]):
+            margin += leaves[:, tree]
+        return margin
+
+    def predict_proba(self, data: np.ndarray) -> np.ndarray:
+        """
+        Class probabilities, laid out like XGBClassifier.predict_proba.
+
+        Returns:
+            N x 2 float32 matrix of [P(not exoplanet), P(exoplanet)]
+        """
+        margin = self.predict_margin(data)
+        # exp in float64 rounded to float32 is closer to libm's expf than
+        # NumPy's float32 exp
+        exp = np.exp(-np.minimum(margin, np.float32(88.7)).astype(np.float64)).astype(np.float32)
+        positive = np.float32(1.0) / (exp + np.float32(1.0))
+        return np.vstack((np.float32(1.0) - positive, positive)).T
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(buffer, feature=self.feature, threshold=self.threshold, left=self.left,
+                 right=self.right, default_left=self.default_left, value=self.value, roots=self.roots,
+                 base_margin=self.base_margin, max_depth=self.max_depth, num_feature=self.num_feature,
+                 source_sha256=self.source_sha256)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TreeEnsemble':
+        with np.load(io.BytesIO(data)) as arrays:
+            return cls(arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+                       arrays['default_left'], arrays['value'], arrays['roots'],
+                       float(arrays['base_margin']), int(arrays['max_depth']),
+                       int(arrays['num_feature']), str(arrays['source_sha256']))
+
+    def save(self, path: str) -> None:
+        """Write the arrays as .npz through a temp file, so a hot reload never reads half a file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.to_bytes())
+            # mkstemp creates the file owner-only; the model is shared like the pickle
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+def export_trees(model, source_sha256: str = '') -> TreeEnsemble:
+    """
+    Flatten a fitted binary XGBClassifier into a TreeEnsemble.
+
+    Args:
+        model: xgboost.XGBClassifier with objective binary:logistic
+        source_sha256: SHA-256 of the model file, recorded for provenance
+
+    Returns:
+        The ensemble, scoring the same trees predict_proba uses
+
+    Raises:
+        ValueError: For objectives, boosters or splits the evaluator does not support
+    """
+    learner = json.loads(model.get_booster().save_raw('json'))['learner']
+    objective = learner['objective']['name']
+    if objective != 'binary:logistic':
+        raise ValueError(f"Only binary:logistic models can be exported, not {objective}")
+    booster = learner['gradient_booster']
+    if booster['name'] != 'gbtree':
+        raise ValueError(f"Only gbtree boosters can be exported, not {booster['name']}")
+
+    trees = booster['model']['trees']
+    try:
+        # predict_proba stops at the best iteration of an early-stopped model
+        parallel = int(booster['model']['gbtree_model_param']['num_parallel_tree'])
+        trees = trees[:(model.best_iteration + 1) * parallel]
+    except AttributeError:
+        pass
+
+    columns = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'default_left', 'value')}
+    roots, offset, max_depth = [], 0, 0
+    for tree in trees:
+        if any(tree['split_type']):
+            raise ValueError(f"Tree {tree['id']} has categorical splits")
+        left = np.asarray(tree['left_children'], dtype=np.int64)
+        right = np.asarray(tree['right_children'], dtype=np.int64)
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        leaf = left == -1
+        index = np.arange(len(left)) + offset
+
+        # Leaves keep their value in split_conditions
+        columns['feature'].append(np.where(leaf, 0, tree['split_indices']))
+        columns['threshold'].append(np.where(leaf, np.float32(0), conditions))
+        columns['left'].append(np.where(leaf, index, left + offset))
+        columns['right'].append(np.where(leaf, index, right + offset))
+        columns['default_left'].append(np.asarray(tree['default_left'], dtype=bool))
+        columns['value'].append(np.where(leaf, conditions, np.float32(0)))
+
+        # Children always come after their parent in xgboost's node order
+        depth = np.zeros(len(left), dtype=np.int64)
+        for node in np.flatnonzero(~leaf):
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+        max_depth = max(max_depth, int(depth.max()))
+
+        roots.append(offset)
+        offset += len(left)
+
+    # xgboost stores base_score as a probability and converts it to a
+    # margin in float32
+    base_score = np.float32(learner['learner_model_param']['base_score'].strip('[]'))
+    base_margin = -np.log(np.float32(1.0) / base_score - np.float32(1.0))
+
+    return TreeEnsemble(
+        np.concatenate(columns['feature']).astype(np.int32),
+        np.concatenate(columns['threshold']).astype(np.float32),
+        np.concatenate(columns['left']).astype(np.int32),
+        np.concatenate(columns['right']).astype(np.int32),
+        np.concatenate(columns['default_left']),
+        np.concatenate(columns['value']).astype(np.float32),
+        np.asarray(roots, dtype=np.int32),
+        float(base_margin), max_depth, int(learner['learner_model_param']['num_feature']),
+        source_sha256
+    )
+
+
+class _WrappedModel:
+    """Predictor for models without a Booster: their own predict_proba."""
+
+    def __init__(self, model):
+        self.model = model
+        self.predict_proba = model.predict_proba
+
+
 class ExoplanetMLModel:
     """
     Main ML model class for exoplanet detection
     Handles both Kepler and TESS datasets
     """
 
-    def __init__(self):
+    def __init__(self, kepler_model_path: str = "models/koi_xgb.pkl",
+                 tess_model_path: Optional[str] = None,
+                 reload_check_interval: float = 2.0,
+                 backend: str = MODEL_BACKEND,
+                 kepler_trees_path: str = "models/koi_xgb_trees.npz"):
+        """
+        Args:
+            kepler_model_path (str): Path to the pickled Kepler XGBoost model
+            tess_model_path (Optional[str]): Path to the pickled TESS model, if any
+            reload_check_interval (float): Minimum seconds between mtime checks
+                of a loaded model file
+            backend (str): 'xgboost', or 'numpy' to score the exported trees
+                without loading xgboost
+            kepler_trees_path (str): Kepler trees exported by export_trees(),
+                used by the 'numpy' backend
+        """
+        if backend not in ('xgboost', 'numpy'):
+            raise ValueError(f"Unknown model backend: {backend}")
         self.kepler_model = None
         self.tess_model = None
+        self.backend = backend
         # Models are pre-trained, no training needed
+        self.model_paths = {
+            'kepler': kepler_trees_path if backend == 'numpy' else kepler_model_path,
+            'tess': tess_model_path,
+        }
+        # Pickles the 'numpy' backend's trees must have been exported from
+        self.source_model_paths = {'kepler': kepler_model_path} if backend == 'numpy' else {}
+        self.reload_check_interval = reload_check_interval
+        # SHA-256 of each loaded model file, used to key derived caches
+        self.model_hashes: Dict[str, str] = {}
+        self._model_mtimes: Dict[str, float] = {}
+        self._last_checked: Dict[str, float] = {}
+        self._load_lock = threading.Lock()
+        # Native Booster predictors, rebuilt whenever their model is swapped
+        self._predictors: Dict[str, Any] = {}
+        self._reload_listeners: List[Callable[[str, str], None]] = []
+
+    def add_reload_listener(self, listener: Callable[[str, str], None]) -> None:
+        """
+        Register a callback run as listener(dataset_name, model_hash) whenever
+        a model file with a different hash replaces a loaded one. The first
+        load is not a reload: it can happen in a preloading gunicorn master,
+        where a callback must not start threads that would be forked.
+        Callbacks run with the load lock held and must not block or load models.
+        """
+        self._reload_listeners.append(listener)
+
+    def _check_trees_source(self, dataset_name: str, path: str, ensemble: TreeEnsemble) -> None:
+        """
+        Refuse exported trees that were not exported from the pickled model
+        next to them, so a retrained model is never shadowed by stale trees.
+        Nothing is checked when the pickle is not deployed.
+
+        Raises:
+            ValueError: If the trees' source_sha256 differs from the pickle's hash
+        """
+        source_path = self.source_model_paths.get(dataset_name)
+        if not source_path or not os.path.exists(source_path):
+            return
+        with open(source_path, 'rb') as f:
+            source_sha256 = hashlib.sha256(f.read()).hexdigest()
+        if ensemble.source_sha256 != source_sha256:
+            raise ValueError(f"{path} was not exported from {source_path}; "
+                             f"run `python ml_models.py export-trees` again")
+
+    def _load_model_file(self, dataset_name: str) -> bool:
+        """
+        Load a model from disk (a pickle, or exported trees for .npz files)
+        and swap it in.
+        Must be called with self._load_lock held.
+
+        Args:
+            dataset_name (str): Name of the dataset ('kepler' or 'tess')
+
+        Returns:
+            bool: True if a model was loaded
+        """
+        path = self.model_paths.get(dataset_name)
+        if not path or not os.path.exists(path):
+            return False
+
+        mtime = os.path.getmtime(path)
+        with open(path, "rb") as f:
+            model_bytes = f.read()
+        if path.endswith('.npz'):
+            model = TreeEnsemble.from_bytes(model_bytes)
+            self._check_trees_source(dataset_name, path, model)
+        else:
+            model = pickle.loads(model_bytes)
+
+        # A single attribute assignment is atomic, so requests already holding
+        # the previous model keep using it until they finish
+        setattr(self, f'{dataset_name}_model', model)
+        model_hash = hashlib.sha256(model_bytes).hexdigest()
+        previous_hash = self.model_hashes.get(dataset_name)
+        self.model_hashes[dataset_name] = model_hash
+        self._model_mtimes[dataset_name] = mtime
+        self._last_checked[dataset_name] = time.monotonic()
+        logger.info(f"Loaded {dataset_name} model from {path}")
+
+        if previous_hash is not None and model_hash != previous_hash:
+            for listener in self._reload_listeners:
+                try:
+                    listener(dataset_name, model_hash)
+                except Exception as e:
+                    logger.error(f"Model reload listener failed: {str(e)}")
+        return True
+
+    def load_models(self) -> None:
+        """
+        Load every configured model into memory.
+        Call this before forking workers (e.g. gunicorn preload) so the
+        booster pages are shared copy-on-write between processes.
+        """
+        with self._load_lock:
+            for dataset_name in self.model_paths:
+                try:
+                    self._load_model_file(dataset_name)
+                except Exception as e:
+                    logger.error(f"Error loading {dataset_name} model: {str(e)}")
+
+    def get_model(self, dataset_name: str):
+        """
+        Get the resident model for a dataset, loading it on first use and
+        hot-reloading it when the pickle's mtime changes.
+
+        Args:
+            dataset_name (str): Name of the dataset ('kepler' or 'tess')
 
+        Returns:
+            The loaded model, or None if no model file is configured
+        """
+        model = getattr(self, f'{dataset_name}_model', None)
+
+        if model is None:
+            # First use: every caller has to wait for the initial load
+            with self._load_lock:
+                model = getattr(self, f'{dataset_name}_model', None)
+                if model is None and self._load_model_file(dataset_name):
+                    model = getattr(self, f'{dataset_name}_model')
+            return model
+
+        now = time.monotonic()
+        if now - self._last_checked.get(dataset_name, 0.0) < self.reload_check_interval:
+            return model
+
+        # Only one thread checks for a newer file; the others keep serving
+        # the current model instead of waiting on the lock
+        if self._load_lock.acquire(blocking=False):
+            try:
+                self._last_checked[dataset_name] = now
+                path = self.model_paths[dataset_name]
+                if os.path.getmtime(path) != self._model_mtimes.get(dataset_name):
+                    logger.info(f"Model file {path} changed, reloading")
+                    self._load_model_file(dataset_name)
+                    model = getattr(self, f'{dataset_name}_model')
+            except Exception as e:
+                logger.error(f"Error reloading {dataset_name} model: {str(e)}")
+            finally:
+                self._load_lock.release()
+
+        return model
+
+
+    def get_predictor(self, dataset_name: str):
+        """
+        Get a Booster-backed predictor for the resident model of a dataset.
+
+        Args:
+            dataset_name (str): Name of the dataset ('kepler' or 'tess')
+
+        Returns:
+            An object with predict_proba: a BoosterPredictor when the model
+            is an XGBClassifier, otherwise the model itself (e.g. a
+            TreeEnsemble on the 'numpy' backend), or None if no
+            model is loaded
+        """
+        model = self.get_model(dataset_name)
+        if model is None:
+            return None
 
-    def predict(self, dataset_name: str, data_point: pd.DataFrame) -> Dict[str, Any]:
+        predictor = self._predictors.get(dataset_name)
+        if predictor is None or predictor.model is not model:
+            from booster_inference import make_predictor
+
+            booster_predictor = make_predictor(model)
+            predictor = booster_predictor if booster_predictor is not None else _WrappedModel(model)
+            self._predictors[dataset_name] = predictor
+        return predictor
+
+    def get_model_hash(self, dataset_name: str) -> Optional[str]:
+        """
+        Get the SHA-256 of the model file currently in use for a dataset,
+        loading or reloading the model first if needed.
+
+        Args:
+            dataset_name (str): Name of the dataset ('kepler' or 'tess')
+
+        Returns:
+            Optional[str]: Hex digest, or None if no model is loaded
+        """
+        self.get_model(dataset_name)
+        return self.model_hashes.get(dataset_name)
+
+    def predict(self, dataset_name: str, data_point: Union['pd.DataFrame', np.ndarray]) -> Dict[str, Any]:
         """
         Make prediction on a single data point
 
         Args:
             dataset_name (str): Name of the dataset ('kepler' or 'tess')
-            data_point (pd.DataFrame): Single data point as pandas DataFrame
+            data_point (Union[pd.DataFrame, np.ndarray]): Single data point as a
+                pandas DataFrame or a (1, 15) array such as a catalog row view
 
         Returns:
             Dict[str, Any]: Prediction results
@@ -39,27 +447,26 @@ class ExoplanetMLModel:
         try:
             logger.info(f"Making prediction for {dataset_name} dataset using pre-trained model")
             logger.info(f"Data point shape: {data_point.shape}")
-            logger.info(f"Data point columns: {list(data_point.columns)}")
-            logger.info(f"Data point array shape before reshape: {np.array(data_point).shape}")
 
             if dataset_name == 'kepler':
-                # Load and use actual pre-trained Kepler model
-                # Load model from .pkl file
-                with open("models/koi_xgb.pkl", "rb") as f:
-                    model = pickle.load(f)
-                    # Convert data_point to numpy array and reshape
-                    data_array = np.array(data_point).reshape(1, 15)
-                    confidence_array = model.predict_proba(data_array)[0] # 2d array
-                    positive_score = float(confidence_array[1])  # Probability of being exoplanet
-                    negative_score = float(confidence_array[0])  # Probability of not being exoplanet
-                    
-                    # set the confidence and the is_exoplanet boolean
-                    is_exoplanet = positive_score > negative_score
-                    confidence = positive_score if positive_score > negative_score else negative_score
-
-                    logger.info(f"Kepler model loaded successfully")
-                    logger.info(f"Kepler model confidence: {confidence:.3f}")
-                    logger.info(f"Kepler model is_exoplanet: {is_exoplanet}")
+                # Use the resident pre-trained Kepler model through its Booster
+                model = self.get_predictor('kepler')
+                if model is None:
+                    raise FileNotFoundError(f"Kepler model not found at {self.model_paths['kepler']}")
+
+                # Convert data_point to a float32 array (XGBoost scores in float32
+                # anyway); catalog rows are already float32 so this is a view
+                data_array = np.asarray(data_point, dtype=np.float32).reshape(1, 15)
+                confidence_array = model.predict_proba(data_array)[0] # 2d array
+                positive_score = float(confidence_array[1])  # Probability of being exoplanet
+                negative_score = float(confidence_array[0])  # Probability of not being exoplanet
+
+                # set the confidence and the is_exoplanet boolean
+                is_exoplanet = positive_score > negative_score
+                confidence = positive_score if positive_score > negative_score else negative_score
+
+                logger.info(f"Kepler model confidence: {confidence:.3f}")
+                logger.info(f"Kepler model is_exoplanet: {is_exoplanet}")
 
             elif dataset_name == 'tess':
                 # FIXME: Load and use actual pre-trained TESS model
@@ -91,19 +498,162 @@ class ExoplanetMLModel:
                 'is_exoplanet': False
             }
 
+    def predict_batch(self, dataset_name: str, data_points: np.ndarray) -> Dict[str, Any]:
+        """
+        Make predictions on many data points with a single model call
+
+        Args:
+            dataset_name (str): Name of the dataset (only 'kepler' is supported)
+            data_points (np.ndarray): N x 15 matrix of model features
+
+        Returns:
+            Dict[str, Any]: Prediction results, with 'confidence' and
+                'is_exoplanet' as length-N numpy arrays
+        """
+        try:
+            data_array = np.asarray(data_points, dtype=np.float32).reshape(-1, 15)
+            logger.info(f"Making batch prediction for {dataset_name} dataset on {len(data_array)} rows")
+
+            # Only the Kepler model is trained; there is no batch path for TESS
+            if dataset_name != 'kepler':
+                raise ValueError(f"Batch prediction is not supported for dataset: {dataset_name}")
+
+            model = self.get_predictor('kepler')
+            if model is None:
+                raise FileNotFoundError(f"Kepler model not found at {self.model_paths['kepler']}")
+
+            if len(data_array):
+                confidence_array = model.predict_proba(data_array)  # N x 2
+            else:
+                confidence_array = np.empty((0, 2), dtype=np.float32)
+            positive_scores = confidence_array[:, 1]
+            negative_scores = confidence_array[:, 0]
+
+            is_exoplanet = positive_scores > negative_scores
+            confidence = np.where(is_exoplanet, positive_scores, negative_scores)
+
+            return {
+                'status': 'success',
+                'dataset': dataset_name,
+                'confidence': confidence,
+                'is_exoplanet': is_exoplanet,
+                'model_version': f'{dataset_name.title()}-Pre-trained-1.0.0'
+            }
+
+        except Exception as e:
+            logger.error(f"Error making batch prediction for {dataset_name}: {str(e)}")
+            return {
+                'status': 'error',
+                'dataset': dataset_name,
+                'message': f'Batch prediction failed: {str(e)}'
+            }
+
 # Global model instance
 ml_model = ExoplanetMLModel()
 
 
-def predict_datapoint(dataset_name: str, data_point: pd.DataFrame) -> Dict[str, Any]:
+def predict_datapoint(dataset_name: str, data_point: Union['pd.DataFrame', np.ndarray]) -> Dict[str, Any]:
     """
     Wrapper function to predict on a single datapoint
 
     Args:
         dataset_name (str): Name of the dataset ('kepler' or 'tess')
-        data_point (pd.DataFrame): Single data point as pandas DataFrame
+        data_point (Union[pd.DataFrame, np.ndarray]): Single data point
 
     Returns:
         Dict[str, Any]: Prediction results
     """
     return ml_model.predict(dataset_name, data_point)
+
+
+def predict_datapoints(dataset_name: str, data_points: np.ndarray) -> Dict[str, Any]:
+    """
+    Wrapper function to predict on a batch of datapoints
+
+    Args:
+        dataset_name (str): Name of the dataset (only 'kepler' is supported)
+        data_points (np.ndarray): N x 15 matrix of model features
+
+    Returns:
+        Dict[str, Any]: Batch prediction results
+    """
+    return ml_model.predict_batch(dataset_name, data_points)
+
+
+def preload_models() -> None:
+    """
+    Load all models into the global instance ahead of the first request
+    """
+    ml_model.load_models()
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    import time as timer
+
+    parser = argparse.ArgumentParser(description='NumPy tree evaluator tools')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    export_parser = subcommands.add_parser('export-trees', help='Flatten the pickled model into a .npz')
+    parity_parser = subcommands.add_parser(
+        'parity', help='Compare the exported trees with predict_proba over the full catalog')
+    benchmark_parser = subcommands.add_parser('benchmark', help='Time the NumPy evaluator against xgboost')
+    for subparser in (export_parser, parity_parser, benchmark_parser):
+        subparser.add_argument('--model', default='models/koi_xgb.pkl')
+        subparser.add_argument('--trees', default='models/koi_xgb_trees.npz')
+    benchmark_parser.add_argument('--runs', type=int, default=2000, help='Single-row calls timed per path')
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        model_bytes = f.read()
+    model = pickle.loads(model_bytes)
+
+    if args.command == 'export-trees':
+        ensemble = export_trees(model, hashlib.sha256(model_bytes).hexdigest())
+        ensemble.save(args.trees)
+        print(f"Exported {len(ensemble)} trees, {len(ensemble.value)} nodes, "
+              f"max depth {ensemble.max_depth} -> {args.trees}")
+        sys.exit(0)
+
+    with open(args.trees, 'rb') as f:
+        ensemble = TreeEnsemble.from_bytes(f.read())
+    if ensemble.source_sha256 != hashlib.sha256(model_bytes).hexdigest():
+        print(f"{args.trees} was not exported from {args.model}; run export-trees again")
+        sys.exit(1)
+
+    from kepler_catalog import kepler_catalog
+    catalog = kepler_catalog.snapshot().features
+
+    if args.command == 'parity':
+        expected_margin = model.get_booster().inplace_predict(catalog, predict_type='margin')
+        expected = model.predict_proba(catalog)
+        margin = ensemble.predict_margin(catalog)
+        actual = ensemble.predict_proba(catalog)
+        max_diff = float(np.max(np.abs(expected - actual)))
+        margins_identical = np.array_equal(expected_margin, margin)
+        decisions_match = np.array_equal(np.argmax(expected, axis=1), np.argmax(actual, axis=1))
+        print(f"catalog: {len(catalog)} rows")
+        print(f"  margins bit-identical: {margins_identical}")
+        print(f"  probabilities: {int(np.sum(expected != actual))} rows differ, "
+              f"max abs diff {max_diff:.3g} (tolerance {PARITY_TOLERANCE:g})")
+        print(f"  class decisions identical: {decisions_match}")
+        sys.exit(0 if margins_identical and decisions_match and max_diff <= PARITY_TOLERANCE else 1)
+
+    from booster_inference import BoosterPredictor
+    paths = (('predict_proba', model.predict_proba),
+             ('inplace_predict', BoosterPredictor(model).predict_proba),
+             ('numpy', ensemble.predict_proba))
+    for label, predict in paths:
+        predict(catalog)
+        start = timer.perf_counter()
+        predict(catalog)
+        batch = timer.perf_counter() - start
+
+        row = catalog[:1]
+        predict(row)
+        start = timer.perf_counter()
+        for _ in range(args.runs):
+            predict(row)
+        single = (timer.perf_counter() - start) / args.runs
+        print(f"{label:>16}: {len(catalog) / batch:10.0f} rows/s batched, "
+              f"{single * 1e6:8.1f} us per single-row call")
@@ -0,0 +1,232 @@
+"""
+Prediction micro-batching for NASA Exoplanet Detection
+Coalesces concurrent single-row predictions into one model call and fans the results back out
+
+Compare direct and coalesced scoring with: python prediction_batcher.py benchmark [--threads N] [--requests N]
+"""
+
+import os
+import time
+import threading
+import logging
+import numpy as np
+from typing import Any, Dict, List
+
+from ml_models import ml_model
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per model call at most; a full batch is scored immediately
+MAX_BATCH_SIZE = int(os.environ.get('PREDICT_BATCH_MAX_SIZE', '16'))
+
+# Seconds the first request of a batch waits for others to join it when the
+# model is idle. While a batch is being scored the next one fills up anyway,
+# so the default adds no latency; a wait only pays off at high concurrency
+MAX_WAIT = float(os.environ.get('PREDICT_BATCH_MAX_WAIT_MS', '0')) / 1000
+
+
+class _Batch:
+    """Rows collected for one model call, and their results once scored."""
+
+    def __init__(self):
+        self.rows: List[np.ndarray] = []
+        self.results: List[Dict[str, Any]] = []
+        self.opened_at = time.monotonic()
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class PredictionBatcher:
+    """
+    Request coalescer in front of ExoplanetMLModel.
+
+    The first request to find no open batch for its dataset becomes the
+    batch's leader. Batches of a dataset are scored one at a time: while
+    the leader waits for the previous batch to finish, other requests add
+    their rows to its batch. If the model was idle, the leader instead
+    waits up to max_wait for company (or until the batch is full). It then
+    scores all rows with one predict_batch call and hands each caller its
+    own result. No background thread is involved, so the batcher is safe to
+    create before gunicorn forks its workers.
+    """
+
+    def __init__(self, model=None, max_batch_size: int = MAX_BATCH_SIZE, max_wait: float = MAX_WAIT):
+        """
+        Args:
+            model: Model scoring the batches (defaults to the shared instance)
+            max_batch_size: Rows per model call at most; 1 disables batching
+            max_wait: Seconds an idle model waits for a batch to fill; with
+                0, batches only form while another batch is being scored
+        """
+        self.model = model if model is not None else ml_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._open: Dict[str, _Batch] = {}
+        self._scoring: Dict[str, threading.Lock] = {}
+        self._reset_metrics()
+
+    def _reset_metrics(self) -> None:
+        self._queue_depth = 0
+        self._peak_queue_depth = 0
+        self._batches = 0
+        self._rows = 0
+        self._full_flushes = 0
+        self._wait_seconds = 0.0
+        self._batch_sizes: Dict[int, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_batch_size > 1
+
+    def predict(self, dataset_name: str, data_point: np.ndarray) -> Dict[str, Any]:
+        """
+        Score one row, sharing a model call with concurrent requests.
+
+        Args:
+            dataset_name (str): Name of the dataset (only 'kepler' has a batch path)
+            data_point (np.ndarray): (1, 15) row of model features
+
+        Returns:
+            Dict[str, Any]: Prediction results, as ExoplanetMLModel.predict
+        """
+        if not self.enabled:
+            return self.model.predict(dataset_name, data_point)
+
+        row = np.asarray(data_point, dtype=np.float32).reshape(15)
+        with self._lock:
+            batch = self._open.get(dataset_name)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open[dataset_name] = batch
+                scoring = self._scoring.setdefault(dataset_name, threading.Lock())
+            index = len(batch.rows)
+            batch.rows.append(row)
+            self._queue_depth += 1
+            self._peak_queue_depth = max(self._peak_queue_depth, self._queue_depth)
+            if len(batch.rows) >= self.max_batch_size:
+                # Close the batch so later requests open a new one
+                del self._open[dataset_name]
+                batch.full.set()
+
+        if leader:
+            if scoring.acquire(blocking=False):
+                # Idle model: give concurrent requests a moment to join
+                if self.max_wait > 0:
+                    batch.full.wait(self.max_wait)
+            else:
+                # The batch fills while the previous one is scored
+                scoring.acquire()
+            try:
+                self._score(dataset_name, batch)
+            finally:
+                scoring.release()
+        else:
+            batch.done.wait()
+        return batch.results[index]
+
+    def _score(self, dataset_name: str, batch: _Batch) -> None:
+        """Close a batch, score it with one model call and wake its requests."""
+        try:
+            with self._lock:
+                if self._open.get(dataset_name) is batch:
+                    del self._open[dataset_name]
+                size = len(batch.rows)
+                self._queue_depth -= size
+                self._batches += 1
+                self._rows += size
+                self._full_flushes += size >= self.max_batch_size
+                self._wait_seconds += time.monotonic() - batch.opened_at
+                self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+
+            result = self.model.predict_batch(dataset_name, np.vstack(batch.rows))
+            if result['status'] != 'success':
+                batch.results = [self._error(dataset_name, result['message'])] * size
+                return
+            batch.results = [{
+                'status': 'success',
+                'dataset': dataset_name,
+                'confidence': float(confidence),
+                'is_exoplanet': bool(is_exoplanet),
+                'model_version': result['model_version']
+            } for confidence, is_exoplanet in zip(result['confidence'], result['is_exoplanet'])]
+        except Exception as e:
+            logger.error(f"Error scoring a batch of {len(batch.rows)} {dataset_name} predictions: {str(e)}")
+            batch.results = [self._error(dataset_name, f'Prediction failed: {str(e)}')] * len(batch.rows)
+        finally:
+            batch.done.set()
+
+    @staticmethod
+    def _error(dataset_name: str, message: str) -> Dict[str, Any]:
+        return {
+            'status': 'error',
+            'dataset': dataset_name,
+            'message': message,
+            'confidence': 0.0,
+            'is_exoplanet': False
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and batch-size metrics since start-up (or the last reset)."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue_depth,
+                'peak_queue_depth': self._peak_queue_depth,
+                'batches': self._batches,
+                'rows': self._rows,
+                'full_batches': self._full_flushes,
+                'mean_batch_size': self._rows / self._batches if self._batches else 0.0,
+                'mean_wait_ms': self._wait_seconds / self._batches * 1000 if self._batches else 0.0,
+                'batch_sizes': {str(size): count for size, count in sorted(self._batch_sizes.items())}
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            queue_depth = self._queue_depth
+            self._reset_metrics()
+            self._queue_depth = queue_depth
+
+
+# Global batcher instance
+prediction_batcher = PredictionBatcher()
+
+
+if __name__ == '__main__':
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('ml_models').setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description='Prediction micro-batching tools')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    benchmark_parser = subcommands.add_parser(
+        'benchmark', help='Score catalog rows from concurrent threads, directly and coalesced')
+    benchmark_parser.add_argument('--threads', type=int, default=16, help='Concurrent callers')
+    benchmark_parser.add_argument('--requests', type=int, default=4000, help='Single-row predictions per run')
+    benchmark_parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT * 1000,
+                                  help='Wait for an idle model (default: %(default)s)')
+    args = parser.parse_args()
+
+    from kepler_catalog import kepler_catalog
+    features = kepler_catalog.snapshot().features
+    rows = [features[i % len(features)][None, :] for i in range(args.requests)]
+    ml_model.load_models()
+
+    batcher = PredictionBatcher(max_wait=args.max_wait_ms / 1000)
+    results = {}
+    for label, predict in (('direct', ml_model.predict), ('coalesced', batcher.predict)):
+        predict('kepler', rows[0])
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            start = time.perf_counter()
+            results[label] = list(executor.map(lambda row: predict('kepler', row), rows))
+            elapsed = time.perf_counter() - start
+        print(f"{label:>10}: {args.requests / elapsed:8.0f} predictions/s with {args.threads} threads")
+
+    matches = all(a['confidence'] == b['confidence'] and a['is_exoplanet'] == b['is_exoplanet']
+                  for a, b in zip(results['direct'], results['coalesced']))
+    print(f"results identical: {matches}")
+    print(f"metrics: {batcher.stats()}")
@@ -0,0 +1,145 @@
+"""
+Memoized manual predictions for NASA Exoplanet Detection
+Keeps the results of recently scored parameter vectors in a bounded LRU keyed by the vector and the model file
+"""
+
+import os
+import threading
+import logging
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ml_models import ExoplanetMLModel, ml_model
+
+logger = logging.getLogger(__name__)
+
+# Parameter vectors remembered at most; an entry is roughly 0.5 KB
+MAX_ENTRIES = int(os.environ.get('PREDICTION_MEMO_MAX_ENTRIES', '4096'))
+
+
+class PredictionMemo:
+    """
+    LRU of prediction results keyed by the 15-float input row and the hash
+    of the model file that scored it. Manual predictions repeat a lot (the
+    sample values, or a form resubmitted after tweaking one field), and the
+    model is deterministic, so a repeat is answered without scoring.
+    Entries of an older model are dropped when the model registry reports
+    a reload; the model hash in every key guards against results scored
+    by the old model landing after that.
+    """
+
+    def __init__(self, model: Optional[ExoplanetMLModel] = None, dataset_name: str = 'kepler',
+                 max_entries: int = MAX_ENTRIES):
+        """
+        Args:
+            model: Model registry whose file hash keys the entries (defaults to the shared instance)
+            dataset_name: Dataset the memoized rows belong to
+            max_entries: Entries kept before the least recently used is evicted
+        """
+        self.model = model or ml_model
+        self.dataset_name = dataset_name
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, bytes], Dict[str, Any]]' = OrderedDict()  # oldest first
+        self._model_hash: Optional[str] = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self.model.add_reload_listener(self._on_model_reload)
+
+    @staticmethod
+    def _row_key(data_point: np.ndarray) -> bytes:
+        """
+        Bytes of the row as the model sees it (float32), so inputs that only
+        differ below float32 precision share an entry. -0.0 and NaN payloads
+        are normalized because they score the same.
+        """
+        row = np.asarray(data_point, dtype=np.float32).reshape(15) + np.float32(0.0)
+        row[np.isnan(row)] = np.nan
+        return row.tobytes()
+
+    def _set_model(self, model_hash: Optional[str]) -> None:
+        """Switch to a model hash, dropping the entries of any other. Call with self._lock held."""
+        if model_hash != self._model_hash:
+            if self._entries:
+                self._invalidations += 1
+                logger.info(f"Model changed, dropping {len(self._entries)} memoized predictions")
+            self._entries.clear()
+            self._model_hash = model_hash
+
+    def _on_model_reload(self, dataset_name: str, model_hash: str) -> None:
+        if dataset_name == self.dataset_name:
+            with self._lock:
+                self._set_model(model_hash)
+
+    def _check_model(self) -> Optional[str]:
+        """Get the current model hash, clearing the memo if the model changed unnoticed (e.g. the first load)."""
+        model_hash = self.model.get_model_hash(self.dataset_name)
+        with self._lock:
+            self._set_model(model_hash)
+        return model_hash
+
+    def predict(self, data_point: np.ndarray,
+                score: Callable[[np.ndarray], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Get the prediction for a row, scoring it only if it is not memoized.
+
+        Args:
+            data_point: (1, 15) row of model features, defaults already filled in
+            score: Called with data_point on a miss; returns a result dict
+                shaped like ExoplanetMLModel.predict
+
+        Returns:
+            Dict[str, Any]: Prediction results
+        """
+        model_hash = self._check_model()
+        if model_hash is None:
+            return score(data_point)
+
+        key = (model_hash, self._row_key(data_point))
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return dict(result)
+            self._misses += 1
+
+        result = score(data_point)
+        if result.get('status') != 'success':
+            return result
+
+        with self._lock:
+            # Skip results of a model that was replaced while scoring
+            if model_hash == self._model_hash:
+                self._entries[key] = dict(result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counts since start-up, plus the current size."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'model_hash': self._model_hash
+            }
+
+
+# Global memo for /api/predict/manual
+prediction_memo = PredictionMemo()
@@ -0,0 +1,311 @@
+"""
+Precomputed prediction table for the Kepler catalog
+Scores every KOI once per model file and answers /api/predict/kepler with a dictionary lookup
+
+Run offline with: python prediction_table.py
+"""
+
+import os
+import time
+import hashlib
+import threading
+import numpy as np
+import logging
+from typing import Dict, Any, Optional
+
+from ml_models import ExoplanetMLModel, ml_model
+from kepler_catalog import KeplerCatalog, CatalogSnapshot, kepler_catalog
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a failed build is retried with the same model and catalog;
+# a new model file or catalog triggers a rebuild straight away
+REBUILD_RETRY_SECONDS = float(os.environ.get('PREDICTION_TABLE_RETRY_SECONDS', '300'))
+
+
+def catalog_fingerprint(snapshot: CatalogSnapshot) -> str:
+    """SHA-256 over the catalog's KOI names and feature matrix."""
+    digest = hashlib.sha256()
+    digest.update('\n'.join(snapshot.kepoi_names).encode('utf-8'))
+    digest.update(snapshot.features.tobytes())
+    return digest.hexdigest()
+
+
+class PredictionTableData:
+    """Scores for one catalog snapshot under one model file."""
+
+    def __init__(self, model_hash: str, snapshot: CatalogSnapshot,
+                 confidence: np.ndarray, is_exoplanet: np.ndarray, model_version: str):
+        self.model_hash = model_hash
+        self.snapshot = snapshot
+        self.confidence = confidence
+        self.is_exoplanet = is_exoplanet
+        self.model_version = model_version
+
+
+class CatalogPredictionTable:
+    """
+    Compact confidence/is_exoplanet table for every KOI in the catalog,
+    keyed by the hash of the model file. It is first loaded or built by
+    load_or_build; after that the model registry and the catalog notify the
+    table when a new model file or CSV replaces the loaded one, and it is
+    rebuilt in a background thread while lookups fall back to live
+    prediction. A failed build is not retried for the same model and
+    catalog until REBUILD_RETRY_SECONDS have passed.
+    """
+
+    def __init__(self, model: Optional[ExoplanetMLModel] = None,
+                 catalog: Optional[KeplerCatalog] = None,
+                 table_path: str = 'models/catalog_predictions.npz'):
+        """
+        Args:
+            model: Model registry to score with (defaults to the shared instance)
+            catalog: Catalog to score (defaults to the shared instance)
+            table_path: Where the table is persisted between restarts
+        """
+        # Not `catalog or ...`: KeplerCatalog defines __len__, so a truth
+        # test would load the CSV before the reload listener is registered
+        self.model = model if model is not None else ml_model
+        self.catalog = catalog if catalog is not None else kepler_catalog
+        self.table_path = table_path
+        self._table: Optional[PredictionTableData] = None
+        # Held while building or loading; re-entrant so build() can be called
+        # directly or from _ensure_current()
+        self._build_lock = threading.RLock()
+        # Guards _build_thread; never held while calling into the model
+        self._thread_lock = threading.Lock()
+        self._build_thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        # model_hash, catalog_mtime, reason and failed_at of the last failed build
+        self.last_failure: Optional[Dict[str, Any]] = None
+        self.model.add_reload_listener(self._on_model_reload)
+        self.catalog.add_reload_listener(self._on_catalog_reload)
+
+    def _is_current(self, table: Optional[PredictionTableData]) -> bool:
+        # Always ask the model and catalog, so their reload checks run even
+        # before the first table exists
+        model_hash = self.model.get_model_hash('kepler')
+        snapshot = self.catalog.snapshot()
+        return table is not None and table.model_hash == model_hash and table.snapshot is snapshot
+
+    def _record_failure(self, model_hash: Optional[str], snapshot: CatalogSnapshot, reason: str) -> None:
+        self.last_failure = {
+            'model_hash': model_hash,
+            'catalog_mtime': snapshot.mtime,
+            'reason': reason,
+            'failed_at': time.time()
+        }
+
+    def build(self) -> Optional[PredictionTableData]:
+        """
+        Score the whole catalog with the current model and persist the table.
+
+        Returns:
+            The new table, or None if scoring failed
+        """
+        with self._build_lock:
+            snapshot = self.catalog.snapshot()
+            model_hash = self.model.get_model_hash('kepler')
+            if model_hash is None:
+                logger.warning("No Kepler model loaded, skipping prediction table build")
+                self._record_failure(None, snapshot, 'No Kepler model loaded')
+                return None
+
+            result = self.model.predict_batch('kepler', snapshot.features)
+            if result['status'] != 'success':
+                logger.error(f"Prediction table build failed: {result['message']}")
+                self._record_failure(model_hash, snapshot, result['message'])
+                return None
+
+            if self.model.model_hashes.get('kepler') != model_hash:
+                # The model was swapped while we were scoring; its reload
+                # notification has already asked for another build
+                logger.info("Model changed during prediction table build, discarding result")
+                self.last_failure = None
+                return None
+
+            table = PredictionTableData(
+                model_hash=model_hash,
+                snapshot=snapshot,
+                confidence=result['confidence'].astype(np.float32),
+                is_exoplanet=result['is_exoplanet'].astype(bool),
+                model_version=result['model_version']
+            )
+            self._table = table
+            self.last_failure = None
+            self.save(table)
+            logger.info(f"Built prediction table for {len(snapshot)} KOIs (model {model_hash[:12]})")
+            return table
+
+    def save(self, table: PredictionTableData) -> None:
+        """Write the table to disk atomically."""
+        try:
+            tmp_path = f"{self.table_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    model_hash=np.array(table.model_hash),
+                    catalog_hash=np.array(catalog_fingerprint(table.snapshot)),
+                    model_version=np.array(table.model_version),
+                    confidence=table.confidence,
+                    is_exoplanet=table.is_exoplanet
+                )
+            os.replace(tmp_path, self.table_path)
+        except Exception as e:
+            logger.warning(f"Could not persist prediction table: {str(e)}")
+
+    def load(self) -> Optional[PredictionTableData]:
+        """
+        Load the persisted table if it matches the current model and catalog.
+
+        Returns:
+            The loaded table, or None if it is missing or stale
+        """
+        if not os.path.exists(self.table_path):
+            return None
+
+        try:
+            snapshot = self.catalog.snapshot()
+            model_hash = self.model.get_model_hash('kepler')
+            with np.load(self.table_path) as data:
+                if str(data['model_hash']) != model_hash:
+                    logger.info("Persisted prediction table was built with a different model")
+                    return None
+                if str(data['catalog_hash']) != catalog_fingerprint(snapshot):
+                    logger.info("Persisted prediction table was built from a different catalog")
+                    return None
+                table = PredictionTableData(
+                    model_hash=model_hash,
+                    snapshot=snapshot,
+                    confidence=data['confidence'],
+                    is_exoplanet=data['is_exoplanet'],
+                    model_version=str(data['model_version'])
+                )
+            self._table = table
+            self.last_failure = None
+            logger.info(f"Loaded prediction table from {self.table_path}")
+            return table
+        except Exception as e:
+            logger.warning(f"Could not load prediction table: {str(e)}")
+            return None
+
+    def _ensure_current(self) -> Optional[PredictionTableData]:
+        """Return the current table, loading or building it if needed."""
+        with self._build_lock:
+            table = self._table
+            if self._is_current(table):
+                return table
+            return self.load() or self.build()
+
+    def load_or_build(self, background: bool = True) -> None:
+        """
+        Make sure a current table is available, from disk or by rebuilding it.
+
+        Args:
+            background: Rebuild in a daemon thread instead of blocking
+        """
+        if background:
+            if not self._is_current(self._table) and self.load() is None:
+                self.rebuild_in_background()
+        else:
+            self._ensure_current()
+
+    def _on_model_reload(self, dataset_name: str, model_hash: str) -> None:
+        if dataset_name == 'kepler':
+            self.rebuild_in_background()
+
+    def _on_catalog_reload(self, snapshot: CatalogSnapshot) -> None:
+        self.rebuild_in_background()
+
+    def rebuild_in_background(self) -> None:
+        """Start a rebuild thread, or wake the running one to check again."""
+        with self._thread_lock:
+            self._wake.set()
+            if self._build_thread is not None and self._build_thread.is_alive():
+                return
+            self._build_thread = threading.Thread(
+                target=self._background_build, name='prediction-table-build', daemon=True
+            )
+            self._build_thread.start()
+
+    def _background_build(self) -> None:
+        """Load or build until the table is current, backing off after failures."""
+        while True:
+            self._wake.clear()
+            try:
+                table = self._ensure_current()
+            except Exception as e:
+                logger.error(f"Background prediction table build failed: {str(e)}")
+                self._record_failure(self.model.model_hashes.get('kepler'), self.catalog.snapshot(), str(e))
+                table = None
+
+            with self._thread_lock:
+                # A notification that arrived meanwhile gets another pass
+                if table is not None and not self._wake.is_set():
+                    self._build_thread = None
+                    return
+            if table is None:
+                self._wait_for_retry()
+
+    def _wait_for_retry(self) -> None:
+        """Sleep until the retry delay has passed or the model or catalog changed since the last failure."""
+        failure = self.last_failure
+        if failure is None:
+            return
+        deadline = time.monotonic() + REBUILD_RETRY_SECONDS
+        logger.info(f"Retrying the prediction table build in {REBUILD_RETRY_SECONDS:.0f} s "
+                    f"unless the model or catalog changes")
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._wake.wait(remaining):
+                return
+            self._wake.clear()
+            try:
+                catalog_mtime = self.catalog.snapshot().mtime
+            except OSError:
+                catalog_mtime = failure['catalog_mtime']
+            if (self.model.model_hashes.get('kepler') != failure['model_hash']
+                    or catalog_mtime != failure['catalog_mtime']):
+                return
+
+    def lookup(self, kepoi_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the precomputed prediction for a KOI.
+
+        Args:
+            kepoi_name: The Kepler Object of Interest name
+
+        Returns:
+            A result dict shaped like ExoplanetMLModel.predict, or None if the
+            table is not ready (the caller should predict live)
+        """
+        # Checking staleness runs the model and catalog reload checks, whose
+        # notifications start the rebuild; lookups never start one themselves
+        table = self._table
+        if not self._is_current(table):
+            return None
+
+        row = table.snapshot.kepoi_index.get(kepoi_name)
+        if row is None:
+            return None
+
+        return {
+            'status': 'success',
+            'dataset': 'kepler',
+            'confidence': float(table.confidence[row]),
+            'is_exoplanet': bool(table.is_exoplanet[row]),
+            'model_version': table.model_version
+        }
+
+
+# Global table instance
+prediction_table = CatalogPredictionTable()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    table = prediction_table.build()
+    if table is None:
+        raise SystemExit(1)
+    print(f"Scored {len(table.confidence)} KOIs, "
+          f"{int(table.is_exoplanet.sum())} predicted exoplanets -> {prediction_table.table_path}")
@@ -3,13 +3,10 @@ Simple lightcurve generator for production environments
 Creates basic lightcurve plots without downloading data
 """
 
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-from matplotlib import pyplot as plt
 import numpy as np
-import io
 import logging
 from typing import Tuple
+from lightcurve_render import render_lightcurve_png
 
 logger = logging.getLogger(__name__)
 
@@ -43,23 +40,10 @@ def generate_simple_lightcurve(kepid: int) -> Tuple[bool, bytes, str]:
             mask = np.abs(time_points - transit_time) < 1
             flux[mask] -= 0.15  # 15% dip
         
-        # Create the plot
-        plt.figure(figsize=(6, 4), dpi=100)
-        plt.title(f"Light Curve for KIC {kepid}", fontsize=12, fontweight='bold')
-        plt.xlabel("Time (days)", fontsize=10)
-        plt.ylabel("Normalized Flux", fontsize=10)
-        plt.plot(time_points, flux, lw=1, color='#4a9eff', alpha=0.8)
-        plt.grid(True, alpha=0.3)
-        plt.ylim(0.8, 1.2)
-        plt.tight_layout()
-        
-        # Save to bytes buffer
-        buffer = io.BytesIO()
-        plt.savefig(buffer, dpi=150, bbox_inches='tight', facecolor='white', format='png')
-        plt.close()
-        
-        image_data = buffer.getvalue()
-        buffer.close()
+        # Render the plot
+        image_data = render_lightcurve_png(
+            time_points, flux, f"Light Curve for KIC {kepid}", ylim=(0.8, 1.2)
+        )
         
         logger.info(f"Simple lightcurve generated for kepid: {kepid}")
         return True, image_data, filename
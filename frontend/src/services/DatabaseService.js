@@ -42,16 +42,28 @@ class DatabaseService {
    */
   async loadPredictions() {
     try {
-      const response = await fetch(`${this.baseURL}/api/predictions`);
-      
-      if (response.ok) {
+      // The API returns one page at a time; follow next_cursor to the end
+      const predictions = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ limit: '1000' });
+        if (cursor) {
+          params.set('cursor', cursor);
+        }
+        const response = await fetch(`${this.baseURL}/api/predictions?${params}`);
+        
+        if (!response.ok) {
+          console.error('Failed to load predictions:', await response.text());
+          return predictions;
+        }
+        
         const data = await response.json();
-        console.log(`Loaded ${data.count} predictions from database`);
-        return data.predictions || [];
-      } else {
-        console.error('Failed to load predictions:', await response.text());
-        return [];
-      }
+        predictions.push(...(data.predictions || []));
+        cursor = data.next_cursor;
+      } while (cursor);
+      
+      console.log(`Loaded ${predictions.length} predictions from database`);
+      return predictions;
     } catch (error) {
       console.error('Error loading predictions:', error);
       return [];
@@ -8,6 +8,7 @@ class PredictionService {
     this.currentDataset = null;
     this.currentCandidate = null;
     this.baseURL = 'https://nasa-space-apps-challenge-frqb.onrender.com';
+    this.candidatesPromise = null;
   }
 
   /**
@@ -27,6 +28,20 @@ class PredictionService {
    * @returns {Promise<Array>} List of candidate IDs
    */
   async getCandidates() {
+    // The list only changes when the backend's options file does, so fetch it
+    // once per session; the browser revalidates it with the server's ETag
+    if (!this.candidatesPromise) {
+      this.candidatesPromise = this.fetchCandidates();
+    }
+    const candidates = await this.candidatesPromise;
+    if (candidates.length === 0) {
+      // Don't keep a failed load around
+      this.candidatesPromise = null;
+    }
+    return candidates;
+  }
+
+  async fetchCandidates() {
     try {
       // Call the Kepler API endpoint to get candidates from text files
       const response = await fetch(`${this.baseURL}/api/autocomplete/kepler`);
@@ -152,16 +167,18 @@ class PredictionService {
 
       const data = await response.json();
       
-      if (data.success) {
-        return {
-          status: 'success',
-          filename: data.filename,
-          title: data.title,
-          url: `${this.baseURL}${data.url}`
-        };
-      } else {
+      if (!data.success) {
         throw new Error(data.error || 'Lightcurve generation failed');
       }
+      
+      // Cache miss: the backend queued a job, wait for it to finish
+      const url = data.url || await this.waitForLightcurveJob(data.status_url);
+      return {
+        status: 'success',
+        filename: data.filename,
+        title: data.title,
+        url: `${this.baseURL}${url}`
+      };
     } catch (error) {
       return {
         status: 'error',
@@ -170,6 +187,31 @@ class PredictionService {
     }
   }
 
+  /**
+   * Poll a lightcurve job until it finishes
+   * @param {string} statusUrl - Job status path returned by the generate endpoint
+   * @returns {Promise<string>} Path of the generated lightcurve image
+   */
+  async waitForLightcurveJob(statusUrl, intervalMs = 1000, timeoutMs = 180000) {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+      
+      const response = await fetch(`${this.baseURL}${statusUrl}`);
+      const job = await response.json();
+      if (!response.ok) {
+        throw new Error(job.error || 'Lightcurve job not found');
+      }
+      if (job.status === 'done') {
+        return job.url;
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Lightcurve generation failed');
+      }
+    }
+    throw new Error('Lightcurve generation timed out - try again later');
+  }
+
   /**
    * Clear current selection
    */